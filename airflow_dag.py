@@ -1,8 +1,36 @@
+import argparse
+import ast
+import hashlib
+import json
 import os
+import re
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from jinja2 import Environment, FileSystemLoader
 import yaml
 
+DEFAULT_EXTRACT_MODE = "stream"
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_PARTITIONS = 8
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_STAGING_COMPRESSION = "zstd"
+DEFAULT_STAGING_KEEP_RUNS = 3
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "airflow_templates")
+TEMPLATE_NAME = "ingest_template.py.j2"
+MANIFEST_NAME = ".dag_manifest.json"
+FACTORY_MANIFEST_NAME = "ingestion_manifest.json"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules the generated DAGs import at run time; installed next to them in the dags folder
+RUNTIME_MODULES = ("ingestion_runtime.py", "ingestion_staging.py", "log_to_audit.py")
+CONFIG_SUFFIXES = (".yaml", ".yml")
+REQUIRED_KEYS = {
+    "source": ("name", "schema", "table"),
+    "target": ("schema", "table"),
+}
+
 def parse_yaml(yaml_path):
     with open(yaml_path, "r") as f:
         return yaml.safe_load(f)
@@ -17,38 +45,348 @@ def convert_schedule(schedule_str):
     }
     return schedule_map.get(schedule_str, "'@daily'")
 
-def main(yaml_path: str, output_dag_path: str, airflow_dags_folder: str):
-    cfg = parse_yaml(yaml_path)
-    ingest = cfg["ingestion"]
+def extract_settings(ingest):
+    # Older configs have no extract section: stream with the default chunk size
+    extract = ingest.get("extract") or {}
+    mode = extract.get("mode", DEFAULT_EXTRACT_MODE)
+    if mode not in ("stream", "batch", "partitioned"):
+        raise ValueError(f"Unknown extract mode: {mode}")
+    chunk_size = int(extract.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    return mode, chunk_size
+
+def partition_settings(ingest):
+    """Partitioned extraction: split on partition_column, read up to max_concurrency ranges at once."""
+    extract = ingest.get("extract") or {}
+    if extract.get("mode") != "partitioned":
+        return "", 0, 1
+    column = extract.get("partition_column")
+    if not column:
+        raise ValueError("extract.mode partitioned needs extract.partition_column (an integer key or date column)")
+    partitions = int(extract.get("partitions", DEFAULT_PARTITIONS))
+    max_concurrency = int(extract.get("max_concurrency", DEFAULT_MAX_CONCURRENCY))
+    if partitions <= 0 or max_concurrency <= 0:
+        raise ValueError("extract.partitions and extract.max_concurrency must be positive")
+    return column, partitions, max_concurrency
+
+def checkpoint_settings(ingest, partition_column):
+    """Checkpointed runs: on by default for partitioned extracts (on the partition column)."""
+    extract = ingest.get("extract") or {}
+    column = extract.get("checkpoint_column", partition_column) or ""
+    if partition_column and column and column != partition_column:
+        raise ValueError("extract.checkpoint_column must be the partition_column in partitioned mode")
+    return column
+
+def staging_settings(ingest):
+    """Parquet staging between extract and load; off unless a staging section is present."""
+    staging = ingest.get("staging")
+    if not staging or staging.get("enabled") is False:
+        return False, "", DEFAULT_STAGING_COMPRESSION, DEFAULT_STAGING_KEEP_RUNS
+    compression = staging.get("compression", DEFAULT_STAGING_COMPRESSION)
+    if compression not in ("zstd", "snappy", "gzip", "lz4", "brotli", "none"):
+        raise ValueError(f"Unknown staging compression: {compression}")
+    keep_runs = int(staging.get("keep_runs", DEFAULT_STAGING_KEEP_RUNS))
+    return True, staging.get("dir", ""), compression, max(keep_runs, 1)
+
+def load_settings(ingest):
+    """Resolve load_strategy; incremental loads need a watermark column to be honoured."""
+    strategy = ingest.get("load_strategy") or "overwrite"
+    if strategy != "incremental":
+        return "overwrite", "", []
+
+    incremental = ingest.get("incremental") or {}
+    watermark_column = incremental.get("watermark_column")
+    if not watermark_column:
+        print("⚠️ load_strategy is incremental but no incremental.watermark_column is set; falling back to overwrite")
+        return "overwrite", "", []
+
+    merge_keys = incremental.get("merge_keys") or []
+    if isinstance(merge_keys, str):
+        merge_keys = [merge_keys]
+    return "incremental", watermark_column, list(merge_keys)
+
+def validate_config(cfg):
+    """Raise ValueError naming every missing key of an ingestion config."""
+    ingest = (cfg or {}).get("ingestion")
+    if not isinstance(ingest, dict):
+        raise ValueError("missing top-level 'ingestion' section")
+    missing = [
+        f"ingestion.{section}.{key}"
+        for section, keys in REQUIRED_KEYS.items()
+        for key in keys
+        if not (ingest.get(section) or {}).get(key)
+    ]
+    if missing:
+        raise ValueError(f"missing required keys: {', '.join(missing)}")
+    return ingest
+
+def build_params(cfg):
+    ingest = validate_config(cfg)
 
     dag_id = f"ingest__{ingest['source']['name']}__{ingest['target']['table']}"
-    schedule = convert_schedule(ingest["refresh_schedule"])
+    schedule = convert_schedule(ingest.get("refresh_schedule"))
+    extract_mode, chunk_size = extract_settings(ingest)
+    partition_column, partitions, max_concurrency = partition_settings(ingest)
+    checkpoint_column = checkpoint_settings(ingest, partition_column)
+    staging, staging_dir, staging_compression, staging_keep_runs = staging_settings(ingest)
+    load_strategy, watermark_column, merge_keys = load_settings(ingest)
 
-    params = {
+    return {
         "dag_id": dag_id,
         "schedule": schedule,
         "source_conn": f"{{{{ conn_{ingest['source']['name']} }}}}",
         "target_conn": f"{{{{ conn_{ingest['source']['name']} }}}}",  # Default fixed target Airflow connection
+        "source_name": ingest["source"]["name"],
         "source_schema": ingest["source"]["schema"],
         "source_table": ingest["source"]["table"],
         "target_schema": ingest["target"]["schema"],
         "target_table": ingest["target"]["table"],
+        "extract_mode": extract_mode,
+        "chunk_size": chunk_size,
+        "partition_column": partition_column,
+        "partitions": partitions,
+        "max_concurrency": max_concurrency,
+        "checkpoint_column": checkpoint_column,
+        "staging": staging,
+        "staging_dir": staging_dir,
+        "staging_compression": staging_compression,
+        "staging_keep_runs": staging_keep_runs,
+        "load_strategy": load_strategy,
+        "watermark_column": watermark_column,
+        "merge_keys": merge_keys,
     }
 
-    env = Environment(loader=FileSystemLoader("airflow_templates"))
-    template = env.get_template("ingest_template.py.j2")
-    rendered = template.render(**params)
+@lru_cache(maxsize=None)
+def get_template():
+    # Compiled once per process; DAG generation never edits the template mid-run
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), auto_reload=False)
+    return env.get_template(TEMPLATE_NAME)
+
+@lru_cache(maxsize=None)
+def template_hash():
+    with open(os.path.join(TEMPLATE_DIR, TEMPLATE_NAME), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def render_dag(cfg):
+    params = build_params(cfg)
+    return params["dag_id"], get_template().render(**params)
+
+def write_atomic(path: str, text: str):
+    """Write via a temp file in the same directory and rename, so Airflow never parses a half-written DAG."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
-    with open(output_dag_path, "w") as f:
-        f.write(rendered)
+def install_runtime(airflow_dags_folder: str, modules=RUNTIME_MODULES):
+    for name in modules:
+        with open(os.path.join(REPO_DIR, name), "r") as f:
+            source = f.read()
+        target = os.path.join(airflow_dags_folder, name)
+        if os.path.exists(target):
+            with open(target, "r") as f:
+                if f.read() == source:
+                    continue
+        write_atomic(target, source)
 
-    os.system(f"cp {output_dag_path} {airflow_dags_folder}")
+    # Helper modules declare no DAGs; keep the scheduler from parsing them on every loop
+    ignore_path = os.path.join(airflow_dags_folder, ".airflowignore")
+    patterns = [re.escape(name) for name in modules if name in RUNTIME_MODULES]
+    existing = []
+    if os.path.exists(ignore_path):
+        with open(ignore_path, "r") as f:
+            existing = f.read().splitlines()
+    missing = [p for p in patterns if p not in existing]
+    if missing:
+        write_atomic(ignore_path, "\n".join(existing + missing) + "\n")
+
+def main(yaml_path: str, output_dag_path: str, airflow_dags_folder: str):
+    dag_id, rendered = render_dag(parse_yaml(yaml_path))
+
+    write_atomic(output_dag_path, rendered)
+    install_runtime(airflow_dags_folder)
+    write_atomic(os.path.join(airflow_dags_folder, os.path.basename(output_dag_path)), rendered)
     print(f"✅ DAG generated and copied: {dag_id}")
 
     return dag_id
 
+def find_configs(config_root: str):
+    for dirpath, dirnames, filenames in os.walk(config_root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(CONFIG_SUFFIXES):
+                yield os.path.join(dirpath, name)
+
+def _config_hash(content: bytes):
+    # The template is part of the input: editing it must rebuild every DAG
+    return hashlib.sha256(template_hash().encode("ascii") + b"\0" + content).hexdigest()
+
+def _compile_one(job):
+    """Worker: parse, validate and render one config. Returns (rel_path, dag_id, rendered, error)."""
+    rel_path, content = job
+    try:
+        dag_id, rendered = render_dag(yaml.safe_load(content))
+        return rel_path, dag_id, rendered, None
+    except Exception as e:
+        return rel_path, None, None, f"{type(e).__name__}: {e}"
+
+def _load_manifest(path: str):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def compile_all(config_root: str = "ingestion_configs", output_dir: str = "dag_outputs",
+                airflow_dags_folder: str = None, workers: int = None, force: bool = False):
+    """
+    Render a DAG for every config under config_root.
+
+    Configs whose content (and the template) hash matches the manifest from the
+    previous build are skipped. Changed configs are rendered in parallel across
+    `workers` processes; outputs are written atomically to output_dir and, if
+    given, airflow_dags_folder. DAG files from the previous build whose config was
+    deleted, renamed or now renders a different dag_id are removed from both; a config
+    that fails keeps its last good DAG. Returns {"compiled", "skipped", "failed", "removed"}.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    previous_manifest = _load_manifest(manifest_path)
+    manifest = {} if force else previous_manifest
+    new_manifest, jobs, hashes, skipped = {}, [], {}, []
+
+    for path in find_configs(config_root):
+        rel_path = os.path.relpath(path, config_root)
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = _config_hash(content)
+        previous = manifest.get(rel_path)
+        if previous and previous["hash"] == digest and os.path.exists(os.path.join(output_dir, previous["output"])) \
+                and (not airflow_dags_folder or os.path.exists(os.path.join(airflow_dags_folder, previous["output"]))):
+            new_manifest[rel_path] = previous
+            skipped.append(rel_path)
+        else:
+            hashes[rel_path] = digest
+            jobs.append((rel_path, content))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_compile_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        results = [_compile_one(job) for job in jobs]
+
+    if airflow_dags_folder:
+        install_runtime(airflow_dags_folder)
+
+    owners = {entry["dag_id"]: rel for rel, entry in new_manifest.items()}
+    compiled, failed = [], {}
+    for rel_path, dag_id, rendered, error in results:
+        if error is None and owners.get(dag_id, rel_path) != rel_path:
+            error = f"dag_id {dag_id} is already generated from {owners[dag_id]}"
+        if error is not None:
+            failed[rel_path] = error
+            print(f"❌ {rel_path}: {error}")
+            continue
+        owners[dag_id] = rel_path
+        output = f"{dag_id}.py"
+        write_atomic(os.path.join(output_dir, output), rendered)
+        if airflow_dags_folder:
+            write_atomic(os.path.join(airflow_dags_folder, output), rendered)
+        new_manifest[rel_path] = {"hash": hashes[rel_path], "dag_id": dag_id, "output": output}
+        compiled.append(dag_id)
+
+    for rel_path in failed:
+        previous = previous_manifest.get(rel_path)
+        if previous and owners.get(previous["dag_id"], rel_path) == rel_path:
+            new_manifest[rel_path] = previous
+
+    removed = _prune_outputs(previous_manifest, new_manifest, output_dir, airflow_dags_folder)
+    write_atomic(manifest_path, json.dumps(new_manifest, indent=2, sort_keys=True))
+    print(f"✅ {len(compiled)} DAGs generated, {len(skipped)} unchanged, {len(removed)} removed, {len(failed)} failed")
+    return {"compiled": compiled, "skipped": skipped, "failed": failed, "removed": removed}
+
+def _prune_outputs(previous_manifest: dict, new_manifest: dict, output_dir: str, airflow_dags_folder: str = None):
+    """Delete DAG files listed in the previous manifest but not the new one; only files this build wrote are touched."""
+    current = {entry["output"] for entry in new_manifest.values()}
+    stale = sorted({entry["output"] for entry in previous_manifest.values()} - current)
+    for output in stale:
+        for folder in filter(None, (output_dir, airflow_dags_folder)):
+            path = os.path.join(folder, output)
+            if os.path.exists(path):
+                os.remove(path)
+    return stale
+
+def build_manifest(config_root: str = "ingestion_configs", manifest_path: str = None,
+                   airflow_dags_folder: str = None):
+    """
+    Compile every config into one JSON manifest of DAG specs for dag_factory.py.
+
+    The file is only rewritten when its content changes, so the factory's mtime
+    cache stays warm across no-op builds. With airflow_dags_folder the manifest,
+    the factory and its runtime modules are installed there.
+    """
+    manifest_path = manifest_path or os.path.join("dag_outputs", FACTORY_MANIFEST_NAME)
+    specs, owners, failed = [], {}, {}
+    for path in find_configs(config_root):
+        rel_path = os.path.relpath(path, config_root)
+        try:
+            spec = build_params(parse_yaml(path))
+            if spec["dag_id"] in owners:
+                raise ValueError(f"dag_id {spec['dag_id']} is already generated from {owners[spec['dag_id']]}")
+        except Exception as e:
+            failed[rel_path] = f"{type(e).__name__}: {e}"
+            print(f"❌ {rel_path}: {failed[rel_path]}")
+            continue
+        owners[spec["dag_id"]] = rel_path
+        spec["schedule"] = ast.literal_eval(spec["schedule"])  # rendered as a Python literal for the template
+        spec["config"] = rel_path
+        specs.append(spec)
+
+    text = json.dumps({"version": 1, "dags": specs}, indent=1, sort_keys=True)
+    targets = [manifest_path]
+    if airflow_dags_folder:
+        targets.append(os.path.join(airflow_dags_folder, FACTORY_MANIFEST_NAME))
+        install_runtime(airflow_dags_folder, RUNTIME_MODULES + ("dag_factory.py",))
+    for target in targets:
+        if os.path.exists(target):
+            with open(target, "r") as f:
+                if f.read() == text:
+                    continue
+        write_atomic(target, text)
+
+    print(f"✅ Manifest with {len(specs)} DAGs written to {manifest_path}, {len(failed)} failed")
+    return {"dags": [spec["dag_id"] for spec in specs], "failed": failed}
+
 if __name__ == "__main__":
-    yaml_path = sys.argv[1]
-    output_dag_path = sys.argv[2]
-    airflow_dags_folder = sys.argv[3]
-    main(yaml_path, output_dag_path, airflow_dags_folder)
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("-"):
+        # Single-config form: python airflow_dag.py <yaml_path> <output_dag_path> <airflow_dags_folder>
+        yaml_path = sys.argv[1]
+        output_dag_path = sys.argv[2]
+        airflow_dags_folder = sys.argv[3]
+        main(yaml_path, output_dag_path, airflow_dags_folder)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Generate Airflow DAGs from ingestion configs")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--all", action="store_true", help="render one DAG file per config under --config-root")
+    mode.add_argument("--manifest", metavar="PATH", help="compile all configs into one manifest for dag_factory.py")
+    parser.add_argument("--config-root", default="ingestion_configs")
+    parser.add_argument("--output-dir", default="dag_outputs")
+    parser.add_argument("--dags-folder", default=None, help="also install the DAGs into this Airflow dags folder")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild every DAG")
+    args = parser.parse_args()
+
+    if args.manifest:
+        result = build_manifest(args.config_root, args.manifest, args.dags_folder)
+    else:
+        result = compile_all(args.config_root, args.output_dir, args.dags_folder, args.workers, args.force)
+    sys.exit(1 if result["failed"] else 0)
@@ -1,16 +1,72 @@
 import streamlit as st
 import re
-from utils.llm_agent import query_llm
+import time
+import uuid
+import pandas as pd
+from utils.llm_agent import stream_query_llm, sql_cache_stats
 from components.auto_visualizer import auto_render_output
+from data_ops.profile_cache import load_report_html
+from utils.jobs import get_job_manager, job_key
+from utils import tracing
+from utils.engine_registry import pool_stats
+
+JOB_POLL_SECONDS = 0.5
 
 
 # Delay import to avoid circular import issues
 def get_conversation_manager():
+    """One manager per browser session, so its history and token budget outlive reruns."""
     from conv_manager import ConversationManager
-    return ConversationManager()
+    if "conversation_manager" not in st.session_state:
+        st.session_state.conversation_manager = ConversationManager()
+    return st.session_state.conversation_manager
 
 conversation_manager = get_conversation_manager()
 
+
+def background_action(state_key: str, action: str, **kwargs):
+    """
+    Run a ConversationManager action as a background job and return its result.
+    Until the result is ready this shows the job's progress with a Cancel button,
+    stops the script and reruns it to poll, so the page stays responsive. The job is
+    remembered under `state_key` and only resubmitted when its arguments change.
+    """
+    jobs = get_job_manager()
+    owner = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    signature = job_key(action, (), kwargs)
+    entry = st.session_state.get(state_key)
+    expired = entry is not None and "job_id" in entry and "result" not in entry and jobs.status(entry["job_id"]) is None
+    if entry is None or entry["signature"] != signature or expired:
+        entry = {"signature": signature, "job_id": conversation_manager.submit_action(action, owner=owner, **kwargs)}
+        st.session_state[state_key] = entry
+    if "result" in entry:
+        return entry["result"]
+
+    # A cancelled entry has no job: another session may still be running it
+    status = {"status": "cancelled"} if entry.get("cancelled") else jobs.status(entry["job_id"])
+    if status["status"] == "done":
+        entry["result"] = conversation_manager.collect_action(action, entry["job_id"])
+        return entry["result"]
+    if status["status"] in ("failed", "cancelled"):
+        if status["status"] == "failed":
+            st.error(f"{action} failed: {status['error']}")
+        else:
+            st.info(f"{action} was cancelled.")
+        if st.button("Retry", key=f"retry_{state_key}"):
+            st.session_state.pop(state_key)
+            st.rerun()
+        st.stop()
+
+    label = status["message"] or ("Waiting for a free worker..." if status["status"] == "queued" else f"Running {action}...")
+    st.progress(status["progress"], text=label)
+    if st.button("Cancel", key=f"cancel_{state_key}"):
+        jobs.cancel(entry["job_id"], owner)
+        # Forget the job here even if other sessions keep it running
+        st.session_state[state_key] = {"signature": signature, "cancelled": True}
+        st.rerun()
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
 # Streamlit page config
 st.set_page_config(page_title="Autonomous Data Onboarding", page_icon="🤖", layout="wide")
 
@@ -20,7 +76,8 @@ st.markdown("This tool helps you **explore**, **profile**, and **configure data
 
 # Sidebar Navigation
 st.sidebar.title("Navigation")
-app_mode = st.sidebar.radio("Select Mode", ["Introduction", "Explore Data", "Data Analytics", "Configure Ingestion"])
+app_mode = st.sidebar.radio("Select Mode", ["Introduction", "Explore Data", "Data Analytics", "Configure Ingestion",
+                                                 "Diagnostics"])
 
 # Initialize Session State
 if "conversation_history" not in st.session_state:
@@ -62,8 +119,18 @@ elif app_mode == "Explore Data":
 
         if user_input:
             st.session_state.conversation_history.append(f"**You:** {user_input}")
-            assistant_response = conversation_manager.user_message(user_input)
+            # Stream the reply so the first tokens show up while the rest is generated
+            metrics = {}
+            try:
+                assistant_response = st.write_stream(conversation_manager.user_message_stream(user_input, metrics))
+            except Exception as e:
+                st.error(f"The assistant could not answer: {e}")
+                st.stop()
             st.session_state.conversation_history.append(f"**Assistant:** {assistant_response}")
+            st.caption(
+                f"Prompt tokens this turn: {conversation_manager.context.last_prompt_tokens} · "
+                f"first token after {metrics.get('ttft_s')}s · {metrics.get('tokens_per_sec')} tokens/sec"
+            )
 
             # Extract keyword (e.g., transactions, sales)
             keywords = ["transactions", "sales", "inventory", "marketing"]
@@ -78,10 +145,13 @@ elif app_mode == "Explore Data":
     # Step 2: Select source from matching tables
     if st.session_state.explore_step == "select_source":
         st.markdown(f"### Showing sources for domain: **{st.session_state.explore_keyword}**")
-        st.session_state.filtered_sources = conversation_manager.run_action(
-            "discover_sources_full",
-            filter_func=lambda t: st.session_state.explore_keyword in t.lower()
-        )
+        # Only look sources up again when the domain keyword changes, not on every rerun
+        if st.session_state.get("filtered_for_keyword") != st.session_state.explore_keyword:
+            st.session_state.filtered_sources = background_action(
+                "discover_job", "discover_sources_full",
+                keyword=st.session_state.explore_keyword
+            )
+            st.session_state.filtered_for_keyword = st.session_state.explore_keyword
 
         if not st.session_state.filtered_sources:
             st.error("No matching sources found.")
@@ -119,25 +189,56 @@ elif app_mode == "Explore Data":
     if st.session_state.explore_step == "profiling":
         st.markdown(f"**Profiling:** `{st.session_state.selected_source}.{st.session_state.selected_schema}.{st.session_state.selected_table}`")
 
-        with st.spinner("Profiling data, please wait..."):
-            profiling_result, html_report_path = conversation_manager.run_action(
-                "profile_table",
-                source=st.session_state.selected_source,
-                schema=st.session_state.selected_schema,
-                table=st.session_state.selected_table,
-            )
+        # The full ydata report takes minutes on wide tables, so it is opt-in
+        full_report = st.checkbox("Generate full profiling report (slow)", key="full_profile_report")
 
-        profiling_html = profiling_result.get("profile_report_html")
-        if profiling_html:
-            st.components.v1.html(profiling_html, height=1400, scrolling=True)
-        else:
+        # Runs in the background; a slow source or the full report no longer blocks the session
+        profiling_result, html_report_path = background_action(
+            "profile_job", "profile_table",
+            source=st.session_state.selected_source,
+            schema=st.session_state.selected_schema,
+            table=st.session_state.selected_table,
+            full_report=full_report,
+        )
+
+        row_label = "Rows" if profiling_result.get("row_count_exact", True) else "Rows (estimated)"
+        row_value = f"{profiling_result['row_count']:,}"
+        if profiling_result.get("row_count_minimum"):
+            row_label, row_value = "Rows (at least)", f"{row_value}+"
+        col1, col2, col3 = st.columns(3)
+        col1.metric(row_label, row_value)
+        col2.metric("Columns", profiling_result["num_columns"])
+        col3.metric("Sample size", profiling_result.get("sample_size", 0))
+
+        column_stats = profiling_result.get("column_stats")
+        if column_stats:
+            st.markdown(f"#### Column statistics (computed over the {profiling_result['stats_scope']})")
+            st.dataframe([
+                {
+                    "column": name,
+                    **{k: v for k, v in stats.items() if k != "top_values"},
+                    "top_values": ", ".join(str(t["value"]) for t in stats.get("top_values", [])),
+                }
+                for name, stats in column_stats.items()
+            ])
+
+        if profiling_result.get("has_report"):
+            # The cached report is only decompressed when the user asks to see it
+            if st.checkbox("View full profiling report", key="view_profile_report"):
+                profiling_html = load_report_html(profiling_result["report_key"])
+                if profiling_html:
+                    st.components.v1.html(profiling_html, height=1400, scrolling=True)
+                else:
+                    st.error("No profiling report available.")
+        elif full_report:
             st.error("No profiling report available.")
 
     # Reset Button
     if st.button("🔁 Reset Exploration"):
         for key in [
-            "explore_step", "explore_keyword", "explore_user_input",
-            "filtered_sources", "selected_source", "selected_schema", "selected_table"
+            "explore_step", "explore_keyword", "explore_user_input", "discover_job", "profile_job",
+            "filtered_sources", "filtered_for_keyword", "selected_source", "selected_schema", "selected_table",
+            "full_profile_report", "view_profile_report"
         ]:
             st.session_state.pop(key, None)
         st.success("Exploration reset. Start by entering a new query.")
@@ -161,20 +262,38 @@ elif app_mode == "Data Analytics":
             elif role == "assistant":
                 st.chat_message("assistant").write(msg["text"])
 
+    bypass_cache = st.sidebar.checkbox("Bypass result cache", key="bypass_result_cache",
+                                       help="Re-run queries against the source even if a cached result exists.")
+
     user_input = st.chat_input("How can I help you today with data insights...")
 
     if user_input:
         st.session_state.chat_history.append({"role": "user", "text": user_input})
 
-        with st.spinner("DataMate is thinking..."):
-            llm_response = query_llm(user_input)
-            st.session_state.chat_history.append({"role": "assistant", "text": llm_response})
+        st.chat_message("user").write(user_input)
+        stream_metrics, retrieval = {}, {}
+        try:
+            llm_response = st.chat_message("assistant").write_stream(stream_query_llm(user_input, stream_metrics, retrieval))
+        except Exception as e:
+            st.error(f"The assistant could not answer: {e}")
+            st.stop()
+        st.session_state.chat_history.append({"role": "assistant", "text": llm_response})
+        st.caption(
+            f"First token after {stream_metrics.get('ttft_s')}s · "
+            f"{stream_metrics.get('tokens_per_sec')} tokens/sec"
+        )
+        if retrieval:
+            st.caption(
+                f"Schema context: {', '.join(t['table'] for t in retrieval['tables'])} · "
+                f"{retrieval['prompt_tokens']} prompt tokens"
+            )
 
+        with st.spinner("Running query..."):
             sql_match = re.search(r"(SELECT[\s\S]+?;)", llm_response, re.IGNORECASE)
             if sql_match:
                 sql_query = sql_match.group(1).strip()
                 st.markdown(f"**Generated SQL:** `{sql_query}`")
-                auto_render_output(sql_query)
+                auto_render_output(sql_query, use_cache=not bypass_cache)
             else:
                 st.markdown("#### 🤖 Assistant Response:")
                 st.write(llm_response)
@@ -196,6 +315,9 @@ elif app_mode == "Configure Ingestion":
     user_query = st.chat_input("Describe your ingestion configuration needs (e.g., Ingest transactions data from MySQL to Postgres daily)...")
 
     if user_query:
+        # A new request starts over: its confirmation, YAML and PR job belong to the previous one
+        for key in ("user_confirmed", "confirmation_choice", "ingestion_yaml", "pr_job"):
+            st.session_state.pop(key, None)
         st.session_state.ingestion_context["ingestion_prompt"] = user_query
         response = conversation_manager.llama.chat([
             {"role": "system", "content": "You're a data ingestion assistant that extracts parameters for building a data pipeline."},
@@ -245,26 +367,61 @@ elif app_mode == "Configure Ingestion":
 
             # If user confirmed earlier, proceed
             if st.session_state.get("user_confirmed"):
-                with st.spinner("Generating ingestion YAML and creating GitHub PR..."):
-                    ingestion_yaml = conversation_manager.run_action(
+                # Built once per request: the YAML carries a created_at stamp, and the PR job is keyed on its content
+                if "ingestion_yaml" not in st.session_state:
+                    st.session_state.ingestion_yaml = conversation_manager.run_action(
                         "build_ingest_yaml",
                         **parsed
                     )
+                ingestion_yaml = st.session_state.ingestion_yaml
+
+                pr_title = f"Ingestion Pipeline for {parsed['domain']} Data"
+                pr_body = f"Automated PR for ingesting {parsed['domain']} data into {parsed['target_schema']}.{parsed['target_table']}"
+                pr_branch = f"ingestion/{parsed['domain']}/{parsed['target_schema']}/{parsed['target_table']}"
+
+                pr_response = background_action(
+                    "pr_job", "create_github_pr",
+                    repo_full_name="mkviswanadh/data_source_onboarding_orchestrator",
+                    pr_branch=pr_branch,
+                    yaml_content=ingestion_yaml,
+                    pr_title=pr_title,
+                    pr_body=pr_body,
+                )
+
+                if pr_response:
+                    st.success(f"✅ GitHub PR created successfully! [View PR]({pr_response.html_url})")
+                else:
+                    st.error("❌ Failed to create GitHub PR.")
 
-                    pr_title = f"Ingestion Pipeline for {parsed['domain']} Data"
-                    pr_body = f"Automated PR for ingesting {parsed['domain']} data into {parsed['target_schema']}.{parsed['target_table']}"
-                    pr_branch = f"ingestion/{parsed['domain']}/{parsed['target_schema']}/{parsed['target_table']}"
-
-                    pr_response = conversation_manager.run_action(
-                        "create_github_pr",
-                        repo_full_name="mkviswanadh/data_source_onboarding_orchestrator",
-                        pr_branch=pr_branch,
-                        yaml_content=ingestion_yaml,
-                        pr_title=pr_title,
-                        pr_body=pr_body,
-                    )
-
-                    if pr_response:
-                        st.success(f"✅ GitHub PR created successfully! [View PR]({pr_response.html_url})")
-                    else:
-                        st.error("❌ Failed to create GitHub PR.")
+# ----------------------------- #
+#          DIAGNOSTICS
+# ----------------------------- #
+elif app_mode == "Diagnostics":
+    st.subheader("🩺 Where the time goes")
+    st.caption("Timings since the app started, over the last "
+               f"{tracing.TRACE_STATS_WINDOW:,} calls of each operation. "
+               f"Spans are exported to {tracing.TRACE_EXPORT_PATH or '(export off)'}.")
+
+    stats = tracing.operation_stats()
+    if stats:
+        ops = pd.DataFrame.from_dict(stats, orient="index").rename_axis("operation").reset_index()
+        st.write("### Operations")
+        st.dataframe(ops.sort_values("p95_ms", ascending=False), hide_index=True)
+    else:
+        st.info("No operations recorded yet. Use the other pages, then come back.")
+
+    queries = tracing.slowest_queries(20)
+    if queries:
+        st.write("### Slowest recent SQL statements")
+        slow = pd.DataFrame(queries)
+        slow["ts"] = pd.to_datetime(slow["ts"], unit="s")
+        st.dataframe(slow[["duration_ms", "operation", "database", "rows", "error", "ts", "statement"]], hide_index=True)
+
+    st.write("### Connection pools")
+    st.json(pool_stats())
+    st.write("### NL→SQL memo")
+    st.json(sql_cache_stats())
+
+    if st.button("Reset statistics"):
+        tracing.reset()
+        st.rerun()
@@ -0,0 +1,91 @@
+"""
+Audit logging throughput under concurrent writers.
+
+Compares the old pattern (connect, insert one row, commit, close per event) with
+AuditWriter batching, for several writer processes each running a few threads:
+
+    python benchmarks/bench_audit_writer.py --processes 4 --threads 4 --rows 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_to_audit import AuditWriter, _ensure_audit_schema  # noqa: E402
+
+
+def _row(worker: int, i: int):
+    return (f"source_{worker % 8}", "src", f"table_{i % 50}", "stg", f"table_{i % 50}", "progress", f"chunk {i}")
+
+
+def _legacy_worker(db_path: str, worker: int, rows: int):
+    for i in range(rows):
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.execute(
+            "INSERT INTO ingestion_audit (source_name, source_schema, source_table, target_schema, "
+            "target_table, status, message, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*_row(worker, i), datetime.utcnow().isoformat(sep=" "))
+        )
+        conn.commit()
+        conn.close()
+
+
+def _run_process(mode: str, db_path: str, process_no: int, threads: int, rows: int):
+    if mode == "legacy":
+        targets = [lambda w=w: _legacy_worker(db_path, w, rows) for w in range(threads)]
+    else:
+        # Threads of one process share a single writer, as get_audit_writer() does
+        writer = AuditWriter(db_path)
+
+        def shared(w):
+            for i in range(rows):
+                writer.write(*_row(w, i), duration_seconds=0.0)
+        targets = [lambda w=w: shared(process_no * threads + w) for w in range(threads)]
+
+    workers = [threading.Thread(target=t) for t in targets]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if mode == "writer":
+        writer.close()
+
+
+def bench(mode: str, processes: int, threads: int, rows: int):
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_audit_"), "audit.db")
+    conn = sqlite3.connect(db_path)
+    _ensure_audit_schema(conn)
+    if mode == "legacy":
+        conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for f in [pool.submit(_run_process, mode, db_path, p, threads, rows) for p in range(processes)]:
+            f.result()
+    elapsed = time.perf_counter() - started
+
+    conn = sqlite3.connect(db_path)
+    written = conn.execute("SELECT COUNT(*) FROM ingestion_audit").fetchone()[0]
+    conn.close()
+    return {"mode": mode, "rows": written, "seconds": round(elapsed, 3), "rows_per_sec": round(written / elapsed, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per thread")
+    args = parser.parse_args()
+
+    for mode in ("legacy", "writer"):
+        result = bench(mode, args.processes, args.threads, args.rows)
+        print(f"{result['mode']:>7}: {result['rows']:,} rows in {result['seconds']}s "
+              f"({result['rows_per_sec']:,.0f} rows/sec)")
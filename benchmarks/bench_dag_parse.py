@@ -0,0 +1,89 @@
+"""
+Airflow parse time: one rendered file per table vs. the manifest-driven dag_factory.py.
+
+For each size, synthetic ingestion configs are generated and deployed both ways into
+temporary dags folders, which are then loaded with Airflow's DagBag in a fresh
+interpreter (as the DAG processor does). Requires apache-airflow:
+
+    python benchmarks/bench_dag_parse.py --sizes 10 100 1000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import airflow_dag  # noqa: E402
+
+# Runs in a child process so each measurement pays the same cold-start cost
+_PARSE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from airflow.models import DagBag
+imported = time.perf_counter()
+bag = DagBag(dag_folder=sys.argv[1], include_examples=False)
+done = time.perf_counter()
+print(json.dumps({
+    "dags": len(bag.dags),
+    "files": len(bag.dagbag_stats),
+    "errors": len(bag.import_errors),
+    "airflow_import_s": round(imported - started, 3),
+    "parse_s": round(done - imported, 3),
+    "file_parse_sum_s": round(sum(s.duration.total_seconds() for s in bag.dagbag_stats), 3),
+}))
+"""
+
+
+def write_configs(config_root: str, count: int):
+    for i in range(count):
+        directory = os.path.join(config_root, f"source_{i % 10}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"table_{i}.yaml"), "w") as f:
+            f.write(
+                "ingestion:\n"
+                f"  source: {{name: source_{i % 10}, schema: raw, table: table_{i}}}\n"
+                f"  target: {{schema: staging, table: table_{i}}}\n"
+                "  refresh_schedule: daily\n"
+            )
+
+
+def parse(dags_folder: str):
+    env = dict(os.environ, PYTHONPATH=dags_folder, AIRFLOW__CORE__LOAD_EXAMPLES="False")
+    out = subprocess.run([sys.executable, "-c", _PARSE_SCRIPT, dags_folder],
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def bench(count: int):
+    work = tempfile.mkdtemp(prefix=f"bench_dag_parse_{count}_")
+    config_root = os.path.join(work, "ingestion_configs")
+    per_file, factory = os.path.join(work, "dags_per_file"), os.path.join(work, "dags_factory")
+    write_configs(config_root, count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        airflow_dag.compile_all(config_root, os.path.join(work, "dag_outputs"), per_file)
+        airflow_dag.build_manifest(config_root, os.path.join(work, "ingestion_manifest.json"), factory)
+    return {"configs": count, "per_file": parse(per_file), "factory": parse(factory)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    try:
+        import airflow  # noqa: F401
+    except ImportError:
+        sys.exit("apache-airflow is required to measure DAG parse time")
+
+    print(f"{'configs':>8} {'mode':>9} {'dags':>6} {'files':>6} {'parse_s':>9} {'file_sum_s':>11}")
+    for size in args.sizes:
+        result = bench(size)
+        for mode in ("per_file", "factory"):
+            r = result[mode]
+            print(f"{size:>8} {mode:>9} {r['dags']:>6} {r['files']:>6} {r['parse_s']:>9} {r['file_parse_sum_s']:>11}")
@@ -0,0 +1,88 @@
+"""
+Accuracy and latency of the local intent tier on the held-out evaluation set.
+
+Reports, per tier (rules, model), how many questions it answered and how many of
+those were right, the share left to the LLM, and per-question latency. With --llm
+the LLM-only path (utils.llm_agent, needs Ollama) is measured on the same set:
+
+    python benchmarks/bench_intent_classifier.py
+    python benchmarks/bench_intent_classifier.py --llm
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import intent_classifier  # noqa: E402
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench_local(examples, repeat: int):
+    start = time.perf_counter()
+    intent_classifier.get_model()
+    train_seconds = time.perf_counter() - start
+
+    answered, correct, latencies = Counter(), Counter(), []
+    fallback, guessed_right = 0, 0
+    confusion = Counter()
+    for question, label in examples:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = intent_classifier.classify(question)
+            latencies.append(time.perf_counter() - start)
+        if result["label"] is None:
+            fallback += 1
+            guessed_right += result["guess"] == label
+        else:
+            answered[result["tier"]] += 1
+            correct[result["tier"]] += result["label"] == label
+        confusion[(label, result["label"] or "llm")] += 1
+
+    n = len(examples)
+    print(f"Trained in {train_seconds * 1000:.1f} ms; {n} evaluation questions")
+    for tier in ("rules", "model"):
+        if answered[tier]:
+            print(f"  {tier:<6} answered {answered[tier]:>3} ({answered[tier] / n:.0%}), "
+                  f"accuracy {correct[tier] / answered[tier]:.1%}")
+    print(f"  left to LLM {fallback} ({fallback / n:.0%}); local guess would have been right for {guessed_right}")
+    print(f"  accuracy of local answers: {sum(correct.values()) / max(1, sum(answered.values())):.1%}")
+    micros = [s * 1e6 for s in latencies]
+    print(f"  latency per question: p50 {statistics.median(micros):.1f} us, p99 {_percentile(micros, 99):.1f} us")
+    print("  confusion (expected -> predicted):")
+    for (expected, predicted), count in sorted(confusion.items()):
+        print(f"    {expected:<16} -> {predicted:<16} {count}")
+
+
+def bench_llm(examples):
+    from utils.llm_agent import _get_intent_chain
+
+    chain = _get_intent_chain()
+    correct, latencies = 0, []
+    for question, label in examples:
+        start = time.perf_counter()
+        result = chain.run(question).strip().lower()
+        latencies.append(time.perf_counter() - start)
+        correct += label in result
+    print(f"LLM only: accuracy {correct / len(examples):.1%}, "
+          f"latency p50 {statistics.median(latencies):.2f} s, p99 {_percentile(latencies, 99):.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval", default=intent_classifier.INTENT_EVAL_PATH)
+    parser.add_argument("--repeat", type=int, default=200, help="timed classifications per question")
+    parser.add_argument("--llm", action="store_true", help="also time the LLM classifier (needs Ollama)")
+    args = parser.parse_args()
+
+    examples = intent_classifier.load_examples(args.eval)
+    bench_local(examples, args.repeat)
+    if args.llm:
+        bench_llm(examples)
@@ -0,0 +1,412 @@
+"""
+End-to-end benchmark of the onboarding pipeline against synthetic sources.
+
+Builds a synthetic source (benchmarks/synthetic_source.py; SQLite unless --source-url
+points at e.g. a local MySQL/PostgreSQL container), starts the fake LLM and GitHub
+servers from tools/, and times each stage in-process:
+
+    discovery      catalog.refresh of the synthetic source (tables/sec)
+    profiling      profile_table per table, cache bypassed
+    extract_load   ingestion_runtime.extract_and_load, stream and partitioned (rows/sec)
+    dag_render     airflow_dag.main per ingestion config
+    audit_log      log_ingestion, batched and flushed per event
+    nl_to_sql      intent classification + query_llm round-trips, cold and memoized
+    github_pr      create_batch_ingestion_pr against the fake GitHub API
+
+Each stage reports wall time, throughput, per-item latency (p50/p95/max) and the
+peak Python heap seen by tracemalloc (native allocations, e.g. inside the database
+driver, are not counted; --no-tracemalloc gives timings without its overhead).
+Results are written as JSON; --compare flags regressions against an earlier run:
+
+    python benchmarks/bench_pipeline.py --tables 20 --rows 50000
+    python benchmarks/bench_pipeline.py --stages extract_load --compare benchmarks/results/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "tools"))
+
+from benchmarks.synthetic_source import create_source  # noqa: E402
+
+STAGES = ("discovery", "profiling", "extract_load", "dag_render", "audit_log", "nl_to_sql", "github_pr")
+SOURCE_NAME = "bench_source"
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+# Relative change beyond which --compare reports a regression
+DEFAULT_THRESHOLD = 0.15
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class StageTimer:
+    """Collects per-item latencies for one stage; item() is used as a context manager."""
+
+    def __init__(self):
+        self.latencies = []
+        self.extra = {}
+
+    @contextlib.contextmanager
+    def item(self):
+        started = time.perf_counter()
+        yield
+        self.latencies.append(time.perf_counter() - started)
+
+
+def run_stage(name: str, body, args, trace_memory: bool) -> dict:
+    """Run one stage body(timer, args) -> (items, unit) and summarize it; failures are recorded, not raised."""
+    timer = StageTimer()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            items, unit = body(timer, args)
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e.name or e}"}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+
+    result = {
+        "items": items,
+        "unit": unit,
+        "seconds": round(seconds, 4),
+        "throughput_per_sec": round(items / seconds, 2) if seconds > 0 else None,
+    }
+    if timer.latencies:
+        ms = [s * 1000 for s in timer.latencies]
+        result.update(latency_ms={
+            "p50": round(statistics.median(ms), 3),
+            "p95": round(_percentile(ms, 95), 3),
+            "max": round(max(ms), 3),
+        })
+    if peak is not None:
+        result["peak_mb"] = round(peak / 2 ** 20, 2)
+    result.update(timer.extra)
+    return result
+
+
+# ----------------------------- #
+#            STAGES
+# ----------------------------- #
+
+def _source_schema(url: str):
+    from sqlalchemy.engine import make_url
+
+    url = make_url(url)
+    return "main" if url.get_backend_name() == "sqlite" else url.database
+
+
+def bench_discovery(timer, args):
+    from data_ops import catalog
+
+    for _ in range(args.repeat):
+        with timer.item():
+            catalog.refresh(sources=[SOURCE_NAME], force=True)
+    tables = catalog.list_tables(SOURCE_NAME)
+    with timer.item():
+        catalog.list_tables(SOURCE_NAME)
+    timer.extra["warm_lookup_ms"] = round(timer.latencies.pop() * 1000, 3)
+    timer.extra["tables_found"] = len(tables)
+    return len(tables) * args.repeat, "tables"
+
+
+def bench_profiling(timer, args):
+    from data_ops.profiling import profile_table
+
+    schema = _source_schema(args.source_url)
+    for table in args.table_names[:args.profile_tables]:
+        with timer.item():
+            profile_table(SOURCE_NAME, schema, table, use_cache=False)
+    return min(len(args.table_names), args.profile_tables), "tables"
+
+
+def _ingestion_yaml(args, table: str, target: str = None, **options):
+    from data_ops.ingestion import build_ingestion_yaml
+
+    return build_ingestion_yaml(SOURCE_NAME, _source_schema(args.source_url), table, "main", target or f"{table}_copy",
+                                "benchmark", "synthetic table", "daily", "full", **options)
+
+
+def bench_extract_load(timer, args):
+    import yaml
+    import airflow_dag
+    import ingestion_runtime
+
+    target_url = f"sqlite:///{os.path.join(args.work_dir, 'target.db')}"
+    modes = {
+        "stream": {"chunk_size": args.chunk_size},
+        "partitioned": {"chunk_size": args.chunk_size, "partition_column": "id",
+                        "partitions": args.partitions, "max_concurrency": args.partitions},
+    }
+    rows = 0
+    for mode, options in modes.items():
+        mode_rows, mode_seconds = 0, 0.0
+        for table in args.table_names[:args.load_tables]:
+            spec = airflow_dag.build_params(yaml.safe_load(_ingestion_yaml(args, table, **options)))
+            spec.update(source_conn=args.source_url, target_conn=target_url)
+            started = time.perf_counter()
+            with timer.item():
+                result = ingestion_runtime.extract_and_load(spec, run_id=f"bench__{mode}__{time.time_ns()}")
+            mode_seconds += time.perf_counter() - started
+            mode_rows += result["rows"]
+        timer.extra[f"{mode}_rows_per_sec"] = round(mode_rows / mode_seconds, 1) if mode_seconds else None
+        rows += mode_rows
+    return rows, "rows"
+
+
+def bench_dag_render(timer, args):
+    import airflow_dag
+
+    config_dir = os.path.join(args.work_dir, "ingestion_configs")
+    output_dir, dags_dir = os.path.join(args.work_dir, "dag_outputs"), os.path.join(args.work_dir, "dags")
+    for directory in (config_dir, output_dir, dags_dir):
+        os.makedirs(directory, exist_ok=True)
+    count = 0
+    for i in range(args.render_configs):
+        table = args.table_names[i % len(args.table_names)]
+        yaml_path = os.path.join(config_dir, f"{table}_{i}.yaml")
+        with open(yaml_path, "w") as f:
+            f.write(_ingestion_yaml(args, table, target=f"{table}_copy_{i}"))
+        with timer.item():
+            airflow_dag.main(yaml_path, os.path.join(output_dir, f"{table}_{i}.py"), dags_dir)
+        count += 1
+    return count, "configs"
+
+
+def bench_audit_log(timer, args):
+    from log_to_audit import get_audit_writer, log_ingestion
+
+    batched_started = time.perf_counter()
+    for i in range(args.audit_events):
+        log_ingestion(SOURCE_NAME, "main", f"t_{i % 50}", "main", f"t_{i % 50}", "progress", f"chunk {i}",
+                      run_id="bench", flush=False)
+    get_audit_writer().flush()
+    batched_seconds = time.perf_counter() - batched_started
+    timer.extra["batched_events_per_sec"] = round(args.audit_events / batched_seconds, 1)
+
+    flushed = max(1, args.audit_events // 10)
+    for i in range(flushed):
+        with timer.item():
+            log_ingestion(SOURCE_NAME, "main", f"t_{i % 50}", "main", f"t_{i % 50}", "success", "done",
+                          run_id="bench", duration_seconds=0.0)
+    return args.audit_events + flushed, "events"
+
+
+def bench_nl_to_sql(timer, args):
+    from utils import llm_agent
+
+    questions = [f"What is the total amount by category in {table}?" for table in args.table_names]
+    questions += [f"Show the average of metric_1 per day for {table} this month" for table in args.table_names]
+    questions = questions[:args.questions]
+    for question in questions:
+        with timer.item():
+            if llm_agent.classify_intent(question) == "analytics_query":
+                llm_agent.query_llm(question)
+
+    memo = []
+    for question in questions:
+        started = time.perf_counter()
+        llm_agent.query_llm(question)
+        memo.append((time.perf_counter() - started) * 1000)
+    timer.extra["memoized_p50_ms"] = round(statistics.median(memo), 3)
+    retrieval = {}
+    llm_agent.build_sql_prompt(llm_agent.get_sql_chain(), questions[-1], retrieval)
+    timer.extra["prompt_tokens_last"] = retrieval.get("prompt_tokens")
+    timer.extra["llm_delay_s"] = args.llm_delay
+    return len(questions), "questions"
+
+
+def bench_github_pr(timer, args):
+    from github_integration.pr_creator import create_batch_ingestion_pr
+
+    state = args.github_state
+    before = state.request_count
+    for i in range(args.prs):
+        configs = {f"{SOURCE_NAME}/{table}": _ingestion_yaml(args, table)
+                   for table in args.table_names[:args.pr_tables]}
+        with timer.item():
+            create_batch_ingestion_pr("bench/onboarding", f"bench-{i}-{time.time_ns()}", configs,
+                                      f"Onboard {len(configs)} tables", "Benchmark run")
+    timer.extra["requests_per_pr"] = round((state.request_count - before) / max(1, args.prs), 1)
+    return args.prs, "pull requests"
+
+
+_BODIES = {
+    "discovery": bench_discovery,
+    "profiling": bench_profiling,
+    "extract_load": bench_extract_load,
+    "dag_render": bench_dag_render,
+    "audit_log": bench_audit_log,
+    "nl_to_sql": bench_nl_to_sql,
+    "github_pr": bench_github_pr,
+}
+
+
+# ----------------------------- #
+#        SETUP AND REPORT
+# ----------------------------- #
+
+def configure_environment(args):
+    """
+    Point every module's storage at the work directory and its services at the fakes.
+    Must run before repo modules are imported: they read these settings at import time.
+    """
+    import fake_github_server
+    import fake_llm_server
+
+    _, llm_url = fake_llm_server.serve_in_background(
+        reply="SELECT category, SUM(amount) FROM synthetic_0000 GROUP BY category;",
+        first_token_delay=args.llm_delay, token_delay=0.0)
+    _, github_url, args.github_state = fake_github_server.serve_in_background()
+
+    work = args.work_dir
+    os.environ.update({
+        "CATALOG_DB_PATH": os.path.join(work, "metadata_catalog.db"),
+        "AUDIT_DB_PATH": os.path.join(work, "audit.db"),
+        "PROFILE_CACHE_DIR": os.path.join(work, "profile_cache"),
+        "RESULT_CACHE_DIR": os.path.join(work, "result_cache"),
+        "INTENT_REVIEW_LOG": os.path.join(work, "intent_review.jsonl"),
+        "SCHEMA_INDEX_SOURCE": SOURCE_NAME,
+        "SCHEMA_FALLBACK_TABLES": args.table_names[0],
+        "OLLAMA_BASE_URL": llm_url,
+        "OPENAI_API_BASE": f"{llm_url}/v1",
+        "GITHUB_API_URL": github_url,
+        "GITHUB_TOKEN": "bench",
+        "GITHUB_SECONDS_BETWEEN_WRITES": "0",
+    })
+
+    # Discovery and profiling resolve sources through DB_CONFIGS: scan only the synthetic one
+    from data_ops import discovery
+    from utils.engine_registry import register_source
+
+    discovery.DB_CONFIGS.clear()
+    discovery.DB_CONFIGS[SOURCE_NAME] = args.source_url
+    register_source(SOURCE_NAME, args.source_url)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """[(stage, metric, baseline, current, relative change)] for metrics worse by more than threshold."""
+    regressions = []
+    for stage, now in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before or "items" not in now or "items" not in before:
+            continue
+        checks = [
+            ("throughput_per_sec", now.get("throughput_per_sec"), before.get("throughput_per_sec"), -1),
+            ("latency_p95_ms", (now.get("latency_ms") or {}).get("p95"), (before.get("latency_ms") or {}).get("p95"), 1),
+            ("peak_mb", now.get("peak_mb"), before.get("peak_mb"), 1),
+        ]
+        for metric, value, old, worse_sign in checks:
+            if value is None or not old:
+                continue
+            change = (value - old) / old
+            if change * worse_sign > threshold:
+                regressions.append((stage, metric, old, value, round(change, 3)))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--source-url", help="SQLAlchemy URL of the synthetic source (default: SQLite in --work-dir)")
+    parser.add_argument("--work-dir", help="catalog, audit DB, caches and targets go here (default: a temp dir)")
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=20000, help="rows per table")
+    parser.add_argument("--columns", type=int, default=12, help="columns per table")
+    parser.add_argument("--text-width", type=int, default=24, help="characters per text value")
+    parser.add_argument("--repeat", type=int, default=3, help="discovery scans")
+    parser.add_argument("--profile-tables", type=int, default=5)
+    parser.add_argument("--load-tables", type=int, default=2, help="tables loaded per extract mode")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--render-configs", type=int, default=50)
+    parser.add_argument("--audit-events", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="simulated model latency per answer (s)")
+    parser.add_argument("--prs", type=int, default=5)
+    parser.add_argument("--pr-tables", type=int, default=10, help="configs per pull request")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip peak memory (removes its overhead)")
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    args.work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(args.work_dir, exist_ok=True)
+    args.source_url = args.source_url or f"sqlite:///{os.path.join(args.work_dir, 'source.db')}"
+    generated = create_source(args.source_url, args.tables, args.rows, args.columns, args.text_width)
+    args.table_names = generated["tables"]
+    print(f"Source: {args.tables} tables x {args.rows:,} rows x {args.columns} columns "
+          f"({generated['rows']:,} rows written in {generated['seconds']}s)")
+    configure_environment(args)
+
+    results = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "source": args.source_url.split("://")[0],
+            "params": {k: v for k, v in vars(args).items()
+                       if k not in ("github_state", "table_names", "output", "compare", "work_dir")},
+        },
+        "stages": {},
+    }
+    print(f"{'stage':<13} {'items':>8} {'seconds':>9} {'per sec':>10} {'p50 ms':>9} {'p95 ms':>9} {'peak MB':>8}")
+    for stage in args.stages:
+        r = run_stage(stage, _BODIES[stage], args, trace_memory=not args.no_tracemalloc)
+        results["stages"][stage] = r
+        if "items" not in r:
+            print(f"{stage:<13} {r.get('skipped') or r.get('error')}")
+            continue
+        lat = r.get("latency_ms") or {}
+        print(f"{stage:<13} {r['items']:>8} {r['seconds']:>9.3f} {r['throughput_per_sec'] or 0:>10,.1f} "
+              f"{lat.get('p50', ''):>9} {lat.get('p95', ''):>9} {r.get('peak_mb', ''):>8}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changed = sorted(k for k, v in results["meta"]["params"].items()
+                         if baseline.get("meta", {}).get("params", {}).get(k) != v)
+        if changed:
+            print(f"Note: parameters differ from the baseline ({', '.join(changed)}); numbers may not be comparable")
+        regressions = compare(results, baseline, args.threshold)
+        for stage, metric, old, new, change in regressions:
+            print(f"REGRESSION {stage}.{metric}: {old} -> {new} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
@@ -1,13 +1,85 @@
+import math
+import os
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import streamlit as st
-from utils.db import run_query
+from sqlalchemy.exc import DBAPIError
+from utils.db import QUERY_MAX_ROWS, get_engine, run_aggregate
+from utils.result_cache import run_query_cached
+from utils.sql_guard import SQL_GUARD_TIMEOUT_SECONDS, QueryRejected, guard_query, is_timeout_error
 
-def auto_render_output(query: str):
-    df = run_query(query)
+PAGE_SIZE_OPTIONS = [25, 100, 500]
+BAR_TOP_N = 20          # bars beyond this are folded into "Other"
+LINE_MAX_POINTS = 1000  # line charts are downsampled with LTTB beyond this
+# Rows of a capped result the server-side chart aggregate may read
+AGGREGATE_MAX_ROWS = int(os.getenv("AGGREGATE_MAX_ROWS", "1000000"))
+
+
+def lttb_downsample(x, y, threshold: int):
+    """
+    Largest-Triangle-Three-Buckets: pick `threshold` points that preserve the visual
+    shape of the series. x must be sorted and numeric; returns selected indices.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(math.floor(i * bucket_size)) + 1
+        end = int(math.floor((i + 1) * bucket_size)) + 1
+        next_start = end
+        next_end = min(int(math.floor((i + 2) * bucket_size)) + 1, n)
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def _render_table(df, truncated: bool):
+    """Show one page of the result at a time instead of the whole frame."""
+    page_size = st.selectbox("Rows per page", PAGE_SIZE_OPTIONS, key="result_page_size")
+    pages = max(1, math.ceil(len(df) / page_size))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="result_page") if pages > 1 else 1
+    start = (page - 1) * page_size
+    st.dataframe(df.iloc[start:start + page_size])
+    if truncated:
+        st.caption(f"Showing the first {len(df):,} rows; the query returned more and was capped at {QUERY_MAX_ROWS:,}.")
+
+
+def auto_render_output(query: str, use_cache: bool = True):
+    notes = []
+
+    def preflight(sql):
+        guarded = guard_query(sql, engine=get_engine())
+        notes.extend(guarded["notes"])
+        return guarded["sql"]
+
+    try:
+        df, truncated, from_cache = run_query_cached(query, bypass_cache=not use_cache, preflight=preflight)
+    except QueryRejected as e:
+        st.error(f"🛑 Query not run: {e.reason}")
+        return
+    except DBAPIError as e:
+        if not is_timeout_error(e):
+            raise
+        st.error(f"⏱️ Query stopped after {SQL_GUARD_TIMEOUT_SECONDS:g}s (SQL_GUARD_TIMEOUT_SECONDS). "
+                 "Narrow the question or add filters.")
+        return
 
     st.write("### Query Result:")
-    st.dataframe(df)
+    for note in notes:
+        st.info(f"ℹ️ {note}")
+    if from_cache:
+        st.caption("Served from the local result cache; the source tables have not changed since it was stored.")
+    _render_table(df, truncated)
 
     if df.empty:
         st.warning("⚠️ Query returned no data.")
@@ -23,15 +95,31 @@ def auto_render_output(query: str):
 
     # Simple heuristic to decide what to plot
     num_cols = df.select_dtypes(include=['number']).columns.tolist()
-    cat_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    cat_cols = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
 
     # Example: Bar plot if 1 categorical + 1 numeric
     if len(cat_cols) == 1 and len(num_cols) == 1:
         cat_col = cat_cols[0]
         num_col = num_cols[0]
+        if truncated:
+            # The capped rows are not the whole answer: aggregate a larger bounded result in the
+            # database. The query already passed the plan check before it ran (or was cached).
+            try:
+                guarded = guard_query(query, engine=get_engine(), max_rows=AGGREGATE_MAX_ROWS, explain=False)
+                plot_df = run_aggregate(guarded["sql"], cat_col, num_col, BAR_TOP_N)
+            except (QueryRejected, DBAPIError) as e:
+                if isinstance(e, DBAPIError) and not is_timeout_error(e):
+                    raise
+                st.warning("⚠️ Aggregating the full result was not possible; the chart covers the fetched rows only.")
+                plot_df = df.groupby(cat_col, dropna=False)[num_col].sum().nlargest(BAR_TOP_N).reset_index()
+        else:
+            totals = df.groupby(cat_col, dropna=False)[num_col].sum().sort_values(ascending=False)
+            plot_df = totals.head(BAR_TOP_N).reset_index()
+            if len(totals) > BAR_TOP_N:
+                plot_df.loc[len(plot_df)] = ["Other", totals.iloc[BAR_TOP_N:].sum()]
         st.write(f"### Bar Chart: {num_col} by {cat_col}")
         fig, ax = plt.subplots(figsize=(10, 5))
-        sns.barplot(data=df, x=cat_col, y=num_col, ax=ax)
+        sns.barplot(data=plot_df, x=cat_col, y=num_col, ax=ax)
         ax.set_xticklabels(ax.get_xticklabels(), rotation=45)
         st.pyplot(fig)
         plt.close(fig)
@@ -40,9 +128,17 @@ def auto_render_output(query: str):
     elif any(df.dtypes == 'datetime64[ns]') and len(num_cols) >= 1:
         dt_col = df.select_dtypes(include=['datetime']).columns[0]
         num_col = num_cols[0]
+        series = df[[dt_col, num_col]].dropna().sort_values(dt_col)
+        if len(series) > LINE_MAX_POINTS:
+            x = series[dt_col].astype("int64").to_numpy(dtype=float)
+            y = series[num_col].to_numpy(dtype=float)
+            series = series.iloc[lttb_downsample(x, y, LINE_MAX_POINTS)]
+            st.caption(f"Line downsampled to {LINE_MAX_POINTS:,} points (LTTB).")
         st.write(f"### Line Chart: {num_col} over {dt_col}")
         fig, ax = plt.subplots(figsize=(10, 5))
-        sns.lineplot(data=df, x=dt_col, y=num_col, ax=ax)
+        ax.plot(series[dt_col], series[num_col])
+        ax.set_xlabel(dt_col)
+        ax.set_ylabel(num_col)
         st.pyplot(fig)
         plt.close(fig)
 
@@ -59,4 +155,3 @@ def auto_render_output(query: str):
 
     else:
         st.info("ℹ️ Showing data table. No suitable plot type detected.")
-        st.dataframe(df)
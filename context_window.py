@@ -0,0 +1,105 @@
+"""
+Token-budgeted conversation history.
+
+Keeps the system prompt and the most recent turns verbatim and folds older turns
+into a rolling summary, so the prompt sent on every turn stays within a fixed
+token budget however long the session runs.
+"""
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a character heuristic
+    _ENCODING = None
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role markers and separators per chat message
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def count_message_tokens(messages) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text)[-max_tokens:])
+    return text[-max_tokens * 4:]
+
+
+class ContextWindow:
+    def __init__(self, system_prompt: str = "", max_prompt_tokens: int = 3000,
+                 keep_recent_turns: int = 4, summary_max_tokens: int = 400, summarizer=None):
+        """
+        summarizer: function(previous_summary, messages) -> str, used to fold old turns.
+        Without one (or if it fails) old turns are folded extractively.
+        """
+        self.system_prompt = system_prompt
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_recent_messages = keep_recent_turns * 2
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        self.messages = []  # turns not yet folded into the summary
+        self.turn_prompt_tokens = []  # prompt size sent on each turn
+
+    def add(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+
+    def discard_last(self):
+        """Drop the latest turn, e.g. a question that got no answer."""
+        if self.messages:
+            self.messages.pop()
+
+    def _header(self):
+        header = []
+        if self.system_prompt:
+            header.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            header.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        return header
+
+    def _fold(self, old_messages):
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self.summary, old_messages)
+            except Exception as e:
+                print(f"Error summarizing conversation history: {e}")
+        if not summary:
+            lines = [self.summary] if self.summary else []
+            lines += [f"{m['role']}: {m['content']}" for m in old_messages]
+            summary = "\n".join(lines)
+        self.summary = _truncate_to_tokens(summary, self.summary_max_tokens)
+
+    def prompt_messages(self) -> list:
+        """Messages to send for the next call, folding old turns until they fit the budget."""
+        def size():
+            return count_message_tokens(self._header() + self.messages)
+
+        if size() > self.max_prompt_tokens and len(self.messages) > self.keep_recent_messages:
+            # Fold everything but the recent turns in one summarization call; the freed
+            # headroom means the next few turns go out without another fold
+            self._fold(self.messages[:-self.keep_recent_messages])
+            self.messages = self.messages[-self.keep_recent_messages:]
+
+        # A single oversized recent message: fold the oldest verbatim turns too, never the latest.
+        # Repeated because the summary they are folded into also takes room in the prompt
+        while size() > self.max_prompt_tokens and len(self.messages) > 1:
+            dropped = []
+            while size() > self.max_prompt_tokens and len(self.messages) > 1:
+                dropped.append(self.messages.pop(0))
+            self._fold(dropped)
+
+        prompt = self._header() + self.messages
+        self.turn_prompt_tokens.append(count_message_tokens(prompt))
+        return prompt
+
+    @property
+    def last_prompt_tokens(self) -> int:
+        return self.turn_prompt_tokens[-1] if self.turn_prompt_tokens else 0
@@ -1,75 +1,98 @@
 import json
 import re
 from llama_client import LlamaClient
+from context_window import ContextWindow
 from data_ops.discovery import discover_sources, discover_sources_full, check_table_in_sources
 from data_ops.profiling import profile_table
 from data_ops.ingestion import build_ingestion_yaml
-from github_integration.pr_creator import create_ingestion_pr
+from github_integration.pr_creator import create_batch_ingestion_pr, create_ingestion_pr
+from utils import tracing
+from utils.jobs import get_job_manager, report_progress
 
 
 class ConversationManager:
-    def __init__(self):
+    def __init__(self, max_prompt_tokens: int = 3000, keep_recent_turns: int = 4):
         self.llama = LlamaClient()  # Llama LLM client
-        self.context = []  # Conversation history
+        # Conversation history, kept within a token budget by folding old turns into a summary
+        self.context = ContextWindow(
+            max_prompt_tokens=max_prompt_tokens,
+            keep_recent_turns=keep_recent_turns,
+            summarizer=self._summarize_history
+        )
         self.state = {}  # Track state (e.g., selected source, schema, etc.)
 
     def user_message(self, text: str) -> str:
         """Handles the user message and fetches response from the LLM."""
-        self.context.append({"role": "user", "content": text})
-        response = self.llama.chat(self.context)
+        self.context.add("user", text)
+        response = self.llama.chat(self.context.prompt_messages())
         assistant_text = response.get("text", "")
-        self.context.append({"role": "assistant", "content": assistant_text})
+        self.context.add("assistant", assistant_text)
         return assistant_text
 
+    def user_message_stream(self, text: str, metrics: dict = None):
+        """
+        Like user_message, but yields the assistant reply as it is generated; stream
+        timing goes to `metrics`. If the LLM call fails (or the stream is abandoned) the
+        error propagates and the question is taken back out of the history, so no
+        unanswered user turn is left behind.
+        """
+        self.context.add("user", text)
+        parts = []
+        answered = False
+        try:
+            for delta in self.llama.chat_stream(self.context.prompt_messages(), metrics):
+                parts.append(delta)
+                yield delta
+            answered = True
+        finally:
+            if not answered:
+                self.context.discard_last()
+        self.context.add("assistant", "".join(parts))
+
+    @property
+    def prompt_token_counts(self) -> list:
+        """Prompt tokens sent to the LLM on each turn so far."""
+        return list(self.context.turn_prompt_tokens)
+
+    def _summarize_history(self, previous_summary: str, messages: list) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        response = self.llama.chat([
+            {"role": "system", "content": "Summarize this data-onboarding conversation in a few sentences. "
+                                          "Keep sources, schemas, tables and decisions the user made."},
+            {"role": "user", "content": f"Earlier summary:\n{previous_summary}\n\nNew turns:\n{transcript}"}
+        ])
+        return response.get("text", "")
+
+    def submit_action(self, action: str, owner: str = "default", **kwargs) -> str:
+        """
+        Run an action on the shared background workers; returns a job id to poll with
+        get_job_manager().status() and collect with collect_action(). Submitting an action
+        with the same arguments as one still in flight, from any session, returns that
+        job's id instead of starting it again: the job runs perform_action, which touches
+        no session, and each session records the result in its own state when collecting it.
+        """
+        return get_job_manager().submit(perform_action, action, owner=owner, label=action, **kwargs)
+
+    def collect_action(self, action: str, job_id: str):
+        """Result of a finished submit_action job, recorded in this session's state."""
+        result = get_job_manager().result(job_id)
+        self._remember(action, result)
+        return result
+
     def run_action(self, action: str, **kwargs):
         """Runs the specified action based on the user input."""
-        if action == "discover_sources":
-            sources = discover_sources()
-            self.state['sources'] = sources
-            return sources
-        elif action == "discover_sources_full":
-            full_sources = discover_sources_full()
-            self.state['full_sources'] = full_sources
-            return full_sources
-        elif action == "check_table":
-            return check_table_in_sources(kwargs["table"])
-        elif action == "profile_table":
-            profiling_result = profile_table(
-                kwargs["source"], kwargs["schema"], kwargs["table"]
-            )
-            self.state['profiling_result'] = profiling_result
-            return profiling_result
-        elif action == "build_ingest_yaml":
-            ingestion_yaml = build_ingestion_yaml(
-                source_name=kwargs["source_name"],
-                source_schema=kwargs["source_schema"],
-                source_table=kwargs["source_table"],
-                target_schema=kwargs["target_schema"],
-                target_table=kwargs["target_table"],
-                domain=kwargs.get("domain", ""),
-                description=kwargs.get("description", ""),
-                refresh=kwargs.get("refresh", ""),
-                load_strategy=kwargs.get("load_strategy", "incremental")
-            )
-            self.state['ingestion_yaml'] = ingestion_yaml
-            return ingestion_yaml
-        elif action == "create_github_pr":
-            pr_response = create_ingestion_pr(
-                repo_full_name=kwargs["repo_full_name"],
-                pr_branch=kwargs["pr_branch"],
-                yaml_content=kwargs["yaml_content"],
-                pr_title=kwargs["pr_title"],
-                pr_body=kwargs["pr_body"]
-            )
-            self.state['pr_url'] = pr_response.html_url
-            return pr_response
-        elif action == "parse_ingestion_prompt":
-            return self.parse_ingestion_prompt(kwargs["prompt"])
-        else:
-            raise ValueError(f"Unknown action: {action}")
-
-
-    def parse_ingestion_prompt(self, prompt: str) -> dict:
+        result = perform_action(action, **kwargs)
+        self._remember(action, result)
+        return result
+
+    def _remember(self, action: str, result):
+        if action in _STATE_KEYS:
+            self.state[_STATE_KEYS[action]] = result
+        elif action in ("create_github_pr", "create_github_batch_pr"):
+            self.state['pr_url'] = result.html_url
+
+    @staticmethod
+    def parse_ingestion_prompt(prompt: str) -> dict:
         prompt_lower = prompt.lower()
         result = {}
 
@@ -99,6 +122,25 @@ class ConversationManager:
         elif "incremental" in prompt_lower:
             result["load_strategy"] = "incremental"
 
+        # Incremental details, e.g. "watermark column updated_at, key txn_id"
+        watermark_match = re.search(r"watermark(?:\s+column)?\s*[:=]?\s*([a-z_][a-z0-9_]*)", prompt_lower)
+        if watermark_match:
+            result["watermark_column"] = watermark_match.group(1)
+        key_match = re.search(r"\b(?:merge |primary |unique )?keys?\s*[:=]?\s+([a-z_][a-z0-9_]*(?:\s*,\s*[a-z_][a-z0-9_]*)*)", prompt_lower)
+        if key_match and result.get("load_strategy") == "incremental":
+            result["merge_keys"] = [k.strip() for k in key_match.group(1).split(",")]
+
+        # Partitioned extraction, e.g. "partition by txn_id into 16 partitions"
+        partition_match = re.search(r"partition(?:ed)?\s+(?:by|on)\s+([a-z_][a-z0-9_]*)", prompt_lower)
+        if partition_match:
+            result["partition_column"] = partition_match.group(1)
+            count_match = re.search(r"(\d+)\s+partitions", prompt_lower)
+            if count_match:
+                result["partitions"] = int(count_match.group(1))
+        checkpoint_match = re.search(r"checkpoint(?:ed)?\s+(?:by|on)\s+([a-z_][a-z0-9_]*)", prompt_lower)
+        if checkpoint_match:
+            result["checkpoint_column"] = checkpoint_match.group(1)
+
         # Refresh schedule
         if "daily" in prompt_lower:
             result["refresh"] = "daily"
@@ -120,3 +162,77 @@ class ConversationManager:
         """
         match = re.search(r"{[\s\S]+?}", text)
         return match.group(0) if match else "{}"
+
+
+# Where a session keeps the result of each action in ConversationManager.state
+_STATE_KEYS = {
+    "discover_sources": "sources",
+    "discover_sources_full": "full_sources",
+    "profile_table": "profiling_result",
+    "build_ingest_yaml": "ingestion_yaml",
+}
+
+
+def perform_action(action: str, **kwargs):
+    """Run one action; depends only on its arguments, so one job can serve every session asking for it."""
+    with tracing.span(f"action.{action}", action=action):
+        return _perform_action(action, **kwargs)
+
+
+def _perform_action(action: str, **kwargs):
+    if action == "discover_sources":
+        return discover_sources()
+    elif action == "discover_sources_full":
+        # A plain keyword keeps the job keyed on its arguments; the catalog's index matches it
+        return discover_sources_full(keyword=kwargs.get("keyword") or None)
+    elif action == "check_table":
+        return check_table_in_sources(kwargs["table"])
+    elif action == "profile_table":
+        return profile_table(
+            kwargs["source"], kwargs["schema"], kwargs["table"],
+            full_report=kwargs.get("full_report", False)
+        )
+    elif action == "build_ingest_yaml":
+        return build_ingestion_yaml(
+            source_name=kwargs["source_name"],
+            source_schema=kwargs["source_schema"],
+            source_table=kwargs["source_table"],
+            target_schema=kwargs["target_schema"],
+            target_table=kwargs["target_table"],
+            domain=kwargs.get("domain", ""),
+            description=kwargs.get("description", ""),
+            refresh=kwargs.get("refresh", ""),
+            load_strategy=kwargs.get("load_strategy", "incremental"),
+            chunk_size=kwargs.get("chunk_size", 50000),
+            watermark_column=kwargs.get("watermark_column", ""),
+            merge_keys=kwargs.get("merge_keys"),
+            partition_column=kwargs.get("partition_column", ""),
+            partitions=kwargs.get("partitions", 8),
+            max_concurrency=kwargs.get("max_concurrency", 4),
+            checkpoint_column=kwargs.get("checkpoint_column", ""),
+            staging=kwargs.get("staging", False),
+            staging_dir=kwargs.get("staging_dir", "")
+        )
+    elif action == "create_github_pr":
+        report_progress(0.1, "Creating GitHub PR...")
+        return create_ingestion_pr(
+            repo_full_name=kwargs["repo_full_name"],
+            pr_branch=kwargs["pr_branch"],
+            yaml_content=kwargs["yaml_content"],
+            pr_title=kwargs["pr_title"],
+            pr_body=kwargs["pr_body"]
+        )
+    elif action == "create_github_batch_pr":
+        # kwargs["configs"]: {name: yaml_content}, e.g. every table of a schema in one PR
+        report_progress(0.1, f"Committing {len(kwargs['configs'])} configs and opening a PR...")
+        return create_batch_ingestion_pr(
+            repo_full_name=kwargs["repo_full_name"],
+            pr_branch=kwargs["pr_branch"],
+            configs=kwargs["configs"],
+            pr_title=kwargs["pr_title"],
+            pr_body=kwargs["pr_body"]
+        )
+    elif action == "parse_ingestion_prompt":
+        return ConversationManager.parse_ingestion_prompt(kwargs["prompt"])
+    else:
+        raise ValueError(f"Unknown action: {action}")
@@ -0,0 +1,43 @@
+"""
+Airflow DAG factory: one file that defines every ingestion DAG.
+
+Alternative to deploying one rendered file per table. The scheduler parses this
+single module, which builds all DAGs from ingestion_manifest.json (compiled by
+`python airflow_dag.py --manifest ...`). Deploy it next to ingestion_runtime.py,
+log_to_audit.py and the manifest. Top-level imports are kept to the minimum needed
+to declare DAGs; the manifest is only re-read when its mtime changes.
+"""
+import os
+from functools import partial
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from ingestion_runtime import DEFAULT_ARGS, extract_and_load, load_manifest, record_audit
+
+MANIFEST_PATH = os.getenv(
+    "INGESTION_MANIFEST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingestion_manifest.json")
+)
+
+
+def build_dag(spec):
+    with DAG(
+        dag_id=spec["dag_id"],
+        default_args=DEFAULT_ARGS,
+        schedule_interval=spec["schedule"],
+        catchup=False,
+    ) as dag:
+        run_ingest = PythonOperator(
+            task_id="run_ingest",
+            python_callable=partial(extract_and_load, spec)
+        )
+        log_audit = PythonOperator(
+            task_id="log_audit",
+            python_callable=partial(record_audit, spec)
+        )
+        run_ingest >> log_audit
+    return dag
+
+
+# The scheduler discovers DAG objects in module globals
+for _spec in load_manifest(MANIFEST_PATH):
+    globals()[_spec["dag_id"]] = build_dag(_spec)
@@ -0,0 +1,339 @@
+"""
+Local metadata catalog for discovery.
+
+Tables, columns and row estimates of every source are cached in a SQLite file so
+exploration is answered locally instead of re-scanning production databases.
+A source is re-scanned once its entry is older than CATALOG_TTL seconds; the
+re-scan is a single bulk query per source, and columns are re-reflected only
+for tables whose schema_version changed. A source that errors or times out keeps
+its last catalog contents and is not retried for CATALOG_RETRY_BACKOFF seconds,
+doubling with each consecutive failure up to CATALOG_TTL.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from data_ops.discovery import DB_CONFIGS, iter_discovered_tables, reflect_columns
+from utils import tracing
+
+CATALOG_PATH = os.getenv(
+    "CATALOG_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metadata_catalog.db")
+)
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "600"))
+CATALOG_RETRY_BACKOFF = float(os.getenv("CATALOG_RETRY_BACKOFF", "60"))
+
+_init_lock = threading.Lock()
+_initialized_paths = set()
+_fts_enabled = {}
+
+
+@contextmanager
+def _connect():
+    """Short-lived catalog connection; commits on success and always closes."""
+    conn = sqlite3.connect(CATALOG_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if CATALOG_PATH not in _initialized_paths:
+            with _init_lock:
+                if CATALOG_PATH not in _initialized_paths:
+                    _create_schema(conn)
+                    _initialized_paths.add(CATALOG_PATH)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _create_schema(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS catalog_sources (
+        source_name TEXT PRIMARY KEY,
+        refreshed_at REAL NOT NULL,
+        failures INTEGER NOT NULL DEFAULT 0,
+        retry_after REAL NOT NULL DEFAULT 0,
+        last_error TEXT
+    );
+    CREATE TABLE IF NOT EXISTS catalog_tables (
+        source_name TEXT NOT NULL,
+        schema_name TEXT,
+        table_name TEXT NOT NULL,
+        table_name_lower TEXT NOT NULL,
+        column_count INTEGER,
+        row_estimate INTEGER,
+        schema_version TEXT,
+        data_version TEXT,
+        comment TEXT,
+        refreshed_at REAL NOT NULL,
+        PRIMARY KEY (source_name, schema_name, table_name)
+    );
+    CREATE INDEX IF NOT EXISTS ix_catalog_tables_name ON catalog_tables (table_name_lower);
+    CREATE TABLE IF NOT EXISTS catalog_columns (
+        source_name TEXT NOT NULL,
+        schema_name TEXT,
+        table_name TEXT NOT NULL,
+        ordinal INTEGER NOT NULL,
+        column_name TEXT NOT NULL,
+        data_type TEXT,
+        comment TEXT,
+        PRIMARY KEY (source_name, schema_name, table_name, ordinal)
+    );
+    """)
+    # Catalogs created before comments were collected
+    for table in ("catalog_tables", "catalog_columns"):
+        if "comment" not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN comment TEXT")
+    # Catalogs created before failed scans were recorded
+    source_columns = {row[1] for row in conn.execute("PRAGMA table_info(catalog_sources)")}
+    for name, ddl in (("failures", "INTEGER NOT NULL DEFAULT 0"), ("retry_after", "REAL NOT NULL DEFAULT 0"),
+                      ("last_error", "TEXT")):
+        if name not in source_columns:
+            conn.execute(f"ALTER TABLE catalog_sources ADD COLUMN {name} {ddl}")
+    # Trigram full-text index for substring lookups; needs SQLite >= 3.34 with FTS5
+    try:
+        conn.executescript("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS catalog_tables_fts USING fts5(
+            table_name_lower, content='catalog_tables', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS catalog_tables_ai AFTER INSERT ON catalog_tables BEGIN
+            INSERT INTO catalog_tables_fts (rowid, table_name_lower) VALUES (new.rowid, new.table_name_lower);
+        END;
+        CREATE TRIGGER IF NOT EXISTS catalog_tables_ad AFTER DELETE ON catalog_tables BEGIN
+            INSERT INTO catalog_tables_fts (catalog_tables_fts, rowid, table_name_lower)
+            VALUES ('delete', old.rowid, old.table_name_lower);
+        END;
+        CREATE TRIGGER IF NOT EXISTS catalog_tables_au AFTER UPDATE ON catalog_tables BEGIN
+            INSERT INTO catalog_tables_fts (catalog_tables_fts, rowid, table_name_lower)
+            VALUES ('delete', old.rowid, old.table_name_lower);
+            INSERT INTO catalog_tables_fts (rowid, table_name_lower) VALUES (new.rowid, new.table_name_lower);
+        END;
+        """)
+        _fts_enabled[CATALOG_PATH] = True
+    except sqlite3.OperationalError as e:
+        print(f"Catalog substring index unavailable, using LIKE scans: {e}")
+        _fts_enabled[CATALOG_PATH] = False
+    conn.commit()
+
+
+def _table_dict(row) -> dict:
+    return {
+        "source_name": row["source_name"],
+        "schema": row["schema_name"],
+        "table": row["table_name"],
+        "column_count": row["column_count"],
+        "row_estimate": row["row_estimate"],
+        "schema_version": row["schema_version"],
+        "data_version": row["data_version"],
+        "comment": row["comment"],
+    }
+
+
+def stale_sources(ttl: float = None) -> list:
+    """
+    Configured sources never scanned, or scanned more than `ttl` seconds ago, that are
+    not backing off after a failed scan.
+    """
+    ttl = CATALOG_TTL if ttl is None else ttl
+    with _connect() as conn:
+        scans = {row["source_name"]: row for row in
+                 conn.execute("SELECT source_name, refreshed_at, retry_after FROM catalog_sources")}
+    now = time.time()
+    return [
+        name for name in DB_CONFIGS
+        if name not in scans or (now - scans[name]["refreshed_at"] > ttl and now >= scans[name]["retry_after"])
+    ]
+
+
+def _record_failed_scan(source_name: str, error: str):
+    """Back off before the next scan of a source; its catalog entries are kept meanwhile."""
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute("SELECT failures FROM catalog_sources WHERE source_name = ?", (source_name,)).fetchone()
+        failures = (row["failures"] if row else 0) + 1
+        retry_after = now + min(CATALOG_RETRY_BACKOFF * 2 ** (failures - 1), max(CATALOG_TTL, CATALOG_RETRY_BACKOFF))
+        conn.execute(
+            "INSERT INTO catalog_sources (source_name, refreshed_at, failures, retry_after, last_error) "
+            "VALUES (?, 0, ?, ?, ?) "
+            "ON CONFLICT (source_name) DO UPDATE SET failures = excluded.failures, "
+            "retry_after = excluded.retry_after, last_error = excluded.last_error",
+            (source_name, failures, retry_after, error)
+        )
+
+
+@tracing.traced("discovery.refresh")
+def refresh(sources=None, force: bool = False) -> dict:
+    """
+    Re-scan the given (default: stale) sources and update the catalog incrementally.
+    Returns {source_name: number of tables whose columns were re-reflected}.
+    """
+    if sources is None:
+        sources = list(DB_CONFIGS) if force else stale_sources()
+    if not sources:
+        return {}
+
+    changed = {}
+    for source_name, tables in iter_discovered_tables(sources=sources):
+        changed[source_name] = _apply_source_scan(source_name, tables)
+    for source_name in sources:
+        if source_name not in changed and source_name in DB_CONFIGS:
+            _record_failed_scan(source_name, "scan failed or timed out")
+    return changed
+
+
+def _apply_source_scan(source_name: str, tables: list) -> int:
+    now = time.time()
+    with _connect() as conn:
+        known = {
+            (row["schema_name"], row["table_name"]): row["schema_version"]
+            for row in conn.execute(
+                "SELECT schema_name, table_name, schema_version FROM catalog_tables WHERE source_name = ?",
+                (source_name,)
+            )
+        }
+
+    # Columns are re-reflected only for new tables and tables whose schema changed
+    scanned = {(t["schema"], t["table"]) for t in tables}
+    to_reflect = [
+        t for t in tables
+        if (t["schema"], t["table"]) not in known
+        or t["schema_version"] is None
+        or known[(t["schema"], t["table"])] != t["schema_version"]
+    ]
+    columns = reflect_columns(DB_CONFIGS[source_name], [t["table"] for t in to_reflect]) if to_reflect else {}
+
+    with _connect() as conn:
+        for schema_name, table_name in set(known) - scanned:
+            conn.execute(
+                "DELETE FROM catalog_tables WHERE source_name = ? AND schema_name = ? AND table_name = ?",
+                (source_name, schema_name, table_name)
+            )
+            conn.execute(
+                "DELETE FROM catalog_columns WHERE source_name = ? AND schema_name = ? AND table_name = ?",
+                (source_name, schema_name, table_name)
+            )
+
+        conn.executemany("""
+        INSERT INTO catalog_tables (
+            source_name, schema_name, table_name, table_name_lower,
+            column_count, row_estimate, schema_version, data_version, comment, refreshed_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source_name, schema_name, table_name) DO UPDATE SET
+            column_count = excluded.column_count,
+            row_estimate = excluded.row_estimate,
+            schema_version = excluded.schema_version,
+            data_version = excluded.data_version,
+            comment = excluded.comment,
+            refreshed_at = excluded.refreshed_at
+        """, [(
+            source_name, t["schema"], t["table"], t["table"].lower(),
+            t["column_count"] if t["column_count"] is not None else len(columns.get(t["table"], [])) or None,
+            t["row_estimate"], t["schema_version"], t["data_version"], t.get("comment"), now
+        ) for t in tables])
+
+        for t in to_reflect:
+            conn.execute(
+                "DELETE FROM catalog_columns WHERE source_name = ? AND schema_name = ? AND table_name = ?",
+                (source_name, t["schema"], t["table"])
+            )
+            conn.executemany(
+                "INSERT INTO catalog_columns (source_name, schema_name, table_name, ordinal, column_name, data_type, comment) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(source_name, t["schema"], t["table"], i, c["name"], c["type"], c.get("comment"))
+                 for i, c in enumerate(columns.get(t["table"], []))]
+            )
+
+        conn.execute(
+            "INSERT INTO catalog_sources (source_name, refreshed_at) VALUES (?, ?) "
+            "ON CONFLICT (source_name) DO UPDATE SET refreshed_at = excluded.refreshed_at, "
+            "failures = 0, retry_after = 0, last_error = NULL",
+            (source_name, now)
+        )
+    return len(to_reflect)
+
+
+def ensure_fresh():
+    """Refresh only the sources whose catalog entries are past their TTL."""
+    stale = stale_sources()
+    if stale:
+        refresh(stale)
+
+
+def list_tables(source_name: str = None) -> list:
+    with _connect() as conn:
+        if source_name is None:
+            rows = conn.execute("SELECT * FROM catalog_tables ORDER BY source_name, schema_name, table_name")
+        else:
+            rows = conn.execute(
+                "SELECT * FROM catalog_tables WHERE source_name = ? ORDER BY schema_name, table_name",
+                (source_name,)
+            )
+        return [_table_dict(row) for row in rows]
+
+
+def find_table(table_name: str) -> list:
+    """Exact, case-insensitive lookup by table name across all sources."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM catalog_tables WHERE table_name_lower = ?", (table_name.lower(),))
+        return [_table_dict(row) for row in rows]
+
+
+def search_tables(substring: str) -> list:
+    """Case-insensitive substring lookup by table name across all sources."""
+    needle = substring.lower()
+    with _connect() as conn:
+        if _fts_enabled.get(CATALOG_PATH) and len(needle) >= 3:
+            # Trigram index answers substring matches without scanning every row
+            rows = conn.execute("""
+            SELECT t.* FROM catalog_tables t
+            JOIN catalog_tables_fts f ON f.rowid = t.rowid
+            WHERE catalog_tables_fts MATCH ?
+            ORDER BY t.source_name, t.schema_name, t.table_name
+            """, ('"' + needle.replace('"', '""') + '"',))
+        else:
+            escaped = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = conn.execute(
+                "SELECT * FROM catalog_tables WHERE table_name_lower LIKE ? ESCAPE '\\' "
+                "ORDER BY source_name, schema_name, table_name",
+                (f"%{escaped}%",)
+            )
+        return [_table_dict(row) for row in rows]
+
+
+def get_table(source_name: str, schema: str, table: str):
+    """Catalog entry for one table, or None if it is unknown."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT * FROM catalog_tables WHERE source_name = ? AND schema_name = ? AND table_name = ?",
+            (source_name, schema, table)
+        ).fetchone()
+        return _table_dict(row) if row else None
+
+
+def get_columns(source_name: str, schema: str, table: str) -> list:
+    """Cached [{"name", "type", "comment"}, ...] for one table, in column order."""
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT column_name, data_type, comment FROM catalog_columns "
+            "WHERE source_name = ? AND schema_name = ? AND table_name = ? ORDER BY ordinal",
+            (source_name, schema, table)
+        )
+        return [{"name": row["column_name"], "type": row["data_type"], "comment": row["comment"]} for row in rows]
+
+
+def get_all_columns(source_name: str) -> dict:
+    """{(schema, table): [{"name", "type", "comment"}, ...]} for every table of a source, in one query."""
+    columns = {}
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT schema_name, table_name, column_name, data_type, comment FROM catalog_columns "
+            "WHERE source_name = ? ORDER BY schema_name, table_name, ordinal",
+            (source_name,)
+        )
+        for row in rows:
+            columns.setdefault((row["schema_name"], row["table_name"]), []).append(
+                {"name": row["column_name"], "type": row["data_type"], "comment": row["comment"]}
+            )
+    return columns
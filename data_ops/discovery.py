@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine, inspect
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from sqlalchemy import bindparam, inspect, text
 import os
 import urllib.parse
+from utils import tracing
+from utils.engine_registry import get_engine, register_source
 
 
 def get_msql_connection():
@@ -19,41 +23,202 @@ DB_CONFIGS = {
     "mysql_source": get_msql_connection()
 }
 
-def _discover_tables(filter_func=None):
+for _name, _uri in DB_CONFIGS.items():
+    register_source(_name, _uri)
+
+# Discovery fans out across sources; a source that has not answered within
+# DISCOVERY_TIMEOUT seconds is reported and left out of the results.
+DISCOVERY_TIMEOUT = float(os.getenv("DISCOVERY_TIMEOUT", "10"))
+DISCOVERY_WORKERS = int(os.getenv("DISCOVERY_WORKERS", "8"))
+
+# One round-trip per source: tables, column counts and row estimates together.
+# schema_version changes when columns change; data_version when rows change.
+_BULK_TABLES_SQL = {
+    "mysql": """
+        SELECT t.table_schema, t.table_name, t.table_rows AS row_estimate,
+               COUNT(c.column_name) AS column_count,
+               CONCAT_WS(':', COUNT(c.column_name),
+                         MD5(GROUP_CONCAT(c.column_name, ' ', c.column_type ORDER BY c.ordinal_position))
+               ) AS schema_version,
+               CAST(t.update_time AS CHAR) AS data_version,
+               t.table_comment AS comment
+        FROM information_schema.tables t
+        LEFT JOIN information_schema.columns c
+               ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+        WHERE t.table_schema = DATABASE() AND t.table_type = 'BASE TABLE'
+        GROUP BY t.table_schema, t.table_name, t.table_rows, t.update_time, t.table_comment
+    """,
+    "postgresql": """
+        SELECT t.table_schema, t.table_name,
+               CAST(GREATEST(cls.reltuples, 0) AS BIGINT) AS row_estimate,
+               COUNT(c.column_name) AS column_count,
+               COUNT(c.column_name) || ':' ||
+                   MD5(STRING_AGG(c.column_name || ' ' || c.data_type, ',' ORDER BY c.ordinal_position))
+                   AS schema_version,
+               CAST(st.n_tup_ins + st.n_tup_upd + st.n_tup_del AS TEXT) AS data_version,
+               obj_description(cls.oid, 'pg_class') AS comment
+        FROM information_schema.tables t
+        LEFT JOIN information_schema.columns c
+               ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+        LEFT JOIN pg_catalog.pg_namespace ns ON ns.nspname = t.table_schema
+        LEFT JOIN pg_catalog.pg_class cls ON cls.relnamespace = ns.oid AND cls.relname = t.table_name
+        LEFT JOIN pg_catalog.pg_stat_user_tables st ON st.relid = cls.oid
+        WHERE t.table_schema = current_schema() AND t.table_type = 'BASE TABLE'
+        GROUP BY t.table_schema, t.table_name, cls.oid, cls.reltuples, st.n_tup_ins, st.n_tup_upd, st.n_tup_del
+    """,
+}
+_BULK_TABLES_SQL["mariadb"] = _BULK_TABLES_SQL["mysql"]
+# GROUP_CONCAT output is silently cut at group_concat_max_len (1024 bytes by default), which
+# would hide column changes past the first ~1KB of a wide table from schema_version
+_BULK_TABLES_SETUP_SQL = {
+    "mysql": "SET SESSION group_concat_max_len = 16777216",
+}
+_BULK_TABLES_SETUP_SQL["mariadb"] = _BULK_TABLES_SETUP_SQL["mysql"]
+
+_BULK_COLUMNS_SQL = {
+    "mysql": """
+        SELECT table_name, column_name, column_type AS data_type, column_comment AS comment
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name IN :tables
+        ORDER BY table_name, ordinal_position
+    """,
+    "postgresql": """
+        SELECT table_name, column_name, data_type,
+               col_description(format('%I.%I', table_schema, table_name)::regclass, ordinal_position) AS comment
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name IN :tables
+        ORDER BY table_name, ordinal_position
+    """,
+}
+_BULK_COLUMNS_SQL["mariadb"] = _BULK_COLUMNS_SQL["mysql"]
+
+
+@tracing.traced("discovery.reflect_source")
+def _reflect_source(source_name: str, conn_str: str):
+    """Return every table of one source with column count, row estimate and version markers."""
+    engine = get_engine(conn_str)
+    bulk_sql = _BULK_TABLES_SQL.get(engine.dialect.name)
+
+    if bulk_sql is None:
+        # No information_schema shortcut for this dialect: names only via the inspector
+        inspector = inspect(engine)
+        return [{
+            "source_name": source_name,
+            "schema": engine.url.database,
+            "table": table,
+            "column_count": None,
+            "row_estimate": None,
+            "schema_version": None,
+            "data_version": None,
+            "comment": None
+        } for table in inspector.get_table_names()]
+
+    with engine.connect() as conn:
+        setup_sql = _BULK_TABLES_SETUP_SQL.get(engine.dialect.name)
+        if setup_sql:
+            conn.execute(text(setup_sql))
+        rows = conn.execute(text(bulk_sql)).fetchall()
+    return [{
+        "source_name": source_name,
+        "schema": row.table_schema,
+        "table": row.table_name,
+        "column_count": int(row.column_count),
+        "row_estimate": int(row.row_estimate) if row.row_estimate is not None else None,
+        "schema_version": row.schema_version,
+        "data_version": row.data_version,
+        "comment": row.comment or None
+    } for row in rows]
+
+
+@tracing.traced("discovery.reflect_columns")
+def reflect_columns(conn_str: str, tables):
+    """Return {table: [{"name", "type", "comment"}, ...]} for the given tables, in one query where possible."""
+    tables = list(tables)
+    if not tables:
+        return {}
+    engine = get_engine(conn_str)
+    bulk_sql = _BULK_COLUMNS_SQL.get(engine.dialect.name)
+
+    columns = {table: [] for table in tables}
+    if bulk_sql is None:
+        inspector = inspect(engine)
+        for table in tables:
+            columns[table] = [{"name": c["name"], "type": str(c["type"]), "comment": c.get("comment")}
+                              for c in inspector.get_columns(table)]
+        return columns
+
+    query = text(bulk_sql).bindparams(bindparam("tables", expanding=True))
+    with engine.connect() as conn:
+        for row in conn.execute(query, {"tables": tables}):
+            columns.setdefault(row.table_name, []).append(
+                {"name": row.column_name, "type": str(row.data_type), "comment": row.comment or None}
+            )
+    return columns
+
+
+def iter_discovered_tables(filter_func=None, timeout=None, sources=None):
+    """
+    Scan sources concurrently (all of DB_CONFIGS, or just `sources`) and yield
+    (source_name, tables) as each one answers, so callers can show partial
+    results without waiting for the slowest source.
     """
-    Shared logic to scan DBs and return tables matching a filter_func
+    timeout = DISCOVERY_TIMEOUT if timeout is None else timeout
+    configs = {name: uri for name, uri in DB_CONFIGS.items() if sources is None or name in sources}
+    if not configs:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(configs)))
+    futures = {
+        executor.submit(_reflect_source, source_name, conn_str): source_name
+        for source_name, conn_str in configs.items()
+    }
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            source_name = futures[future]
+            try:
+                tables = future.result()
+            except Exception as e:
+                print(f"Error inspecting {source_name}: {e}")
+                continue
+            yield source_name, [t for t in tables if filter_func is None or filter_func(t["table"])]
+    except FuturesTimeoutError:
+        pending = sorted(name for future, name in futures.items() if not future.done())
+        print(f"Discovery timed out after {timeout}s for: {', '.join(pending)}")
+    finally:
+        # Do not block on stalled sources; their threads finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _discover_tables(filter_func=None, keyword=None):
+    """
+    Shared logic to list known tables matching a filter_func
     filter_func: function(table_name) -> bool
+    keyword: case-insensitive substring of the table name, looked up in the catalog's index
+
+    Served from the local metadata catalog, which re-scans a source only once its TTL expires.
     """
-    results = []
-    for source_name, conn_str in DB_CONFIGS.items():
-        try:
-            engine = create_engine(conn_str)
-            inspector = inspect(engine)
-            tables = inspector.get_table_names()
-            for table in tables:
-                if filter_func is None or filter_func(table):
-                    results.append({
-                        "source_name": source_name,
-                        "schema": engine.url.database,
-                        "table": table
-                    })
-        except Exception as e:
-            print(f"Error inspecting {source_name}: {e}")
-    return results
-
-def discover_sources_full(filter_func=None):
+    from data_ops import catalog  # catalog builds on the reflection helpers above
+
+    catalog.ensure_fresh()
+    tables = catalog.search_tables(keyword) if keyword else catalog.list_tables()
+    return [t for t in tables if filter_func is None or filter_func(t["table"])]
+
+def discover_sources_full(filter_func=None, keyword=None):
     """
     Action: Full discovery with schema and table info.
-    Returns list of dicts with: schema, table, source_name
+    Returns list of dicts with: schema, table, source_name, column_count, row_estimate
     """
-    return _discover_tables(filter_func)
+    return _discover_tables(filter_func, keyword)
 
 def discover_sources(filter_func=None):
     """
     Discover available sources in the database, return a list of source names.
     """
+    from data_ops import catalog
+
     results = set()
-    available_sources = _discover_tables(lambda t: "transactions" in t.lower())
+    catalog.ensure_fresh()
+    available_sources = catalog.search_tables("transactions")
     for source in available_sources:
         source_name = source["source_name"]
         if filter_func is None or filter_func(source["table"]):  
@@ -63,4 +228,7 @@ def discover_sources(filter_func=None):
 
 def check_table_in_sources(table_name: str):
     """Check if a table with the exact name exists in any source"""
-    return _discover_tables(lambda t: t.lower() == table_name.lower())
+    from data_ops import catalog
+
+    catalog.ensure_fresh()
+    return catalog.find_table(table_name)
@@ -4,7 +4,16 @@ from datetime import datetime
 def build_ingestion_yaml(source_name: str, source_schema: str, source_table: str,
                          target_schema: str, target_table: str,
                          domain: str, description: str,
-                         refresh: str, load_strategy: str) -> str:
+                         refresh: str, load_strategy: str,
+                         chunk_size: int = 50000,
+                         watermark_column: str = "",
+                         merge_keys: list = None,
+                         partition_column: str = "",
+                         partitions: int = 8,
+                         max_concurrency: int = 4,
+                         checkpoint_column: str = "",
+                         staging: bool = False,
+                         staging_dir: str = "") -> str:
     config = {
         "ingestion": {
             "source": {
@@ -20,7 +29,32 @@ def build_ingestion_yaml(source_name: str, source_schema: str, source_table: str
             "description": description,
             "refresh_schedule": refresh,
             "load_strategy": load_strategy,
+            "extract": {
+                "mode": "stream",
+                "chunk_size": chunk_size
+            },
             "created_at": datetime.utcnow().isoformat()
         }
     }
+    if partition_column:
+        # Large tables: read key/date ranges of partition_column concurrently
+        config["ingestion"]["extract"] = {
+            "mode": "partitioned",
+            "chunk_size": chunk_size,
+            "partition_column": partition_column,
+            "partitions": partitions,
+            "max_concurrency": max_concurrency
+        }
+    if checkpoint_column and not partition_column:
+        # Commit progress per chunk so a failed run resumes instead of starting over
+        config["ingestion"]["extract"]["checkpoint_column"] = checkpoint_column
+    if staging:
+        # Stage chunks as Parquet so loads can be retried without re-querying the source
+        config["ingestion"]["staging"] = {"dir": staging_dir, "compression": "zstd"}
+    if load_strategy == "incremental":
+        # Rows past the last committed watermark are pulled and upserted on merge_keys
+        config["ingestion"]["incremental"] = {
+            "watermark_column": watermark_column,
+            "merge_keys": list(merge_keys or [])
+        }
     return yaml.dump(config, sort_keys=False)
@@ -0,0 +1,121 @@
+"""
+On-disk cache of profiling results.
+
+Entries are keyed by (source, schema, table, table-version fingerprint), so a
+profile is reused until the catalog sees the table change. Each entry is a
+small JSON summary plus an optional gzip-compressed HTML report that is only
+read when the report is actually viewed. Total size is bounded by evicting
+least recently used entries (file mtimes are bumped on every hit).
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from utils import disk_cache
+
+PROFILE_CACHE_DIR = os.getenv("PROFILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "profile_cache"))
+PROFILE_CACHE_MAX_BYTES = int(os.getenv("PROFILE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Upper bound on entry age, applied only to tables whose catalog entry carries no data
+# version; versioned entries stay until the table changes or they are evicted
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", str(24 * 3600)))
+
+
+def table_fingerprint(source: str, schema: str, table: str) -> str:
+    """Version marker for a table from the metadata catalog; changes when its schema or data changes."""
+    from data_ops import catalog
+
+    catalog.ensure_fresh()
+    return entry_fingerprint(catalog.get_table(source, schema, table))
+
+
+def entry_fingerprint(entry) -> str:
+    """
+    table_fingerprint for a catalog entry already at hand. The row estimate is left out:
+    InnoDB's drifts without any change to the data, which data_version already tracks.
+    """
+    if entry is None:
+        return "unknown"
+    return "|".join(str(entry.get(k)) for k in ("schema_version", "data_version", "column_count"))
+
+
+def is_versioned(fingerprint: str) -> bool:
+    """True when the fingerprint includes a data version, so it changes whenever the rows do."""
+    parts = fingerprint.split("|")
+    return len(parts) > 1 and parts[1] != "None"
+
+
+def cache_key(source: str, schema: str, table: str, fingerprint: str) -> str:
+    raw = json.dumps([source, schema, table, fingerprint])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _summary_path(key: str) -> str:
+    return os.path.join(PROFILE_CACHE_DIR, f"{key}.json")
+
+
+def report_path(key: str) -> str:
+    return os.path.join(PROFILE_CACHE_DIR, f"{key}.html.gz")
+
+
+def get(key: str):
+    """Cached summary for `key`, or None on a miss or an expired entry."""
+    path = _summary_path(key)
+    try:
+        summary = _load(path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not summary.get("versioned") and summary.get("created_at", 0) < time.time() - PROFILE_CACHE_TTL:
+        return None
+    if summary.get("has_report") and not os.path.exists(report_path(key)):
+        summary["has_report"] = False
+    disk_cache.touch(path, report_path(key))
+    return summary
+
+
+def _load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def put(key: str, summary: dict, html_file: str = None, versioned: bool = False) -> dict:
+    """
+    Store a summary (and optionally compress an HTML report file) under `key`.
+    versioned: the key's fingerprint tracks data changes (is_versioned), so the entry
+    is not expired by PROFILE_CACHE_TTL.
+    """
+    os.makedirs(PROFILE_CACHE_DIR, exist_ok=True)
+    summary = {k: v for k, v in summary.items() if k != "profile_report_html"}
+    summary["report_key"] = key
+    summary["created_at"] = time.time()
+    summary["versioned"] = versioned
+
+    if html_file:
+        # Stream the report into the cache compressed, without holding it in memory
+        fd, tmp = tempfile.mkstemp(dir=PROFILE_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wb") as out, open(html_file, "rb") as src:
+            shutil.copyfileobj(src, out)
+        os.replace(tmp, report_path(key))
+        summary["has_report"] = True
+    else:
+        previous = get(key)
+        summary["has_report"] = bool(previous and previous.get("has_report"))
+
+    # Values the JSON encoder does not know (dates, decimals) are stored as strings
+    payload = json.dumps(summary, default=str)
+    disk_cache.atomic_write(PROFILE_CACHE_DIR, _summary_path(key), payload)
+
+    disk_cache.evict(PROFILE_CACHE_DIR, PROFILE_CACHE_MAX_BYTES)
+    return json.loads(payload)
+
+
+def load_report_html(key: str) -> str:
+    """Decompress a cached HTML report; called only when the report is viewed."""
+    try:
+        with gzip.open(report_path(key), "rt", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
@@ -1,42 +1,181 @@
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import case, column, func, select, table as table_clause, text, types as sqltypes
+from sqlalchemy import inspect as sa_inspect
+from utils.engine_registry import get_engine
 from data_ops.discovery import DB_CONFIGS
-from ydata_profiling import ProfileReport
+from data_ops import profile_cache
+from utils import tracing
+from utils.jobs import report_progress
 import tempfile
 import os
 
-def profile_table(source: str, schema: str, table: str):
+# Unbiased random sample used for top values, preview rows and the optional ydata report
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "5000"))
+# Above this many (estimated) rows, or with no estimate at all, column aggregates run over
+# the sample and the row count comes from catalog statistics instead of a full-table COUNT(*)
+PROFILE_FULL_SCAN_MAX_ROWS = int(os.getenv("PROFILE_FULL_SCAN_MAX_ROWS", "1000000"))
+PROFILE_TOP_VALUES = 5
+
+# Types that get MIN/MAX. Not Boolean: PostgreSQL has no min(boolean), and one failing
+# aggregate fails the whole single-query profile
+_COMPARABLE_TYPES = (sqltypes.Numeric, sqltypes.Float, sqltypes.Integer, sqltypes.String, sqltypes.Date,
+                     sqltypes.DateTime, sqltypes.Time)
+
+
+def _qualified_name(engine, schema: str, table: str) -> str:
+    preparer = engine.dialect.identifier_preparer
+    return f"{preparer.quote_schema(schema)}.{preparer.quote(table)}" if schema else preparer.quote(table)
+
+
+def _row_estimate(source: str, schema: str, table: str):
+    """Row estimate from the metadata catalog (information_schema / pg_class statistics)."""
+    from data_ops import catalog
+
+    entry = catalog.get_table(source, schema, table)
+    return entry["row_estimate"] if entry else None
+
+
+def _sample_sql(engine, qualified: str, row_estimate) -> str:
+    """
+    Random sample spread over the whole table rather than its first rows. Every form has a
+    LIMIT: catalog estimates can be stale, and the sample is loaded into pandas.
+    """
+    n = PROFILE_SAMPLE_ROWS
+    if row_estimate is not None and row_estimate <= n:
+        return f"SELECT * FROM {qualified} LIMIT {2 * n}"
+
+    dialect = engine.dialect.name
+    if row_estimate and dialect in ("mysql", "mariadb", "postgresql"):
+        # Keep each row with probability n/rows; the LIMIT only guards against a stale estimate
+        fraction = n / row_estimate
+        if dialect == "postgresql":
+            return f"SELECT * FROM {qualified} TABLESAMPLE BERNOULLI ({fraction * 100:.8f}) LIMIT {2 * n}"
+        return f"SELECT * FROM {qualified} WHERE RAND() < {fraction:.10f} LIMIT {2 * n}"
+    random_fn = "RAND()" if dialect in ("mysql", "mariadb") else "RANDOM()"
+    return f"SELECT * FROM {qualified} ORDER BY {random_fn} LIMIT {n}"
+
+
+def _column_aggregates(engine, columns, source):
+    """
+    One SELECT computing, for every column: null count, distinct count,
+    min/max and (for strings) min/max/avg length, plus the row count.
+    """
+    length_fn = func.length if engine.dialect.name == "sqlite" else func.char_length
+    aggregates = [func.count().label("row_count")]
+    for i, col in enumerate(columns):
+        c = source.c[col["name"]]
+        col_type = col["type"]
+        aggregates.append(func.sum(case((c.is_(None), 1), else_=0)).label(f"nulls_{i}"))
+        if isinstance(col_type, (sqltypes.LargeBinary, sqltypes.JSON)):
+            continue
+        aggregates.append(func.count(c.distinct()).label(f"distinct_{i}"))
+        if isinstance(col_type, _COMPARABLE_TYPES):
+            aggregates.append(func.min(c).label(f"min_{i}"))
+            aggregates.append(func.max(c).label(f"max_{i}"))
+        if isinstance(col_type, sqltypes.String):
+            aggregates.append(func.min(length_fn(c)).label(f"min_len_{i}"))
+            aggregates.append(func.max(length_fn(c)).label(f"max_len_{i}"))
+            aggregates.append(func.avg(length_fn(c)).label(f"avg_len_{i}"))
+
+    with engine.connect() as conn:
+        row = conn.execute(select(*aggregates).select_from(source)).mappings().one()
+
+    stats = {}
+    for i, col in enumerate(columns):
+        col_stats = {"null_count": int(row[f"nulls_{i}"] or 0)}
+        for key, label in (("distinct_count", "distinct"), ("min", "min"), ("max", "max"),
+                           ("min_length", "min_len"), ("max_length", "max_len"), ("avg_length", "avg_len")):
+            if f"{label}_{i}" in row:
+                value = row[f"{label}_{i}"]
+                col_stats[key] = float(value) if key == "avg_length" and value is not None else value
+        stats[col["name"]] = col_stats
+    return int(row["row_count"]), stats
+
+
+@tracing.traced("profiling.profile_table")
+def profile_table(source: str, schema: str, table: str, full_report: bool = False, use_cache: bool = True):
+    """
+    Fast profile computed in the database. Column statistics come from a single
+    aggregated query (over the whole table when it is small enough, otherwise over
+    a random sample); the full ydata-profiling HTML report is opt-in.
+
+    Results are cached per table version. The HTML report is kept compressed in the
+    cache and is not returned inline: load it with
+    profile_cache.load_report_html(summary["report_key"]) when it is viewed.
+    """
+    fingerprint = profile_cache.table_fingerprint(source, schema, table)
+    key = profile_cache.cache_key(source, schema, table, fingerprint)
+    if use_cache:
+        cached = profile_cache.get(key)
+        if cached is not None and (cached["has_report"] or not full_report):
+            return cached, profile_cache.report_path(key) if cached["has_report"] else None
+
+    report_progress(0.05, "Reading table metadata...")
     conn_str = DB_CONFIGS[source]
-    engine = create_engine(conn_str)
+    engine = get_engine(conn_str)
+    qualified = _qualified_name(engine, schema, table)
 
-    # Load sample or full data
-    query = f"SELECT * FROM {schema}.{table} LIMIT 5000"
-    df = pd.read_sql(query, engine)
+    columns = sa_inspect(engine).get_columns(table, schema=schema)
+    row_estimate = _row_estimate(source, schema, table)
+    sample_sql = _sample_sql(engine, qualified, row_estimate)
 
-    # Basic statistics
-    row_count = pd.read_sql(f"SELECT COUNT(*) as cnt FROM {schema}.{table}", engine).iloc[0, 0]
+    # Large tables, and tables the catalog has no estimate for: aggregate over the sample
+    report_progress(0.15, "Computing column statistics...")
+    full_scan = row_estimate is not None and row_estimate <= PROFILE_FULL_SCAN_MAX_ROWS
+    if full_scan:
+        agg_source = table_clause(table, *[column(c["name"]) for c in columns], schema=schema)
+    else:
+        agg_source = text(sample_sql).columns(*[column(c["name"]) for c in columns]).subquery("profile_sample")
+    with tracing.span("profiling.column_aggregates", table=table, scope="table" if full_scan else "sample"):
+        scanned_rows, column_stats = _column_aggregates(engine, columns, agg_source)
+    row_count_exact, row_count_minimum = full_scan, False
+    if full_scan:
+        row_count = scanned_rows
+    elif row_estimate is None:
+        # Without an estimate the sample is the first PROFILE_SAMPLE_ROWS rows in random order:
+        # a shorter sample is the whole table, a full one only bounds the row count from below
+        row_count = scanned_rows
+        row_count_exact = scanned_rows < PROFILE_SAMPLE_ROWS
+        row_count_minimum = not row_count_exact
+    else:
+        row_count = row_estimate
 
-    # Generate profiling report
-    profile = ProfileReport(df, title=f"Profiling Report: {schema}.{table}", minimal=False)
+    # Sample rows for top values and preview
+    report_progress(0.5 if full_report else 0.7, "Sampling rows...")
+    with tracing.span("profiling.sample", table=table):
+        df = pd.read_sql(text(sample_sql), engine)
+    for name, col_stats in column_stats.items():
+        top = df[name].value_counts(dropna=True).head(PROFILE_TOP_VALUES)
+        col_stats["top_values"] = [{"value": v, "count": int(n)} for v, n in top.items()]
 
-    # Save HTML report to temp file
-    html_report_path = os.path.join(tempfile.gettempdir(), f"profile_{schema}_{table}.html")
-    profile.to_file(html_report_path)
+    html_report_path = None
+    if full_report:
+        # ydata-profiling is slow to import and to run; only pay for it when asked
+        from ydata_profiling import ProfileReport
 
-    # Read HTML content from file with UTF-8 encoding to handle special characters
-    try:
-        with open(html_report_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-    except UnicodeDecodeError as e:
-        print(f"Error reading the file: {e}")
-        html_content = ""
+        report_progress(0.6, "Building the full profiling report...")
+        with tracing.span("profiling.ydata_report", table=table, rows=len(df)):
+            profile = ProfileReport(df, title=f"Profiling Report: {schema}.{table}", minimal=False)
+            html_report_path = os.path.join(tempfile.gettempdir(), f"profile_{schema}_{table}.html")
+            profile.to_file(html_report_path)
 
     summary_stats = {
         "row_count": int(row_count),
-        "num_columns": df.shape[1],
-        "nulls_by_column": df.isnull().sum().to_dict(),
+        "row_count_exact": row_count_exact,
+        "row_count_minimum": row_count_minimum,
+        "stats_scope": "table" if row_count_exact else "sample",
+        "sample_size": len(df),
+        "num_columns": len(columns),
+        "nulls_by_column": {name: s["null_count"] for name, s in column_stats.items()},
+        "column_stats": column_stats,
         "sample_rows": df.head(5).to_dict(orient="records"),
-        "profile_report_html": html_content  # Pass the HTML content here
     }
 
+    report_progress(0.95, "Saving profile...")
+    summary_stats = profile_cache.put(key, summary_stats, html_file=html_report_path,
+                                      versioned=profile_cache.is_versioned(fingerprint))
+    if html_report_path:
+        os.remove(html_report_path)
+        html_report_path = profile_cache.report_path(key)
+
     return summary_stats,html_report_path
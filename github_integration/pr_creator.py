@@ -1,21 +1,85 @@
-from github import Github
+import os
+import threading
+from github import Auth, Github, GithubRetry, InputGitTreeElement
+from utils import tracing
 
-def create_ingestion_pr(repo_full_name: str, pr_branch: str, yaml_content: str, pr_title: str, pr_body: str):
+# GITHUB_API_URL points the client at GitHub Enterprise or tools/fake_github_server.py
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "6"))
+GITHUB_SECONDARY_RATE_WAIT = float(os.getenv("GITHUB_SECONDARY_RATE_WAIT", "60"))
+# GitHub asks integrations to space out content-creating requests; PyGithub enforces this
+GITHUB_SECONDS_BETWEEN_WRITES = float(os.getenv("GITHUB_SECONDS_BETWEEN_WRITES", "1.0"))
+CONFIG_DIR = "ingestion_configs"
+
+_lock = threading.Lock()
+_client = None
+_repos = {}
+
+
+def get_github() -> Github:
+    """One authenticated client per process; its HTTP session and retry policy are reused."""
+    global _client
+    with _lock:
+        if _client is None:
+            token = os.getenv("GITHUB_TOKEN", "")
+            _client = Github(
+                auth=Auth.Token(token) if token else None,
+                base_url=GITHUB_API_URL,
+                # Retries 403 secondary rate limits (honouring Retry-After) and 5xx with exponential backoff
+                retry=GithubRetry(total=GITHUB_MAX_RETRIES, backoff_factor=1.0,
+                                  secondary_rate_wait=GITHUB_SECONDARY_RATE_WAIT),
+                seconds_between_writes=GITHUB_SECONDS_BETWEEN_WRITES,
+            )
+        return _client
+
+
+def _get_repo(repo_full_name: str):
+    with _lock:
+        repo = _repos.get(repo_full_name)
+    if repo is None:
+        repo = get_github().get_repo(repo_full_name)
+        with _lock:
+            _repos[repo_full_name] = repo
+    return repo
+
+
+def config_path(name: str) -> str:
+    return f"{CONFIG_DIR}/{name}.yaml"
+
+
+@tracing.traced("github.create_batch_pr", tracing.SPAN_KIND_CLIENT)
+def create_batch_ingestion_pr(repo_full_name: str, pr_branch: str, configs: dict, pr_title: str, pr_body: str,
+                              base_branch: str = "main", commit_message: str = None):
     """
-    Example: repo_full_name = "my-org/data-onboarding-repo"
+    Commit many ingestion YAMLs in a single commit on a new branch and open one PR.
+
+    configs: {name: yaml_content}; each is written to ingestion_configs/<name>.yaml.
+    Uses the Git data API (tree -> commit -> ref), so the number of requests is
+    constant regardless of how many tables are onboarded.
     """
-    token = ""
-    gh = Github(token)
-    repo = gh.get_repo(repo_full_name)
+    if not configs:
+        raise ValueError("No ingestion configs to commit")
+    repo = _get_repo(repo_full_name)
+
+    base_sha = repo.get_git_ref(f"heads/{base_branch}").object.sha
+    base_commit = repo.get_git_commit(base_sha)
+
+    elements = [
+        InputGitTreeElement(path=config_path(name), mode="100644", type="blob", content=content)
+        for name, content in sorted(configs.items())
+    ]
+    tree = repo.create_git_tree(elements, base_tree=base_commit.tree)
+    message = commit_message or (
+        "Add ingestion config via chatbot" if len(configs) == 1 else f"Add {len(configs)} ingestion configs via chatbot"
+    )
+    commit = repo.create_git_commit(message, tree, [base_commit])
+    repo.create_git_ref(ref=f"refs/heads/{pr_branch}", sha=commit.sha)
 
-    # Create new branch from main
-    source = repo.get_branch("main")
-    repo.create_git_ref(ref=f"refs/heads/{pr_branch}", sha=source.commit.sha)
+    return repo.create_pull(title=pr_title, body=pr_body, head=pr_branch, base=base_branch)
 
-    # Create file in branch
-    path = f"ingestion_configs/{pr_branch}.yaml"
-    repo.create_file(path, "Add ingestion config via chatbot", yaml_content, branch=pr_branch)
 
-    # Create pull request
-    pr = repo.create_pull(title=pr_title, body=pr_body, head=pr_branch, base="main")
-    return pr
+def create_ingestion_pr(repo_full_name: str, pr_branch: str, yaml_content: str, pr_title: str, pr_body: str):
+    """
+    Example: repo_full_name = "my-org/data-onboarding-repo"
+    """
+    return create_batch_ingestion_pr(repo_full_name, pr_branch, {pr_branch: yaml_content}, pr_title, pr_body)
@@ -0,0 +1,535 @@
+"""
+Task code shared by every generated ingestion DAG.
+
+Both deployment modes call into this module: the per-table files rendered from
+airflow_templates/ingest_template.py.j2, and the single dag_factory.py that builds
+all DAGs from the compiled manifest. A DAG is described by a spec dict (the params
+produced by airflow_dag.build_params). Heavy imports (pandas, SQLAlchemy) happen
+inside the task functions so that parsing a DAG file stays cheap.
+"""
+import contextlib
+import json
+import logging
+import math
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+DEFAULT_ARGS = {
+    "owner": "data_onboarding",
+    "start_date": datetime(2025, 10, 4),
+    "depends_on_past": False,
+    "retries": 1,
+}
+
+# (path, mtime_ns, size) -> specs; survives re-parses of the factory file in one process
+_manifest_cache = {}
+
+# Lock files backing the per-source read slots shared by every task process on a worker
+SOURCE_SLOT_DIR = os.getenv("SOURCE_SLOT_DIR", os.path.join(tempfile.gettempdir(), "ingest_source_slots"))
+SOURCE_SLOT_POLL_SECONDS = 0.5
+
+
+def load_manifest(path: str):
+    """Specs from the compiled manifest, re-read only when the file changes."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _manifest_cache:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        _manifest_cache.clear()
+        _manifest_cache[key] = manifest["dags"]
+    return _manifest_cache[key]
+
+
+def _merge_chunk(spec, df, target_engine, staging_table):
+    """Upsert one chunk: stage it, then delete-and-insert matching keys in one transaction."""
+    import sqlalchemy
+
+    target = f"{spec['target_schema']}.{spec['target_table']}"
+    df.to_sql(staging_table, con=target_engine, schema=spec["target_schema"], if_exists='replace', index=False)
+    key_match = " AND ".join(f"s.{k} = {target}.{k}" for k in spec["merge_keys"])
+    with target_engine.begin() as conn:
+        conn.execute(sqlalchemy.text(
+            f"DELETE FROM {target} "
+            f"WHERE EXISTS (SELECT 1 FROM {spec['target_schema']}.{staging_table} s WHERE {key_match})"
+        ))
+        conn.execute(sqlalchemy.text(
+            f"INSERT INTO {target} SELECT * FROM {spec['target_schema']}.{staging_table}"
+        ))
+
+
+def _source_concurrency_limit(source_name: str):
+    """Ceiling on concurrent reads against one source, e.g. SOURCE_MAX_CONCURRENCY_MYSQL_SOURCE=2."""
+    value = os.getenv(f"SOURCE_MAX_CONCURRENCY_{re.sub(r'[^0-9A-Za-z]', '_', source_name).upper()}")
+    return int(value) if value else None
+
+
+@contextlib.contextmanager
+def source_read_slot(source_name: str, stop: threading.Event = None):
+    """
+    Hold one of the source's SOURCE_MAX_CONCURRENCY_<NAME> read slots for the block.
+
+    Slots are exclusive locks on files in SOURCE_SLOT_DIR, so the cap holds across every
+    task process and DAG on the worker, not just the threads of one task; the OS drops a
+    lock when its process dies. Without a configured limit this is a no-op. Waiting gives
+    up (yielding nothing held) once `stop` is set.
+    """
+    import fcntl
+
+    limit = _source_concurrency_limit(source_name)
+    if not limit:
+        yield
+        return
+    os.makedirs(SOURCE_SLOT_DIR, exist_ok=True)
+    prefix = os.path.join(SOURCE_SLOT_DIR, re.sub(r"[^0-9A-Za-z_.-]", "_", source_name))
+    waited = False
+    while True:
+        for slot in range(limit):
+            f = open(f"{prefix}.{slot}.lock", "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+            return
+        if not waited:
+            logging.info("Waiting for a free read slot on %s (limit %d)", source_name, limit)
+            waited = True
+        if stop is not None and stop.wait(SOURCE_SLOT_POLL_SECONDS):
+            yield
+            return
+        if stop is None:
+            time.sleep(SOURCE_SLOT_POLL_SECONDS)
+
+
+def partition_bounds(low, high, partitions: int):
+    """
+    Split [low, high] into up to `partitions` equal-width ranges of an integer, numeric
+    or date/time column. Returns [(start, end, end_inclusive)]; only the last range
+    includes its end. Values that cannot be split give a single unbounded range.
+    """
+    if low is None or high is None:
+        return []
+    if isinstance(low, str):
+        try:
+            low, high = datetime.fromisoformat(low), datetime.fromisoformat(high)
+        except ValueError:
+            return [(None, None, True)]
+    if isinstance(low, bool) or low == high or partitions <= 1:
+        return [(low, high, True)]
+
+    if isinstance(low, int):
+        step = max(1, math.ceil((high - low + 1) / partitions))
+        starts = list(range(low, high + 1, step))
+    elif isinstance(low, (datetime, date)):
+        step = (high - low) / partitions
+        starts = [low + step * i for i in range(partitions)]
+    else:
+        low, high = float(low), float(high)
+        step = (high - low) / partitions
+        starts = [low + step * i for i in range(partitions)]
+    ends = starts[1:] + [high]
+    return [(start, end, i == len(starts) - 1) for i, (start, end) in enumerate(zip(starts, ends))]
+
+
+def _read_chunks(spec, source_engine, query: str, params: dict):
+    import pandas as pd
+    import sqlalchemy
+
+    if spec["extract_mode"] == "batch":
+        with source_engine.connect() as source_conn:
+            yield pd.read_sql(sqlalchemy.text(query), con=source_conn, params=params)
+        return
+    # Server-side (unbuffered) cursor: the source hands rows over chunk_size at a time,
+    # so worker memory is bounded by the chunk, not by the table.
+    chunk_size = spec["chunk_size"]
+    with source_engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as source_conn:
+        yield from pd.read_sql(sqlalchemy.text(query), con=source_conn, params=params, chunksize=chunk_size)
+
+
+def _slotted_chunks(source_name: str, chunks):
+    """Pass chunks through while holding a read slot on the source (see source_read_slot)."""
+    with source_read_slot(source_name):
+        yield from chunks
+
+
+_RANGE_DONE = object()
+
+
+def _tag_chunk(df, key: str, column: str, final: bool):
+    df.attrs["checkpoint"] = {"key": key, "high": df[column].iloc[-1], "final": final}
+    return df
+
+
+def _tagged_chunks(chunks, key: str):
+    """Tag chunks of a range with no usable key order (the NULL-key rows); only completion is tracked."""
+    previous = None
+    for df in chunks:
+        if previous is not None:
+            previous.attrs["checkpoint"] = {"key": key, "high": None, "final": False}
+            yield previous
+        previous = df
+    if previous is not None:
+        previous.attrs["checkpoint"] = {"key": key, "high": None, "final": True}
+        yield previous
+
+
+def _key_aligned_chunks(chunks, column: str, key: str, max_rows: int):
+    """
+    Re-cut chunks read in `column` order so no key value spans two checkpointed chunks.
+
+    Rows sharing the last key value of a chunk are carried into the next one; each
+    emitted chunk then covers every row up to its highest key, which makes "committed
+    up to key X" an exact resume point. Chunks are tagged with df.attrs["checkpoint"].
+
+    A key value with more than `max_rows` rows (a date or other low-cardinality column)
+    is passed on in pieces tagged "partial", which do not move the checkpoint: a resume
+    re-reads that key value from the start, but memory stays bounded by the chunk size.
+    """
+    import pandas as pd
+
+    pending = None
+    for df in chunks:
+        if pending is not None:
+            df = pd.concat([pending, df], ignore_index=True)
+        if df.empty:
+            continue
+        tail = df[column] == df[column].iloc[-1]
+        pending = df[tail]
+        if not tail.all():
+            yield _tag_chunk(df[~tail].reset_index(drop=True), key, column, final=False)
+        if len(pending) > max_rows:
+            # The last row is held back so the key value still ends in a tagged chunk
+            piece = pending.iloc[:-1].reset_index(drop=True)
+            piece.attrs["checkpoint"] = {"key": key, "high": None, "final": False, "partial": True}
+            yield piece
+            pending = pending.iloc[-1:]
+    if pending is not None and not pending.empty:
+        yield _tag_chunk(pending.reset_index(drop=True), key, column, final=True)
+
+
+def _plan_ranges(spec, source_engine, table: str, conditions: list, params: dict, checkpoints: dict, run_id: str):
+    """
+    Key ranges to extract: [{"key", "predicate", "params"}].
+
+    Partitioned mode splits on MIN/MAX of the partition column; a checkpointed run
+    keeps its first split (stored with its checkpoints) so a retry resumes the same
+    ranges. Checkpointed ranges are narrowed to keys past their last committed chunk,
+    and completed ranges are dropped.
+    """
+    import sqlalchemy
+    from log_to_audit import decode_value, encode_value
+
+    checkpoint_column = spec.get("checkpoint_column")
+    column = spec.get("partition_column") or checkpoint_column
+
+    if spec.get("extract_mode") == "partitioned":
+        plan = (checkpoints.get("__plan__") or {}).get("detail")
+        if plan is not None:
+            bounds = [(decode_value(*start) if start else None, decode_value(*end) if end else None, inclusive)
+                      for start, end, inclusive in plan]
+        else:
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            with source_engine.connect() as conn:
+                low, high = conn.execute(
+                    sqlalchemy.text(f"SELECT MIN({column}), MAX({column}) FROM {table}{where}"), params
+                ).one()
+            bounds = partition_bounds(low, high, spec["partitions"])
+            if checkpoint_column:
+                from log_to_audit import record_checkpoint
+
+                record_checkpoint(spec["dag_id"], run_id, "__plan__", detail=[
+                    [encode_value(start) if start is not None else None,
+                     encode_value(end) if end is not None else None, inclusive]
+                    for start, end, inclusive in bounds
+                ])
+    else:
+        bounds = [(None, None, True)]
+
+    ranges = []
+    for i, (start, end, inclusive) in enumerate(bounds):
+        # The outer ranges are left open so no row at MIN/MAX is lost to rounding of the bounds
+        predicate, range_params = [f"{column} IS NOT NULL"], {}
+        if i > 0 and start is not None:
+            predicate.append(f"{column} >= :p_start")
+            range_params["p_start"] = start
+        if not inclusive:
+            predicate.append(f"{column} < :p_end")
+            range_params["p_end"] = end
+        ranges.append({"key": f"range_{i}", "predicate": predicate, "params": range_params})
+    ranges.append({"key": "nulls", "predicate": [f"{column} IS NULL"], "params": {}})
+
+    if checkpoint_column:
+        remaining = []
+        for r in ranges:
+            done = checkpoints.get(r["key"]) or {}
+            if done.get("complete"):
+                continue
+            if done.get("high") is not None:
+                r["predicate"].append(f"{checkpoint_column} > :resume_after")
+                r["params"]["resume_after"] = done["high"]
+            remaining.append(r)
+        ranges = remaining
+    for r in ranges:
+        r["predicate"] = " AND ".join(r["predicate"])
+    return ranges
+
+
+def _read_ranges(spec, source_engine, table: str, conditions: list, params: dict, ranges: list, workers: int):
+    """
+    Stream several key ranges of the table, up to `workers` at a time, each on its own
+    streaming connection. Chunks are handed to the caller through a bounded queue, so
+    the target is still written by a single thread. With checkpointing, each range is
+    read in key order and re-cut into key-aligned, tagged chunks.
+    """
+    checkpoint_column = spec.get("checkpoint_column")
+    chunks = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def read_range(r):
+        try:
+            with source_read_slot(spec["source_name"], stop):
+                if not stop.is_set():
+                    read_slotted(r)
+            put(_RANGE_DONE)
+        except BaseException as e:
+            put(e)
+
+    def read_slotted(r):
+        query = f"SELECT * FROM {table} WHERE {' AND '.join(conditions + [r['predicate']])}"
+        ordered = checkpoint_column and r["key"] != "nulls"
+        if ordered:
+            query += f" ORDER BY {checkpoint_column}"
+        range_chunks = _read_chunks(dict(spec, extract_mode="stream"), source_engine, query, {**params, **r["params"]})
+        if ordered:
+            range_chunks = _key_aligned_chunks(range_chunks, checkpoint_column, r["key"], spec["chunk_size"])
+        elif checkpoint_column:
+            range_chunks = _tagged_chunks(range_chunks, r["key"])
+        for df in range_chunks:
+            if stop.is_set():
+                return
+            put(df)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="range")
+    try:
+        for r in ranges:
+            pool.submit(read_range, r)
+        remaining = len(ranges)
+        while remaining:
+            item = chunks.get()
+            if item is _RANGE_DONE:
+                remaining -= 1
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _already_committed(meta, checkpoints: dict) -> bool:
+    """True for a (replayed) chunk whose key range a previous attempt already committed."""
+    done = checkpoints.get(meta["key"]) or {}
+    if done.get("complete"):
+        return True
+    return done.get("high") is not None and meta["high"] is not None and meta["high"] <= done["high"]
+
+
+def extract_and_load(spec, run_id=None, ti=None, **_):
+    import sqlalchemy
+
+    source_engine = sqlalchemy.create_engine(spec["source_conn"])
+    target_engine = sqlalchemy.create_engine(spec["target_conn"])
+    chunk_size = spec["chunk_size"]
+    incremental = spec["load_strategy"] == "incremental"
+    merge_keys = spec["merge_keys"]
+    watermark_column = spec["watermark_column"]
+    staging_table = f"_stg_{spec['target_table']}"
+    target = f"{spec['target_schema']}.{spec['target_table']}"
+    run_id = run_id or f"manual__{datetime.utcnow():%Y%m%dT%H%M%S}"
+    checkpointing = bool(spec.get("checkpoint_column"))
+    partitioned = spec.get("extract_mode") == "partitioned"
+
+    table = f"{spec['source_schema']}.{spec['source_table']}"
+    conditions, params = [], {}
+    if incremental:
+        from log_to_audit import get_watermark, set_watermark
+
+        last_watermark = get_watermark(spec["dag_id"])
+        if last_watermark is not None:
+            # With merge keys the boundary row is re-read and upserted, so late rows sharing
+            # the last watermark value are not lost; append-only loads must stay strictly past it.
+            op = ">=" if merge_keys else ">"
+            conditions.append(f"{watermark_column} {op} :last_watermark")
+            params["last_watermark"] = last_watermark
+        logging.info("Incremental load from watermark %s = %s", watermark_column, last_watermark)
+        high_watermark = None
+
+    checkpoints = {}
+    if checkpointing:
+        from log_to_audit import get_checkpoints, record_checkpoint
+
+        checkpoints = get_checkpoints(spec["dag_id"], run_id)
+    # A retry of a run that already committed chunks must never replace the target
+    resuming = any(key != "__plan__" for key in checkpoints)
+    if incremental:
+        stored = [c["watermark"] for c in checkpoints.values() if c["watermark"] is not None]
+        high_watermark = max(stored) if stored else None
+
+    ranges = None
+    if partitioned or checkpointing:
+        ranges = _plan_ranges(spec, source_engine, table, conditions, params, checkpoints, run_id)
+
+    if resuming:
+        logging.info("Resuming run %s: %d ranges left, %d rows already committed", run_id, len(ranges),
+                     sum(c["rows"] for c in checkpoints.values()))
+        if not (incremental and merge_keys) and sqlalchemy.inspect(target_engine).has_table(spec["target_table"], schema=spec["target_schema"]):
+            # Chunks committed after the last checkpoint would otherwise be loaded twice: clear
+            # exactly the rows this run is about to extract again, once, before loading.
+            with target_engine.begin() as conn:
+                for r in ranges:
+                    conn.execute(sqlalchemy.text(f"DELETE FROM {target} WHERE {' AND '.join(conditions + [r['predicate']])}"),
+                                 {**params, **r["params"]})
+    if incremental:
+        target_exists = sqlalchemy.inspect(target_engine).has_table(spec["target_table"], schema=spec["target_schema"])
+        retry = ti is not None and (ti.try_number or 1) > 1
+        if not merge_keys and not resuming and target_exists and (last_watermark is not None or retry):
+            # The watermark only advances after the last chunk, so rows past it in the target were
+            # appended by an attempt that did not finish; this run extracts them again. Without a
+            # saved watermark every row is re-extracted, so that is only assumed on a retry.
+            with target_engine.begin() as conn:
+                deleted = conn.execute(sqlalchemy.text(
+                    f"DELETE FROM {target}" + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+                ), params).rowcount
+            if deleted:
+                logging.info("Removed %d rows left past the watermark by an unfinished attempt", deleted)
+
+    def extract_chunks():
+        if ranges is not None:
+            workers = min(len(ranges), spec["max_concurrency"] if partitioned else 1,
+                          _source_concurrency_limit(spec["source_name"]) or len(ranges))
+            logging.info("Reading %s in %d ranges, %d concurrent", table, len(ranges), workers)
+            return _read_ranges(spec, source_engine, table, conditions, params, ranges, workers)
+        query = f"SELECT * FROM {table}" + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+        return _slotted_chunks(spec["source_name"], _read_chunks(spec, source_engine, query, params))
+
+    chunk_stats = []
+    staging_stats = {}
+    run_started = time.perf_counter()
+    if spec.get("staging"):
+        from ingestion_staging import staged_chunks
+
+        chunks = staged_chunks(spec, run_id, extract_chunks, staging_stats)
+    else:
+        chunks = extract_chunks()
+    with contextlib.closing(chunks):
+        started = time.perf_counter()
+        for chunk_no, df in enumerate(chunks):
+            meta = df.attrs.get("checkpoint") if checkpointing else None
+            if meta and _already_committed(meta, checkpoints):
+                continue
+            if incremental:
+                if df.empty:
+                    continue
+                if merge_keys and target_exists:
+                    _merge_chunk(spec, df, target_engine, staging_table)
+                else:
+                    df.to_sql(spec["target_table"], con=target_engine, schema=spec["target_schema"],
+                              if_exists='append', index=False, chunksize=chunk_size)
+                    target_exists = True
+                chunk_max = df[watermark_column].max()
+                if high_watermark is None or chunk_max > high_watermark:
+                    high_watermark = chunk_max
+            else:
+                first = chunk_no == 0 and not resuming
+                df.to_sql(spec["target_table"], con=target_engine, schema=spec["target_schema"],
+                          if_exists='replace' if first else 'append', index=False, chunksize=chunk_size)
+            if meta and not meta.get("partial"):
+                # Recorded after the chunk's transaction commits; a crash in between is covered
+                # by the delete-before-reload on resume
+                record_checkpoint(spec["dag_id"], run_id, meta["key"], high=meta["high"], rows=len(df),
+                                  complete=meta["final"], watermark=high_watermark if incremental else None)
+
+            elapsed = time.perf_counter() - started
+            rows_per_sec = len(df) / elapsed if elapsed > 0 else float(len(df))
+            chunk_stats.append({
+                "chunk": chunk_no,
+                "rows": len(df),
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(rows_per_sec, 1),
+            })
+            logging.info("chunk %d: %d rows in %.2fs (%.0f rows/sec)", chunk_no, len(df), elapsed, rows_per_sec)
+            started = time.perf_counter()
+
+    if incremental:
+        if merge_keys:
+            with target_engine.begin() as conn:
+                conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {spec['target_schema']}.{staging_table}"))
+        # Only advance the watermark once every chunk has been committed to the target
+        if high_watermark is not None:
+            set_watermark(spec["dag_id"], watermark_column, high_watermark)
+
+    total_rows = sum(c["rows"] for c in chunk_stats)
+    if not chunk_stats and not resuming:
+        if not incremental and sqlalchemy.inspect(target_engine).has_table(spec["target_table"], schema=spec["target_schema"]):
+            # An overwrite of an empty source leaves an empty target, not the previous load
+            with target_engine.begin() as conn:
+                conn.execute(sqlalchemy.text(f"DELETE FROM {target}"))
+            logging.warning("Source %s.%s returned no rows; target emptied", spec["source_schema"], spec["source_table"])
+        else:
+            logging.warning("Source %s.%s returned no new rows", spec["source_schema"], spec["source_table"])
+    logging.info("Loaded %d rows in %d chunks", total_rows, len(chunk_stats))
+    result = {
+        "rows": total_rows,
+        "chunks": len(chunk_stats),
+        "seconds": round(time.perf_counter() - run_started, 3),
+        "chunk_stats": chunk_stats,
+    }
+    if resuming:
+        result["resumed"] = True
+        result["rows_before_resume"] = sum(c["rows"] for c in checkpoints.values())
+    if staging_stats:
+        from ingestion_staging import prune_runs
+
+        staged = staging_stats["staged_bytes"]
+        staging_stats["compression_ratio"] = round(staging_stats["staged_raw_bytes"] / staged, 2) if staged else None
+        logging.info("Staged %d bytes in %d files (compression ratio %s)%s", staged, staging_stats["staged_files"],
+                     staging_stats["compression_ratio"], " - replayed" if staging_stats["replayed"] else "")
+        result.update(staging_stats)
+        prune_runs(spec, spec.get("staging_keep_runs", 3))
+    # Returned value is pushed to XCom so per-chunk throughput is kept with the task run
+    return result
+
+
+def record_audit(spec, ti, run_id, **_):
+    from log_to_audit import log_ingestion
+
+    stats = ti.xcom_pull(task_ids="run_ingest") or {}
+    log_ingestion(
+        spec["source_name"], spec["source_schema"], spec["source_table"],
+        spec["target_schema"], spec["target_table"],
+        "success", f"Ingestion completed via DAG {spec['dag_id']}",
+        run_id=run_id,
+        duration_seconds=stats.get("seconds"),
+        metrics={k: v for k, v in stats.items() if k != "seconds"},
+    )
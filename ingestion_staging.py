@@ -0,0 +1,184 @@
+"""
+Parquet staging between extract and load.
+
+With staging enabled, each extracted chunk is written as a compressed Parquet file
+under <staging_dir>/<dag_id>/<run_id>/ next to a manifest.json, and the load reads
+the chunks back from those files (memory-mapped Arrow). Extraction runs on its own
+thread one or two chunks ahead, so extracting chunk N+1 overlaps loading chunk N.
+Once a run's extract is complete, a retry of the same run loads straight from the
+staged files without querying the source again.
+"""
+import contextlib
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+DEFAULT_STAGING_DIR = os.getenv("INGEST_STAGING_DIR", os.path.join(tempfile.gettempdir(), "ingest_staging"))
+MANIFEST_NAME = "manifest.json"
+PREFETCH_CHUNKS = 2  # staged chunks extract may run ahead of load
+
+_DONE = object()
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", value)
+
+
+def run_dir(spec, run_id: str) -> str:
+    return os.path.join(spec.get("staging_dir") or DEFAULT_STAGING_DIR, _safe_name(spec["dag_id"]), _safe_name(run_id))
+
+
+def read_manifest(directory: str):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(directory: str, manifest: dict):
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=1, default=str)
+    os.replace(tmp, os.path.join(directory, MANIFEST_NAME))
+
+
+def stage_chunk(df, path: str, compression: str = "zstd"):
+    """Write one chunk as Parquet; returns (file bytes, uncompressed Arrow bytes)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if df.attrs:
+        # attrs (the checkpoint tag) go in the manifest; Arrow would try to embed them as JSON
+        df = df.copy(deep=False)
+        df.attrs = {}
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp, compression=compression)
+    os.replace(tmp, path)
+    return os.path.getsize(path), table.nbytes
+
+
+def read_staged(path: str, checkpoint: dict = None):
+    """Load a staged chunk through a memory map; Arrow buffers are not copied on read."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with pa.memory_map(path, "r") as source:
+        table = pq.read_table(source)
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    if checkpoint:
+        df.attrs["checkpoint"] = _decode_checkpoint(checkpoint)
+    return df
+
+
+def _encode_checkpoint(meta: dict):
+    from log_to_audit import encode_value
+
+    return dict(meta, high=encode_value(meta["high"]) if meta["high"] is not None else None)
+
+
+def _decode_checkpoint(entry: dict):
+    from log_to_audit import decode_value
+
+    return dict(entry, high=decode_value(*entry["high"]) if entry["high"] is not None else None)
+
+
+def staged_chunks(spec, run_id: str, extract_chunks, stats: dict):
+    """
+    Yield DataFrames for the load, staging them on the way through.
+
+    extract_chunks: zero-argument callable returning the source chunk iterator; it is
+    not called when the run's extract already completed (replay). Totals (staged
+    bytes, raw bytes, files, replayed) are accumulated into `stats`.
+    """
+    directory = run_dir(spec, run_id)
+    manifest = read_manifest(directory)
+    stats.update({"staging_dir": directory, "staged_files": 0, "staged_bytes": 0, "staged_raw_bytes": 0})
+
+    if manifest and manifest.get("extract_complete"):
+        logging.info("Replaying %d staged chunks from %s", len(manifest["chunks"]), directory)
+        stats["replayed"] = True
+        for entry in manifest["chunks"]:
+            _count(stats, entry)
+            yield read_staged(os.path.join(directory, entry["file"]), entry.get("checkpoint"))
+        return
+
+    stats["replayed"] = False
+    shutil.rmtree(directory, ignore_errors=True)  # a partial extract from an earlier attempt
+    os.makedirs(directory)
+    manifest = {"dag_id": spec["dag_id"], "run_id": run_id, "created_at": time.time(),
+                "compression": spec.get("staging_compression", "zstd"), "extract_complete": False, "chunks": []}
+    _write_manifest(directory, manifest)
+
+    staged = queue.Queue(maxsize=PREFETCH_CHUNKS)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                staged.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def extract():
+        try:
+            with contextlib.closing(extract_chunks()) as chunks:
+                for chunk_no, df in enumerate(chunks):
+                    if stop.is_set():
+                        return
+                    name = f"chunk_{chunk_no:06d}.parquet"
+                    nbytes, raw_bytes = stage_chunk(df, os.path.join(directory, name), manifest["compression"])
+                    entry = {"file": name, "rows": len(df), "bytes": nbytes, "raw_bytes": raw_bytes}
+                    if df.attrs.get("checkpoint"):
+                        # Key range and high key of the chunk, so a replay can skip committed chunks
+                        entry["checkpoint"] = _encode_checkpoint(df.attrs["checkpoint"])
+                    manifest["chunks"].append(entry)
+                    _write_manifest(directory, manifest)
+                    put(entry)
+            manifest["extract_complete"] = True
+            _write_manifest(directory, manifest)
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+
+    extractor = threading.Thread(target=extract, name="stage-extract", daemon=True)
+    extractor.start()
+    try:
+        while True:
+            item = staged.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            _count(stats, item)
+            yield read_staged(os.path.join(directory, item["file"]), item.get("checkpoint"))
+    finally:
+        stop.set()
+        extractor.join()
+
+
+def _count(stats: dict, entry: dict):
+    stats["staged_files"] += 1
+    stats["staged_bytes"] += entry["bytes"]
+    stats["staged_raw_bytes"] += entry["raw_bytes"]
+
+
+def prune_runs(spec, keep: int):
+    """Keep only the `keep` most recent staged runs of a DAG."""
+    dag_dir = os.path.join(spec.get("staging_dir") or DEFAULT_STAGING_DIR, _safe_name(spec["dag_id"]))
+    if not os.path.isdir(dag_dir):
+        return
+    runs = sorted(
+        (os.path.join(dag_dir, name) for name in os.listdir(dag_dir)),
+        key=os.path.getmtime, reverse=True
+    )
+    for path in runs[max(keep, 0):]:
+        shutil.rmtree(path, ignore_errors=True)
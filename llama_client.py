@@ -1,15 +1,25 @@
+import os
 import openai
+from utils import tracing
+from utils.streaming import measure_stream
 
-# Read Open AI key from text file
-with open("secret_keys/openai_key.txt", "r") as f:
-    api_key = f.read().strip()
+# Read Open AI key from the environment, or from text file
+api_key = os.getenv("OPENAI_API_KEY")
+if not api_key:
+    with open("secret_keys/openai_key.txt", "r") as f:
+        api_key = f.read().strip()
 
 openai.api_key = api_key
+# Point at any OpenAI-compatible endpoint, e.g. tools/fake_llm_server.py during development
+if os.getenv("OPENAI_API_BASE"):
+    openai.api_base = os.getenv("OPENAI_API_BASE")
 
 class LlamaClient:
-    def __init__(self, model_name="gpt-4", temperature=0.0):
+    def __init__(self, model_name="gpt-4", temperature=0.0, max_tokens=150):
         self.model_name = model_name
         self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.last_stream_metrics = {}  # ttft_s, total_s, tokens, tokens_per_sec of the last stream
 
     def chat(self, conversation):
         """
@@ -20,17 +30,46 @@ class LlamaClient:
         # Ensure the conversation is in the correct format expected by the API
         messages = [{"role": entry['role'], "content": entry['content']} for entry in conversation]
 
-        try:
-            # Use the correct method for OpenAI chat models
+        with tracing.span("llm.chat", tracing.SPAN_KIND_CLIENT, **{"llm.model": self.model_name,
+                                                                    "llm.messages": len(messages)}) as span:
+            try:
+                # Use the correct method for OpenAI chat models
+                response = openai.ChatCompletion.create(
+                    model=self.model_name,        # Set the model (e.g., "gpt-4" or "gpt-3.5-turbo")
+                    messages=messages,             # Pass the entire conversation history
+                    temperature=self.temperature,   # Control randomness of responses
+                    max_tokens=self.max_tokens     # Optional: Set the maximum tokens for the response
+                )
+                # Extract the response text from the API response
+                text = response['choices'][0]['message']['content']
+                return {"text": text}
+
+            except Exception as e:
+                if span is not None:
+                    span.record_error(e)
+                return {"error": str(e)}
+
+    def chat_stream(self, conversation, metrics: dict = None):
+        """
+        Same input as chat(), but yields the response as text deltas while the
+        model generates it. Timing of the stream is left in `metrics` (default
+        self.last_stream_metrics). API errors are raised from the iteration rather
+        than yielded, so they never read as part of the reply.
+        """
+        messages = [{"role": entry['role'], "content": entry['content']} for entry in conversation]
+
+        def deltas():
             response = openai.ChatCompletion.create(
-                model=self.model_name,        # Set the model (e.g., "gpt-4" or "gpt-3.5-turbo")
-                messages=messages,             # Pass the entire conversation history
-                temperature=self.temperature,   # Control randomness of responses
-                max_tokens=150                 # Optional: Set the maximum tokens for the response
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True
             )
-            # Extract the response text from the API response
-            text = response['choices'][0]['message']['content']
-            return {"text": text}
+            for chunk in response:
+                choices = chunk.get("choices") or []
+                if choices:
+                    yield choices[0].get("delta", {}).get("content") or ""
 
-        except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+        return measure_stream(deltas(), self.last_stream_metrics if metrics is None else metrics, "llm.chat_stream",
+                              **{"llm.model": self.model_name, "llm.messages": len(messages)})
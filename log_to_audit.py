@@ -1,57 +1,434 @@
+import atexit
+import json
 import sqlite3
-from datetime import datetime
+import threading
+import urllib.parse
+from datetime import date, datetime
 import sys
 import os
 
-def log_ingestion(
-    source_name: str,
-    source_schema: str,
-    source_table: str,
-    target_schema: str,
-    target_table: str,
-    status: str,
-    message: str = ""
-):
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_BUSY_TIMEOUT_MS = 30000
+
+
+def _audit_db_path():
+    if os.getenv("AUDIT_DB_PATH"):
+        return os.getenv("AUDIT_DB_PATH")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "audit.db")
+
+
+def _ensure_watermark_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+        dag_id TEXT PRIMARY KEY,
+        watermark_column TEXT NOT NULL,
+        watermark_value TEXT NOT NULL,
+        watermark_type TEXT NOT NULL,
+        updated_at TIMESTAMP
+    )
+    """)
+
+
+def encode_value(value):
+    """(text, type) for a key or watermark value, so it round-trips through decode_value."""
+    if hasattr(value, "to_pydatetime"):  # pandas.Timestamp
+        value = value.to_pydatetime()
+    if hasattr(value, "item") and not isinstance(value, (datetime, date)):  # numpy scalars
+        value = value.item()
+
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" "), "timestamp"
+    if isinstance(value, date):
+        return value.isoformat(), "date"
+    if isinstance(value, bool):
+        raise ValueError(f"Unsupported watermark value: {value!r}")
+    if isinstance(value, int):
+        return str(value), "int"
+    if isinstance(value, float):
+        return repr(value), "float"
+    return str(value), "str"
+
+
+def decode_value(value: str, value_type: str):
+    if value is None:
+        return None
+    if value_type == "int":
+        return int(value)
+    if value_type == "float":
+        return float(value)
+    if value_type == "timestamp":
+        return datetime.fromisoformat(value)
+    if value_type == "date":
+        return date.fromisoformat(value)
+    return value
+
+
+def get_watermark(dag_id: str):
+    """Return the last committed high-water mark for a DAG, or None on its first run."""
+    conn = sqlite3.connect(_audit_db_path(), timeout=AUDIT_BUSY_TIMEOUT_MS / 1000)
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        db_path = os.path.join(script_dir, "audit.db")
+        cursor = conn.cursor()
+        _ensure_watermark_table(cursor)
+        row = cursor.execute(
+            "SELECT watermark_value, watermark_type FROM ingestion_watermarks WHERE dag_id = ?",
+            (dag_id,)
+        ).fetchone()
+    finally:
+        conn.close()
 
-        conn = sqlite3.connect(db_path)
+    if row is None:
+        return None
+    return decode_value(*row)
+
+
+def set_watermark(dag_id: str, watermark_column: str, value):
+    """Durably record the high-water mark reached by a successful incremental run."""
+    stored, value_type = encode_value(value)
+
+    conn = sqlite3.connect(_audit_db_path(), timeout=AUDIT_BUSY_TIMEOUT_MS / 1000)
+    try:
         cursor = conn.cursor()
+        _ensure_watermark_table(cursor)
+        cursor.execute("""
+        INSERT INTO ingestion_watermarks (dag_id, watermark_column, watermark_value, watermark_type, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(dag_id) DO UPDATE SET
+            watermark_column = excluded.watermark_column,
+            watermark_value = excluded.watermark_value,
+            watermark_type = excluded.watermark_type,
+            updated_at = excluded.updated_at
+        """, (dag_id, watermark_column, stored, value_type, datetime.utcnow()))
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f"✅ Watermark for {dag_id}: {watermark_column} = {stored}")
+
+
+def _ensure_checkpoint_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingestion_checkpoints (
+        dag_id TEXT NOT NULL,
+        run_id TEXT NOT NULL,
+        chunk_key TEXT NOT NULL,
+        high_value TEXT,
+        high_type TEXT,
+        watermark_value TEXT,
+        watermark_type TEXT,
+        rows INTEGER NOT NULL DEFAULT 0,
+        chunks INTEGER NOT NULL DEFAULT 0,
+        complete INTEGER NOT NULL DEFAULT 0,
+        detail TEXT,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (dag_id, run_id, chunk_key)
+    )
+    """)
+
 
+def record_checkpoint(dag_id: str, run_id: str, chunk_key: str, high=None, rows: int = 0,
+                      complete: bool = False, watermark=None, detail=None):
+    """
+    Durably record that a chunk of `chunk_key` (a key range of the run) is committed to the
+    target up to and including `high`. Rows and chunk counts accumulate per key.
+    """
+    high_value, high_type = encode_value(high) if high is not None else (None, None)
+    wm_value, wm_type = encode_value(watermark) if watermark is not None else (None, None)
+    conn = sqlite3.connect(_audit_db_path(), timeout=AUDIT_BUSY_TIMEOUT_MS / 1000)
+    try:
+        cursor = conn.cursor()
+        _ensure_checkpoint_table(cursor)
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ingestion_audit (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            source_name TEXT,
-            source_schema TEXT,
-            source_table TEXT,
-            target_schema TEXT,
-            target_table TEXT,
-            status TEXT NOT NULL,
-            message TEXT,
-            ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        INSERT INTO ingestion_checkpoints (dag_id, run_id, chunk_key, high_value, high_type,
+            watermark_value, watermark_type, rows, chunks, complete, detail, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(dag_id, run_id, chunk_key) DO UPDATE SET
+            high_value = COALESCE(excluded.high_value, high_value),
+            high_type = COALESCE(excluded.high_type, high_type),
+            watermark_value = COALESCE(excluded.watermark_value, watermark_value),
+            watermark_type = COALESCE(excluded.watermark_type, watermark_type),
+            rows = rows + excluded.rows,
+            chunks = chunks + excluded.chunks,
+            complete = MAX(complete, excluded.complete),
+            detail = COALESCE(excluded.detail, detail),
+            updated_at = excluded.updated_at
+        """, (dag_id, run_id, chunk_key, high_value, high_type, wm_value, wm_type, rows,
+              1 if rows else 0, int(complete), json.dumps(detail) if detail is not None else None,
+              datetime.utcnow().isoformat(sep=" ")))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_checkpoints(dag_id: str, run_id: str) -> dict:
+    """{chunk_key: {"high", "watermark", "rows", "chunks", "complete", "detail"}} committed so far in a run."""
+    db_path = _audit_db_path()
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path, timeout=AUDIT_BUSY_TIMEOUT_MS / 1000)
+    try:
+        cursor = conn.cursor()
+        _ensure_checkpoint_table(cursor)
+        rows = cursor.execute("""
+        SELECT chunk_key, high_value, high_type, watermark_value, watermark_type, rows, chunks, complete, detail
+        FROM ingestion_checkpoints WHERE dag_id = ? AND run_id = ?
+        """, (dag_id, run_id)).fetchall()
+    finally:
+        conn.close()
+    return {
+        key: {
+            "high": decode_value(high, high_type),
+            "watermark": decode_value(wm, wm_type),
+            "rows": n_rows,
+            "chunks": chunks,
+            "complete": bool(complete),
+            "detail": json.loads(detail) if detail else None,
+        }
+        for key, high, high_type, wm, wm_type, n_rows, chunks, complete, detail in rows
+    }
+
+
+_AUDIT_COLUMNS = (
+    "source_name", "source_schema", "source_table", "target_schema", "target_table",
+    "status", "message", "ts", "run_id", "duration_seconds", "metrics",
+)
+
+# Columns added after the first release of ingestion_audit; older audit.db files are migrated in place
+_AUDIT_MIGRATIONS = {
+    "run_id": "TEXT",
+    "duration_seconds": "REAL",
+    "metrics": "TEXT",
+}
+
+
+def _ensure_audit_schema(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingestion_audit (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_name TEXT,
+        source_schema TEXT,
+        source_table TEXT,
+        target_schema TEXT,
+        target_table TEXT,
+        status TEXT NOT NULL,
+        message TEXT,
+        ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(ingestion_audit)")}
+    for column, column_type in _AUDIT_MIGRATIONS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE ingestion_audit ADD COLUMN {column} {column_type}")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_audit_source_target_ts ON ingestion_audit (source_name, target_table, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_audit_target_ts ON ingestion_audit (target_table, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_audit_run_id ON ingestion_audit (run_id)")
+    conn.commit()
+
+
+class AuditWriter:
+    """
+    Appends audit rows through one long-lived WAL-mode connection.
+
+    Rows are buffered and written in a single transaction once `batch_size` rows are
+    pending or `flush_interval` seconds have passed, whichever comes first. Safe to
+    share between threads; separate processes serialize on SQLite's write lock only
+    once per batch instead of once per row.
+    """
+
+    def __init__(self, db_path: str = None, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL):
+        self.db_path = db_path or _audit_db_path()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=AUDIT_BUSY_TIMEOUT_MS / 1000)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={AUDIT_BUSY_TIMEOUT_MS}")
+        _ensure_audit_schema(self._conn)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="audit-writer", daemon=True)
+        self._flusher.start()
+
+    def write(self, source_name, source_schema, source_table, target_schema, target_table,
+              status, message="", run_id=None, duration_seconds=None, metrics=None, ts=None):
+        """Queue one audit row; it is committed with the next batch."""
+        if self._closed.is_set():
+            raise RuntimeError("AuditWriter is closed")
+        ts = (ts or datetime.utcnow()).isoformat(sep=" ")
+        row = (
+            source_name, source_schema, source_table, target_schema, target_table,
+            status, message, ts, run_id, duration_seconds,
+            json.dumps(metrics, default=str) if metrics is not None else None,
         )
-        """)
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
 
-        cursor.execute("""
-        INSERT INTO ingestion_audit (
-            source_name, source_schema, source_table,
-            target_schema, target_table, status, message, ts
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            source_name, source_schema, source_table,
-            target_schema, target_table,
-            status, message, datetime.utcnow()
-        ))
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
 
-        conn.commit()
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO ingestion_audit ({', '.join(_AUDIT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_AUDIT_COLUMNS))})",
+                    rows
+                )
+        except sqlite3.Error:
+            # Keep the rows for the next attempt rather than dropping them
+            self._pending = rows + self._pending
+            raise
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"❌ Error flushing ingestion audit: {e}")
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            self._flush_locked()  # reads see everything written so far
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def run_history(self, source_name: str = None, target_table: str = None,
+                    status: str = None, since=None, limit: int = 100):
+        """Most recent audit rows first, optionally filtered; metrics are decoded from JSON."""
+        clauses, params = [], []
+        for column, value in (("source_name", source_name), ("target_table", target_table), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since.isoformat(sep=" ") if isinstance(since, datetime) else since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._query(
+            f"SELECT id, {', '.join(_AUDIT_COLUMNS)} FROM ingestion_audit {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            (*params, limit)
+        )
+        for row in rows:
+            row["metrics"] = json.loads(row["metrics"]) if row["metrics"] else None
+        return rows
+
+    def durations(self, source_name: str = None, target_table: str = None, since=None):
+        """Per (source_name, target_table): run count and avg/min/max/last duration of successful runs."""
+        clauses, params = ["status = 'success'", "duration_seconds IS NOT NULL"], []
+        if source_name is not None:
+            clauses.append("source_name = ?")
+            params.append(source_name)
+        if target_table is not None:
+            clauses.append("target_table = ?")
+            params.append(target_table)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since.isoformat(sep=" ") if isinstance(since, datetime) else since)
+        return self._query(f"""
+        SELECT source_name, target_table,
+               COUNT(*) AS runs,
+               AVG(duration_seconds) AS avg_seconds,
+               MIN(duration_seconds) AS min_seconds,
+               MAX(duration_seconds) AS max_seconds,
+               MAX(ts) AS last_run_at
+        FROM ingestion_audit
+        WHERE {' AND '.join(clauses)}
+        GROUP BY source_name, target_table
+        ORDER BY avg_seconds DESC
+        """, params)
+
+    def last_success_ts(self, table_name: str):
+        rows = self._query("""
+        SELECT MAX(ts) AS ts FROM ingestion_audit
+        WHERE status = 'success' AND (target_table = ? OR source_table = ?)
+        """, (table_name, table_name))
+        return rows[0]["ts"] if rows else None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    """Process-wide AuditWriter on audit.db, flushed and closed at interpreter exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def last_successful_ingestion(table_name: str):
+    """
+    Timestamp (as text) of the latest successful ingestion into or out of a table, or None.
+    Read-only callers (e.g. the result cache) get a plain read connection; the writer, with its
+    flusher thread and exit hook, is only used when this process has already started it.
+    """
+    if _writer is not None:
+        return _writer.last_success_ts(table_name)
+    db_path = _audit_db_path()
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(f"file:{urllib.parse.quote(db_path)}?mode=ro", uri=True,
+                           timeout=AUDIT_BUSY_TIMEOUT_MS / 1000)
+    try:
+        row = conn.execute("""
+        SELECT MAX(ts) FROM ingestion_audit
+        WHERE status = 'success' AND (target_table = ? OR source_table = ?)
+        """, (table_name, table_name)).fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            return None  # nothing has been audited yet
+        raise
+    finally:
         conn.close()
+    return row[0] if row else None
 
-        print(f"✅ Audit logged: {source_name}.{source_schema}.{source_table} → {target_schema}.{target_table} [{status}]")
 
-    except Exception as e:
-        print(f"❌ Error logging ingestion audit: {e}")
-        sys.exit(1)
+def log_ingestion(
+    source_name: str,
+    source_schema: str,
+    source_table: str,
+    target_schema: str,
+    target_table: str,
+    status: str,
+    message: str = "",
+    run_id: str = None,
+    duration_seconds: float = None,
+    metrics: dict = None,
+    flush: bool = True
+):
+    """
+    Record one ingestion event. flush=False leaves the row to the writer's next batch,
+    which is what high-frequency callers (e.g. per-chunk progress) should use.
+    """
+    writer = get_audit_writer()
+    writer.write(source_name, source_schema, source_table, target_schema, target_table,
+                 status, message, run_id=run_id, duration_seconds=duration_seconds, metrics=metrics)
+    if flush:
+        writer.flush()
+    print(f"✅ Audit logged: {source_name}.{source_schema}.{source_table} → {target_schema}.{target_table} [{status}]")
+
 
 if __name__ == "__main__":
     if len(sys.argv) < 7:
@@ -66,4 +443,8 @@ if __name__ == "__main__":
     status = sys.argv[6]
     message = sys.argv[7] if len(sys.argv) > 7 else ""
 
-    log_ingestion(source_name, source_schema, source_table, target_schema, target_table, status, message)
+    try:
+        log_ingestion(source_name, source_schema, source_table, target_schema, target_table, status, message)
+    except Exception as e:
+        print(f"❌ Error logging ingestion audit: {e}")
+        sys.exit(1)
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The modules live at the repository root and are imported as top-level packages;
+# the fake LLM and GitHub servers are in tools/
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "tools"))
+
+# llama_client reads a key at import time; the fake server accepts any
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
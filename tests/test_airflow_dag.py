@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import airflow_dag
+
+
+def _config(table):
+    return (
+        "ingestion:\n"
+        "  source: {name: mysql_source, schema: src, table: %s}\n"
+        "  target: {schema: analytics, table: %s}\n"
+        "  refresh_schedule: daily\n" % (table, table)
+    )
+
+
+@pytest.fixture
+def tree(tmp_path):
+    configs, outputs, dags = tmp_path / "configs", tmp_path / "dag_outputs", tmp_path / "dags"
+    configs.mkdir()
+    for table in ("orders", "customers"):
+        (configs / f"{table}.yaml").write_text(_config(table))
+    return configs, outputs, dags
+
+
+def _compile(tree):
+    configs, outputs, dags = tree
+    return airflow_dag.compile_all(str(configs), str(outputs), str(dags), workers=1)
+
+
+def _dag_files(folder):
+    return sorted(name for name in os.listdir(folder) if name.startswith("ingest__"))
+
+
+def test_deleted_config_removes_its_dag_from_both_folders(tree):
+    configs, outputs, dags = tree
+    _compile(tree)
+    (configs / "customers.yaml").unlink()
+
+    result = _compile(tree)
+
+    assert result["removed"] == ["ingest__mysql_source__customers.py"]
+    assert _dag_files(outputs) == _dag_files(dags) == ["ingest__mysql_source__orders.py"]
+
+
+def test_renamed_table_replaces_the_old_dag(tree):
+    configs, outputs, dags = tree
+    _compile(tree)
+    (configs / "customers.yaml").unlink()
+    (configs / "clients.yaml").write_text(_config("clients"))
+
+    result = _compile(tree)
+
+    assert result["compiled"] == ["ingest__mysql_source__clients"]
+    assert _dag_files(dags) == ["ingest__mysql_source__clients.py", "ingest__mysql_source__orders.py"]
+
+
+def test_failing_config_keeps_its_last_good_dag(tree):
+    configs, outputs, dags = tree
+    _compile(tree)
+    (configs / "customers.yaml").write_text("ingestion: {}\n")
+
+    result = _compile(tree)
+
+    assert list(result["failed"]) == ["customers.yaml"]
+    assert result["removed"] == []
+    assert "ingest__mysql_source__customers.py" in _dag_files(dags)
+
+
+def test_unrelated_files_in_the_dags_folder_are_left_alone(tree):
+    configs, outputs, dags = tree
+    _compile(tree)
+    (dags / "ingest__hand_written.py").write_text("# not generated\n")
+    (configs / "orders.yaml").unlink()
+
+    _compile(tree)
+
+    assert _dag_files(dags) == ["ingest__hand_written.py", "ingest__mysql_source__customers.py"]
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine
+
+from utils.db import apply_row_limit
+
+
+@pytest.mark.parametrize("dialect, sql, bounded", [
+    (None, "SELECT * FROM t", "SELECT * FROM t LIMIT 1001"),
+    (None, "SELECT * FROM t;", "SELECT * FROM t LIMIT 1001"),
+    (None, "SELECT * FROM t LIMIT 100000", "SELECT * FROM t LIMIT 1001"),
+    (None, "SELECT * FROM t LIMIT 100000 OFFSET 5", "SELECT * FROM t LIMIT 1001 OFFSET 5"),
+    ("mysql", "SELECT * FROM t LIMIT 5, 100000", "SELECT * FROM t LIMIT 5, 1001"),
+    # The LIMIT must not end up inside a trailing comment
+    (None, "SELECT * FROM t -- note", "SELECT * FROM t LIMIT 1001"),
+    ("mysql", "SELECT * FROM t # note", "SELECT * FROM t LIMIT 1001"),
+    (None, "SELECT * FROM t /* LIMIT 5 */", "SELECT * FROM t LIMIT 1001"),
+    # Row clauses that cannot be capped in place are wrapped
+    ("postgresql", "SELECT * FROM t OFFSET 5", "SELECT * FROM (SELECT * FROM t OFFSET 5) AS _bounded LIMIT 1001"),
+    ("postgresql", "SELECT * FROM t LIMIT ALL", "SELECT * FROM (SELECT * FROM t LIMIT ALL) AS _bounded LIMIT 1001"),
+    ("postgresql", "SELECT * FROM t FETCH FIRST 100000 ROWS ONLY",
+     "SELECT * FROM (SELECT * FROM t FETCH FIRST 100000 ROWS ONLY) AS _bounded LIMIT 1001"),
+    (None, "(SELECT a FROM t LIMIT 5) UNION ALL (SELECT a FROM u)",
+     "SELECT * FROM ((SELECT a FROM t LIMIT 5) UNION ALL (SELECT a FROM u)) AS _bounded LIMIT 1001"),
+])
+def test_row_limit_is_always_applied(dialect, sql, bounded):
+    assert apply_row_limit(sql, 1000, dialect) == (bounded, True)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t LIMIT 10",
+    "SELECT * FROM t LIMIT 10 OFFSET 100000",
+    "SELECT * FROM t LIMIT 100000, 10",
+])
+def test_small_limits_are_kept(sql):
+    assert apply_row_limit(sql, 1000, "mysql") == (sql, False)
+
+
+def test_literals_and_executable_comments_are_kept():
+    bounded, limited = apply_row_limit("SELECT '-- x' AS a /*+ MAX_EXECUTION_TIME(10) */ FROM t", 9, "mysql")
+    assert bounded == "SELECT '-- x' AS a /*+ MAX_EXECUTION_TIME(10) */ FROM t LIMIT 10"
+    assert limited
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT n FROM numbers -- all of them",
+    "SELECT n FROM numbers LIMIT 1000 OFFSET 5",
+    "SELECT n FROM numbers LIMIT 5, 1000",
+    "SELECT n FROM numbers ORDER BY n LIMIT -1 OFFSET 3",
+    "SELECT * FROM (SELECT n FROM numbers LIMIT 500) AS s UNION ALL SELECT n FROM numbers",
+])
+def test_bounded_queries_return_at_most_the_cap(tmp_path, sql):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE numbers (n INTEGER)")
+        conn.exec_driver_sql("INSERT INTO numbers WITH RECURSIVE s(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM s "
+                             "WHERE n < 2000) SELECT n FROM s")
+        bounded, _ = apply_row_limit(sql, 100, "sqlite")
+        assert len(conn.exec_driver_sql(bounded).fetchall()) == 101
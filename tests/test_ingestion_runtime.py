@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine
+
+import ingestion_runtime
+from log_to_audit import set_watermark
+
+
+class FakeTI:
+    def __init__(self, try_number):
+        self.try_number = try_number
+
+
+@pytest.fixture
+def spec(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUDIT_DB_PATH", str(tmp_path / "audit.db"))
+    source_url, target_url = f"sqlite:///{tmp_path / 'source.db'}", f"sqlite:///{tmp_path / 'target.db'}"
+    with create_engine(source_url).begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE events (id INTEGER, updated_at INTEGER)")
+        conn.exec_driver_sql("INSERT INTO events VALUES " + ", ".join(f"({i}, {i})" for i in range(1, 11)))
+    return {
+        "dag_id": "ingest__test__events", "source_name": "test_source",
+        "source_conn": source_url, "target_conn": target_url,
+        "source_schema": "main", "source_table": "events", "target_schema": "main", "target_table": "events",
+        "extract_mode": "stream", "chunk_size": 3, "partition_column": "", "partitions": 1,
+        "max_concurrency": 1, "checkpoint_column": "", "staging": False,
+        "load_strategy": "incremental", "watermark_column": "updated_at", "merge_keys": [],
+    }
+
+
+def _target_ids(spec):
+    with create_engine(spec["target_conn"]).connect() as conn:
+        return [row[0] for row in conn.exec_driver_sql("SELECT id FROM events ORDER BY id")]
+
+
+def _append_to_target(spec, ids):
+    engine = create_engine(spec["target_conn"])
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS events (id INTEGER, updated_at INTEGER)")
+        conn.exec_driver_sql("INSERT INTO events VALUES " + ", ".join(f"({i}, {i})" for i in ids))
+
+
+def test_rerun_after_an_unfinished_append_does_not_duplicate(spec):
+    # An earlier run committed up to 4; a failed attempt then appended 5-7 without saving the watermark
+    _append_to_target(spec, range(1, 8))
+    set_watermark(spec["dag_id"], "updated_at", 4)
+
+    result = ingestion_runtime.extract_and_load(spec, run_id="run_2")
+
+    assert result["rows"] == 6
+    assert _target_ids(spec) == list(range(1, 11))
+
+
+def test_retry_of_a_first_run_does_not_duplicate(spec):
+    _append_to_target(spec, range(1, 4))
+
+    ingestion_runtime.extract_and_load(spec, run_id="run_1", ti=FakeTI(2))
+
+    assert _target_ids(spec) == list(range(1, 11))
+
+
+def test_first_attempt_without_watermark_keeps_existing_rows(spec):
+    _append_to_target(spec, [100])
+
+    ingestion_runtime.extract_and_load(spec, run_id="run_1", ti=FakeTI(1))
+
+    assert _target_ids(spec) == list(range(1, 11)) + [100]
+
+
+def test_overwrite_of_an_empty_source_empties_the_target(spec):
+    spec["load_strategy"] = "overwrite"
+    _append_to_target(spec, [1, 2, 3])
+    with create_engine(spec["source_conn"]).begin() as conn:
+        conn.exec_driver_sql("DELETE FROM events")
+
+    result = ingestion_runtime.extract_and_load(spec, run_id="run_1")
+
+    assert result["rows"] == 0
+    assert _target_ids(spec) == []
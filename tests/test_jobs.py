@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+import conv_manager
+from utils.jobs import DONE, JobManager, report_progress
+
+
+@pytest.fixture
+def manager():
+    jobs = JobManager(max_workers=2)
+    yield jobs
+    jobs.shutdown()
+
+
+# Jobs are keyed on JSON arguments, so the test jobs wait on this module-level event
+release = threading.Event()
+
+
+@pytest.fixture(autouse=True)
+def _reset_release():
+    release.clear()
+    yield
+    release.set()
+
+
+def _blocking(value):
+    while not release.wait(0.01):
+        report_progress()
+    return value
+
+
+def test_cancel_detaches_the_owner_from_a_shared_job(manager):
+    first = manager.submit(_blocking, "x", owner="a")
+    assert manager.submit(_blocking, "x", owner="b") == first
+
+    assert manager.cancel(first, owner="a")
+    assert [j["id"] for j in manager.jobs(owner="a")] == []
+    assert not manager.cancel(first, owner="a")
+
+    release.set()
+    assert manager.wait(first, timeout=5)["status"] == DONE
+    assert manager.result(first) == "x"
+
+
+def test_cancel_by_the_last_owner_stops_the_job(manager):
+    job_id = manager.submit(_blocking, "x", owner="a")
+    assert manager.cancel(job_id, owner="a")
+    assert manager.wait(job_id, timeout=5)["status"] == "cancelled"
+
+
+def test_sessions_share_a_job_but_keep_their_own_state(manager, monkeypatch):
+    monkeypatch.setattr(conv_manager, "get_job_manager", lambda: manager)
+    monkeypatch.setattr(conv_manager, "discover_sources_full",
+                        lambda keyword: _blocking([{"table": "orders"}]))
+    first, second = conv_manager.ConversationManager(), conv_manager.ConversationManager()
+
+    job_id = first.submit_action("discover_sources_full", owner="a", keyword="ord")
+    assert second.submit_action("discover_sources_full", owner="b", keyword="ord") == job_id
+    release.set()
+    manager.wait(job_id, timeout=5)
+
+    assert first.state == {}
+    assert second.collect_action("discover_sources_full", job_id) == [{"table": "orders"}]
+    assert second.state["full_sources"] == [{"table": "orders"}]
+    assert first.state == {}
@@ -0,0 +1,62 @@
+import socket
+
+import openai
+import pytest
+
+import fake_llm_server
+from llama_client import LlamaClient
+
+REPLY = "SELECT region, SUM(amount) FROM sales GROUP BY region;"
+
+
+@pytest.fixture
+def llm_server(monkeypatch):
+    server, base_url = fake_llm_server.serve_in_background(reply=REPLY, token_delay=0, first_token_delay=0)
+    monkeypatch.setattr(openai, "api_base", f"{base_url}/v1")
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def unreachable_llm(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    monkeypatch.setattr(openai, "api_base", f"http://127.0.0.1:{port}/v1")
+
+
+def test_chat_stream_yields_the_reply_and_fills_metrics(llm_server):
+    metrics = {}
+    deltas = list(LlamaClient().chat_stream([{"role": "user", "content": "sales by region"}], metrics))
+
+    assert "".join(deltas) == REPLY
+    assert len(deltas) > 1
+    assert metrics["tokens"] == len(deltas)
+    assert metrics["ttft_s"] is not None
+
+
+def test_chat_stream_raises_instead_of_yielding_the_error(unreachable_llm):
+    with pytest.raises(Exception):
+        list(LlamaClient().chat_stream([{"role": "user", "content": "hello"}]))
+
+
+def test_failed_stream_leaves_no_dangling_user_turn(unreachable_llm):
+    from conv_manager import ConversationManager
+
+    manager = ConversationManager()
+    manager.context.add("user", "earlier question")
+    manager.context.add("assistant", "earlier answer")
+    with pytest.raises(Exception):
+        list(manager.user_message_stream("hello"))
+
+    assert [m["content"] for m in manager.context.messages] == ["earlier question", "earlier answer"]
+
+
+def test_streamed_reply_is_recorded_once(llm_server):
+    from conv_manager import ConversationManager
+
+    manager = ConversationManager()
+    reply = "".join(manager.user_message_stream("sales by region"))
+
+    assert reply == REPLY
+    assert manager.context.messages[-1] == {"role": "assistant", "content": REPLY}
@@ -0,0 +1,73 @@
+import pytest
+
+import fake_github_server
+from github_integration import pr_creator
+
+REPO = "acme/onboarding"
+
+
+def _serve(monkeypatch, **kwargs):
+    server, base_url, state = fake_github_server.serve_in_background(**kwargs)
+    # The client and repo handles are cached per process; start from fresh ones bound to this server
+    monkeypatch.setattr(pr_creator, "GITHUB_API_URL", base_url)
+    monkeypatch.setattr(pr_creator, "GITHUB_SECONDS_BETWEEN_WRITES", 0.0)
+    monkeypatch.setattr(pr_creator, "GITHUB_SECONDARY_RATE_WAIT", 0.0)
+    monkeypatch.setattr(pr_creator, "_client", None)
+    monkeypatch.setattr(pr_creator, "_repos", {})
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    return server, state
+
+
+@pytest.fixture
+def github(monkeypatch):
+    server, state = _serve(monkeypatch)
+    yield state
+    server.shutdown()
+
+
+def _configs(n):
+    return {f"mysql_source/table_{i}": f"source:\n  table: table_{i}\n" for i in range(n)}
+
+
+@pytest.mark.parametrize("n", [1, 25])
+def test_batch_pr_is_one_commit_and_one_pull_for_any_number_of_configs(github, n):
+    configs = _configs(n)
+    pr = pr_creator.create_batch_ingestion_pr(REPO, "ingestion/batch", configs, "Onboard tables", "body")
+
+    assert github.requests[f"POST /repos/{REPO}/git/commits"] == 1
+    assert github.requests[f"POST /repos/{REPO}/git/trees"] == 1
+    assert len(github.pulls[REPO]) == 1
+    assert pr.title == "Onboard tables"
+
+    files = github.files_at(REPO, "ingestion/batch")
+    assert {pr_creator.config_path(name): content for name, content in configs.items()} == files
+
+
+def test_request_count_does_not_grow_with_configs(github):
+    before = github.request_count
+    pr_creator.create_batch_ingestion_pr(REPO, "ingestion/one", _configs(1), "one", "body")
+    one = github.request_count - before
+
+    before = github.request_count
+    pr_creator.create_batch_ingestion_pr(REPO, "ingestion/many", _configs(50), "many", "body")
+    assert github.request_count - before <= one
+
+
+def test_empty_batch_is_rejected(github):
+    with pytest.raises(ValueError):
+        pr_creator.create_batch_ingestion_pr(REPO, "ingestion/empty", {}, "title", "body")
+    assert github.request_count == 0
+
+
+def test_secondary_rate_limit_is_retried(monkeypatch):
+    server, state = _serve(monkeypatch, rate_limit_every=3, retry_after=0)
+    try:
+        pr_creator.create_batch_ingestion_pr(REPO, "ingestion/retry", _configs(3), "title", "body")
+    finally:
+        server.shutdown()
+
+    # Rejected attempts are counted in state.requests; what was stored is one commit and one PR
+    assert state.rate_limited > 0
+    assert len(state.commits) == 2  # the repo's initial commit and the batch commit
+    assert len(state.pulls[REPO]) == 1
+    assert len(state.files_at(REPO, "ingestion/retry")) == 3
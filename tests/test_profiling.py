@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import create_engine
+
+from data_ops import profile_cache, profiling
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    uri = f"sqlite:///{tmp_path / 'source.db'}"
+    engine = create_engine(uri)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE events (id INTEGER PRIMARY KEY, kind TEXT, ok BOOLEAN)")
+        conn.exec_driver_sql("INSERT INTO events (kind, ok) WITH RECURSIVE s(n) AS (SELECT 1 UNION ALL "
+                             "SELECT n + 1 FROM s WHERE n < 300) SELECT 'k' || (n % 3), n % 2 FROM s")
+    monkeypatch.setitem(profiling.DB_CONFIGS, "test_source", uri)
+    monkeypatch.setattr(profile_cache, "PROFILE_CACHE_DIR", str(tmp_path / "profile_cache"))
+    monkeypatch.setattr(profile_cache, "table_fingerprint", lambda *args: "unversioned")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_ROWS", 100)
+    return monkeypatch
+
+
+def _profile(source, row_estimate):
+    source.setattr(profiling, "_row_estimate", lambda *args: row_estimate)
+    summary, _ = profiling.profile_table("test_source", None, "events", use_cache=False)
+    return summary
+
+
+def test_stale_small_estimate_still_bounds_the_sample(source):
+    summary = _profile(source, 10)
+    assert summary["sample_size"] == 200
+    assert summary["row_count"] == 300 and summary["row_count_exact"]
+
+
+def test_unknown_estimate_profiles_the_sample_only(source):
+    summary = _profile(source, None)
+    assert summary["stats_scope"] == "sample"
+    assert summary["sample_size"] == 100
+    assert summary["row_count"] == 100 and summary["row_count_minimum"]
+    assert not summary["row_count_exact"]
+
+
+def test_unknown_estimate_of_a_table_smaller_than_the_sample_is_exact(source):
+    source.setattr(profiling, "PROFILE_SAMPLE_ROWS", 1000)
+    summary = _profile(source, None)
+    assert summary["stats_scope"] == "table"
+    assert summary["row_count"] == 300 and summary["row_count_exact"]
+    assert not summary["row_count_minimum"]
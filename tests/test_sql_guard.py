@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import create_engine
+
+from utils.sql_guard import QueryRejected, check_read_only, estimate_cost, guard_query
+
+
+@pytest.mark.parametrize("dialect, sql", [
+    # "#" is an operator in PostgreSQL, not a comment that hides the rest of the line
+    ("postgresql", "SELECT payload #> '{a}' FROM events; DROP TABLE events; SELECT 1"),
+    (None, "SELECT payload #> '{a}' FROM events; DROP TABLE events"),
+    # Backslash does not escape a quote in a PostgreSQL string
+    ("postgresql", "SELECT 'a\\'; DROP TABLE events; SELECT '' FROM t"),
+    # Dollar quoting ends where PostgreSQL ends it, whatever quotes it contains
+    ("postgresql", "SELECT $$'$$; DROP TABLE events; SELECT '$$'"),
+    # MySQL runs the body of /*! ... */ and /*+ ... */
+    ("mysql", "SELECT * FROM t /*! INTO OUTFILE '/tmp/x' */"),
+    ("mysql", "SELECT * FROM t /*!50100 INTO OUTFILE '/tmp/x' */"),
+    ("mysql", "SELECT 1 /*!; DROP TABLE t */"),
+    ("mysql", "SELECT 1 /*+ ; DROP TABLE t */"),
+    # "--" needs whitespace after it to start a MySQL comment
+    ("mysql", "SELECT 1 --1; DROP TABLE t"),
+    ("mysql", "SELECT 'a\\'#', 1; DROP TABLE t"),
+    ("sqlite", "SELECT 1; DELETE FROM t"),
+    ("sqlite", "SELECT 1; -- trailing"),
+])
+def test_hidden_statements_are_rejected(dialect, sql):
+    with pytest.raises(QueryRejected):
+        check_read_only(sql, dialect)
+
+
+@pytest.mark.parametrize("dialect, sql", [
+    ("postgresql", "SELECT payload #> '{a}' AS a FROM events"),
+    ("postgresql", "SELECT $tag$; DROP$tag$ AS note FROM events"),
+    ("mysql", "SELECT 'O\\'Brien; x' AS name FROM t # a comment; with a semicolon"),
+    ("mysql", "SELECT 1 -- comment; here"),
+    ("sqlite", "SELECT 'a;b' AS v /* ; */ FROM t"),
+])
+def test_single_selects_pass(dialect, sql):
+    check_read_only(sql, dialect)
+
+
+def test_explain_never_receives_a_second_statement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'guard.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE events (id INTEGER PRIMARY KEY, payload TEXT)")
+
+    with pytest.raises(QueryRejected):
+        estimate_cost(engine, "SELECT id FROM events; DROP TABLE events")
+    with pytest.raises(QueryRejected):
+        guard_query("SELECT id FROM events # ; DROP TABLE events", engine=engine)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM events").scalar() == 0
+
+
+def test_guard_query_bounds_a_plain_select(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'guard.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE events (id INTEGER PRIMARY KEY, payload TEXT)")
+
+    guarded = guard_query("SELECT id FROM events;", engine=engine, max_rows=10)
+    assert guarded["sql"] == "SELECT id FROM events LIMIT 11"
+    assert guarded["plan"] is not None
@@ -0,0 +1,202 @@
+"""
+Local fake of the GitHub REST endpoints used by github_integration/pr_creator.py.
+
+Keeps repositories, commits, trees, refs and pull requests in memory, counts
+requests, and can inject secondary rate limits to exercise the client's backoff:
+
+    python tools/fake_github_server.py --port 8809 --rate-limit-every 5
+    GITHUB_API_URL=http://localhost:8809 GITHUB_TOKEN=dummy streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGitHubState:
+    def __init__(self, rate_limit_every: int = 0, retry_after: int = 1):
+        self.lock = threading.Lock()
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = Counter()  # "METHOD /normalized/path" -> count
+        self.request_count = 0
+        self.rate_limited = 0
+        self.refs = {}      # (repo, "refs/heads/x") -> sha
+        self.commits = {}   # sha -> {"tree": sha, "parents": [...], "message": str}
+        self.trees = {}     # sha -> {path: content}
+        self.pulls = {}     # repo -> [pull dicts]
+
+    def ensure_repo(self, repo: str):
+        if (repo, "refs/heads/main") not in self.refs:
+            tree = self.add_tree({})
+            self.refs[(repo, "refs/heads/main")] = self.add_commit(tree, [], "Initial commit")
+
+    def add_tree(self, files: dict):
+        sha = _sha(json.dumps(files, sort_keys=True))
+        self.trees[sha] = files
+        return sha
+
+    def add_commit(self, tree: str, parents: list, message: str):
+        sha = _sha(json.dumps([tree, parents, message]))
+        self.commits[sha] = {"tree": tree, "parents": parents, "message": message}
+        return sha
+
+    def files_at(self, repo: str, branch: str):
+        sha = self.refs.get((repo, f"refs/heads/{branch}"))
+        return dict(self.trees[self.commits[sha]["tree"]]) if sha else None
+
+
+def _sha(text: str):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    state = None  # FakeGitHubState, set per server
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _send(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _route(self, method):
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/api/v3"):
+            path = path[len("/api/v3"):]
+        state = self.state
+        with state.lock:
+            state.requests[f"{method} {re.sub(r'[0-9a-f]{40}', '<sha>', path)}"] += 1
+            state.request_count += 1
+            if state.rate_limit_every and state.request_count % state.rate_limit_every == 0:
+                state.rate_limited += 1
+                self._send({"message": "You have exceeded a secondary rate limit. Please wait a few minutes before you try again.",
+                            "documentation_url": "https://docs.github.com/rest/overview/rate-limits-for-the-rest-api"},
+                           status=403, headers={"Retry-After": str(state.retry_after)})
+                return
+
+            match = re.match(r"^/repos/([^/]+/[^/]+)(/.*)?$", path)
+            if not match:
+                self._send({"message": "Not Found"}, status=404)
+                return
+            repo, rest = match.group(1), match.group(2) or ""
+            state.ensure_repo(repo)
+            handler = getattr(self, f"_{method.lower()}", None)
+            handler(repo, rest)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def _repo_url(self, repo):
+        return f"{self.base}/repos/{repo}"
+
+    def _commit_json(self, repo, sha):
+        commit = self.state.commits[sha]
+        return {
+            "sha": sha, "url": f"{self._repo_url(repo)}/git/commits/{sha}", "message": commit["message"],
+            "tree": {"sha": commit["tree"], "url": f"{self._repo_url(repo)}/git/trees/{commit['tree']}"},
+            "parents": [{"sha": p, "url": f"{self._repo_url(repo)}/git/commits/{p}"} for p in commit["parents"]],
+        }
+
+    def _ref_json(self, repo, ref):
+        sha = self.state.refs[(repo, ref)]
+        return {"ref": ref, "url": f"{self._repo_url(repo)}/git/{ref}",
+                "object": {"sha": sha, "type": "commit", "url": f"{self._repo_url(repo)}/git/commits/{sha}"}}
+
+    def _get(self, repo, rest):
+        state = self.state
+        if rest == "":
+            owner, name = repo.split("/")
+            self._send({"id": 1, "name": name, "full_name": repo, "owner": {"login": owner},
+                        "default_branch": "main", "url": self._repo_url(repo),
+                        "html_url": f"https://github.example/{repo}"})
+        elif re.match(r"^/git/refs?/heads/", rest):
+            ref = "refs/" + rest.split("/", 3)[3]
+            if (repo, ref) in state.refs:
+                self._send(self._ref_json(repo, ref))
+            else:
+                self._send({"message": "Not Found"}, status=404)
+        elif rest.startswith("/git/commits/"):
+            sha = rest.rsplit("/", 1)[1]
+            if sha in state.commits:
+                self._send(self._commit_json(repo, sha))
+            else:
+                self._send({"message": "Not Found"}, status=404)
+        else:
+            self._send({"message": "Not Found"}, status=404)
+
+    def _post(self, repo, rest):
+        state = self.state
+        body = self._read_json()
+        if rest == "/git/trees":
+            files = dict(state.trees.get(body.get("base_tree"), {}))
+            for entry in body.get("tree", []):
+                if entry.get("sha") is None and "content" not in entry:
+                    files.pop(entry["path"], None)
+                else:
+                    files[entry["path"]] = entry.get("content")
+            sha = state.add_tree(files)
+            self._send({"sha": sha, "url": f"{self._repo_url(repo)}/git/trees/{sha}",
+                        "tree": [{"path": p, "mode": "100644", "type": "blob"} for p in sorted(files)]}, status=201)
+        elif rest == "/git/commits":
+            sha = state.add_commit(body["tree"], body.get("parents", []), body["message"])
+            self._send(self._commit_json(repo, sha), status=201)
+        elif rest == "/git/refs":
+            if (repo, body["ref"]) in state.refs:
+                self._send({"message": "Reference already exists"}, status=422)
+                return
+            state.refs[(repo, body["ref"])] = body["sha"]
+            self._send(self._ref_json(repo, body["ref"]), status=201)
+        elif rest == "/pulls":
+            pulls = state.pulls.setdefault(repo, [])
+            number = len(pulls) + 1
+            pull = {"number": number, "title": body["title"], "body": body.get("body"), "state": "open",
+                    "url": f"{self._repo_url(repo)}/pulls/{number}",
+                    "html_url": f"https://github.example/{repo}/pull/{number}",
+                    "head": {"ref": body["head"]}, "base": {"ref": body["base"]}}
+            pulls.append(pull)
+            self._send(pull, status=201)
+        else:
+            self._send({"message": "Not Found"}, status=404)
+
+
+def serve_in_background(port: int = 0, rate_limit_every: int = 0, retry_after: int = 1):
+    """Start the fake API on a daemon thread; returns (server, base_url, state)."""
+    state = FakeGitHubState(rate_limit_every, retry_after)
+    handler = type("ConfiguredFakeGitHubHandler", (FakeGitHubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8809)
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="answer every Nth request with a secondary rate limit (0 = never)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    FakeGitHubHandler.state = FakeGitHubState(args.rate_limit_every, args.retry_after)
+    print(f"Fake GitHub API on http://localhost:{args.port}")
+    ThreadingHTTPServer(("0.0.0.0", args.port), FakeGitHubHandler).serve_forever()
@@ -0,0 +1,131 @@
+"""
+Local fake LLM server speaking the OpenAI chat-completions and Ollama generate APIs.
+
+Used to exercise LlamaClient.chat / chat_stream and the Ollama-backed SQL chain
+(including streaming) without a real model:
+
+    python tools/fake_llm_server.py --port 8808 --reply "SELECT COUNT(*) FROM daily_transactions;"
+    OPENAI_API_BASE=http://localhost:8808/v1 OLLAMA_BASE_URL=http://localhost:8808 streamlit run app.py
+
+Replies are split into word tokens and streamed with --token-delay seconds between them.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    reply = "SELECT 1;"
+    token_delay = 0.02
+    first_token_delay = 0.2
+
+    def log_message(self, format, *args):
+        pass
+
+    def _tokens(self):
+        return re.findall(r"\S+\s*", self.reply)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = self._read_json()
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completions(request)
+        elif self.path.rstrip("/").endswith("/api/generate"):
+            self._ollama_generate(request)
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def _chat_completions(self, request):
+        model = request.get("model", "fake")
+        if not request.get("stream"):
+            time.sleep(self.first_token_delay + self.token_delay * len(self._tokens()))
+            self._send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(self._tokens()), "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        for token in self._tokens():
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _ollama_generate(self, request):
+        model = request.get("model", "fake")
+        if request.get("stream") is False:
+            time.sleep(self.first_token_delay + self.token_delay * len(self._tokens()))
+            self._send_json({"model": model, "response": self.reply, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        for token in self._tokens():
+            line = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "response": token, "done": False}
+            self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write((json.dumps({"model": model, "response": "", "done": True}) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+def serve_in_background(reply: str = None, port: int = 0, token_delay: float = None, first_token_delay: float = None):
+    """Start the fake server on a daemon thread; returns (server, base_url)."""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {})
+    if reply is not None:
+        handler.reply = reply
+    if token_delay is not None:
+        handler.token_delay = token_delay
+    if first_token_delay is not None:
+        handler.first_token_delay = first_token_delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--reply", default=FakeLLMHandler.reply)
+    parser.add_argument("--token-delay", type=float, default=FakeLLMHandler.token_delay)
+    parser.add_argument("--first-token-delay", type=float, default=FakeLLMHandler.first_token_delay)
+    args = parser.parse_args()
+
+    FakeLLMHandler.reply = args.reply
+    FakeLLMHandler.token_delay = args.token_delay
+    FakeLLMHandler.first_token_delay = args.first_token_delay
+    print(f"Fake LLM server on http://localhost:{args.port} (OpenAI: /v1/chat/completions, Ollama: /api/generate)")
+    ThreadingHTTPServer(("0.0.0.0", args.port), FakeLLMHandler).serve_forever()
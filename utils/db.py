@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine
 import pandas as pd
 import os
+import re
 import urllib.parse
+from utils.engine_registry import get_engine as get_shared_engine
+from utils.sql_guard import statement_timeout, strip_comments
 
 def get_engine():
     # Config
@@ -11,9 +13,84 @@ def get_engine():
     host = os.getenv("DB_HOST", "localhost")
     db = os.getenv("DB_NAME", "ai_tdv_finacle")
     db_uri = f"mysql+pymysql://{user}:{encoded_password}@{host}/{db}"
-    return create_engine(db_uri)
+    return get_shared_engine(db_uri)
 
 def run_query(query: str):
     engine = get_engine()
     with engine.connect() as conn:
         return pd.read_sql(query, conn)
+
+# Rows kept from a single interactive query; anything beyond is dropped and reported
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "10000"))
+FETCH_BATCH_ROWS = 2000
+
+# A LIMIT that ends the statement: LIMIT n, LIMIT n OFFSET m or MySQL's LIMIT m, n
+_TRAILING_LIMIT = re.compile(
+    r"\blimit\s+(?:(?P<skip>\d+)\s*,\s*)?(?P<count>\d+)(?P<offset>\s+offset\s+\d+)?\s*$", re.IGNORECASE)
+# Row-limiting clauses the trailing-LIMIT rewrite cannot account for (LIMIT ALL, OFFSET alone,
+# FETCH FIRST, a LIMIT inside a subquery or before a UNION, ...)
+_OTHER_ROW_CLAUSE = re.compile(r"\b(?:limit|offset|fetch)\b", re.IGNORECASE)
+
+
+def apply_row_limit(query: str, max_rows: int, dialect: str = None):
+    """
+    Bound a SELECT to max_rows + 1 rows (the extra row detects truncation).
+    Comments are removed first, read with `dialect`'s rules, so nothing appended ends up
+    inside one. A trailing LIMIT in any form is capped; a query whose row clauses cannot
+    be rewritten in place is wrapped in an outer SELECT with the LIMIT.
+    Returns (bounded_query, limit_injected).
+    """
+    cap = max_rows + 1
+    sql = strip_comments(query, dialect).strip().rstrip(";").strip()
+    match = _TRAILING_LIMIT.search(sql)
+    if match is not None:
+        if int(match.group("count")) <= cap:
+            return sql, False
+        head = sql[:match.start()]
+        if match.group("skip") is not None:
+            return f"{head}LIMIT {match.group('skip')}, {cap}", True
+        return f"{head}LIMIT {cap}{match.group('offset') or ''}", True
+    if _OTHER_ROW_CLAUSE.search(sql):
+        return f"SELECT * FROM ({sql}) AS _bounded LIMIT {cap}", True
+    return f"{sql} LIMIT {cap}", True
+
+
+def run_query_bounded(query: str, max_rows: int = QUERY_MAX_ROWS):
+    """
+    Run a query without ever holding more than max_rows rows: a LIMIT is injected when
+    missing and rows are streamed from a server-side cursor in batches. The query runs
+    under the SQL_GUARD_TIMEOUT_SECONDS statement timeout.
+    Returns (DataFrame, truncated).
+    """
+    engine = get_engine()
+    bounded_sql, _ = apply_row_limit(query, max_rows, engine.dialect.name)
+    rows = []
+    with engine.connect().execution_options(stream_results=True) as conn, statement_timeout(conn):
+        # exec_driver_sql: LLM-written SQL may contain ':' or '%' that must not be read as bind params
+        result = conn.exec_driver_sql(bounded_sql)
+        columns = list(result.keys())
+        while len(rows) <= max_rows:
+            batch = result.fetchmany(FETCH_BATCH_ROWS)
+            if not batch:
+                break
+            rows.extend(batch)
+        result.close()
+
+    truncated = len(rows) > max_rows
+    df = pd.DataFrame.from_records([tuple(r) for r in rows[:max_rows]], columns=columns, coerce_float=True)
+    return df, truncated
+
+
+def run_aggregate(query: str, group_col: str, value_col: str, top_n: int):
+    """Server-side SUM(value_col) GROUP BY group_col over a query's full result, top_n groups."""
+    engine = get_engine()
+    quote = engine.dialect.identifier_preparer.quote
+    sql = query.strip().rstrip(";")
+    agg_sql = (
+        f"SELECT {quote(group_col)} AS {quote(group_col)}, SUM({quote(value_col)}) AS {quote(value_col)} "
+        f"FROM ({sql}) AS agg_source GROUP BY {quote(group_col)} "
+        f"ORDER BY SUM({quote(value_col)}) DESC LIMIT {int(top_n)}"
+    )
+    with engine.connect() as conn, statement_timeout(conn):
+        result = conn.exec_driver_sql(agg_sql)
+        return pd.DataFrame.from_records([tuple(r) for r in result], columns=list(result.keys()), coerce_float=True)
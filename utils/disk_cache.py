@@ -0,0 +1,55 @@
+"""
+Size-bounded LRU bookkeeping shared by the on-disk caches.
+
+An entry is every file in the cache directory named "<key>.<suffix>". Reads bump
+the files' mtimes, and eviction removes whole entries, oldest mtime first.
+"""
+import glob
+import os
+import tempfile
+import time
+
+
+def touch(*paths):
+    now = time.time()
+    for path in paths:
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            pass
+
+
+def atomic_write(directory: str, path: str, data, mode: str = "w"):
+    """Write through a temp file in `directory` and rename, so readers never see partial files."""
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    encoding = "utf-8" if "b" not in mode else None
+    with os.fdopen(fd, mode, encoding=encoding) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def evict(directory: str, max_bytes: int):
+    """Delete least recently used entries until the directory fits in `max_bytes`."""
+    entries = {}
+    for path in glob.glob(os.path.join(directory, "*")):
+        name = os.path.basename(path)
+        if name.endswith(".tmp"):
+            continue
+        key = name.split(".", 1)[0]
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        size, last_used, paths = entries.get(key, (0, 0, []))
+        entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime), paths + [path])
+
+    total = sum(size for size, _, _ in entries.values())
+    for key, (size, _, paths) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_bytes:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
@@ -0,0 +1,179 @@
+"""
+Process-wide registry of pooled SQLAlchemy engines.
+
+Engines are created once per connection URI and reused by every caller, so
+Streamlit reruns and repeated analytics questions check out warm pooled
+connections instead of paying the full connection setup each time.
+Callers may look engines up by URI or by a registered source name.
+"""
+import atexit
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from utils import tracing
+
+# Pool settings, overridable through the environment
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_sources = {}  # source name -> URI
+_engines = {}  # URI -> Engine
+_stats = {}    # URI -> PoolStats
+
+
+class PoolStats:
+    """Counters for one engine's pool; updated from pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.waits = 0  # checkouts that found no idle pooled connection
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 4),
+                "max_wait_seconds": round(self.max_wait_seconds, 4),
+            }
+
+
+class _TimedQueuePool(QueuePool):
+    """QueuePool that times checkouts which have to open or wait for a connection."""
+
+    stats = None
+
+    def _do_get(self):
+        if self.checkedin() > 0 or self.stats is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a recreated pool; keep counting into the same stats
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+
+def register_source(name: str, uri: str):
+    """Make a connection URI addressable by a source name (e.g. 'mysql_source')."""
+    with _lock:
+        _sources[name] = uri
+
+
+def _resolve(key: str) -> str:
+    if key in _sources:
+        return _sources[key]
+    if "://" in key:
+        return key
+    raise KeyError(f"Unknown source or connection URI: {key}")
+
+
+def _build_engine(uri: str, stats: PoolStats):
+    url = make_url(uri)
+    kwargs = {"pool_pre_ping": POOL_PRE_PING}
+    if url.get_backend_name() != "sqlite":
+        # SQLite picks its own pool class; sizing only applies to server databases
+        kwargs.update(
+            poolclass=_TimedQueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+        )
+    engine = create_engine(uri, **kwargs)
+    if isinstance(engine.pool, _TimedQueuePool):
+        engine.pool.stats = stats
+
+    event.listen(engine, "connect", lambda *args: stats.incr("connects"))
+    event.listen(engine, "checkout", lambda *args: stats.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats.incr("checkins"))
+    event.listen(engine, "invalidate", lambda *args: stats.incr("invalidations"))
+    tracing.instrument_engine(engine)
+    return engine
+
+
+def get_engine(key: str):
+    """Return the shared engine for a source name or URI, creating it on first use."""
+    uri = _resolve(key)
+    engine = _engines.get(uri)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _engines.get(uri)
+        if engine is None:
+            stats = PoolStats()
+            engine = _build_engine(uri, stats)
+            _engines[uri] = engine
+            _stats[uri] = stats
+        return engine
+
+
+def pool_stats() -> dict:
+    """Pool counters and current pool status per engine, keyed by password-masked URL."""
+    with _lock:
+        engines = list(_engines.items())
+    result = {}
+    for uri, engine in engines:
+        label = engine.url.render_as_string(hide_password=True)
+        result[label] = dict(_stats[uri].as_dict(), pool=engine.pool.status())
+    return result
+
+
+def dispose_engine(key: str):
+    """Close all pooled connections of one engine and drop it from the registry."""
+    uri = _resolve(key)
+    with _lock:
+        engine = _engines.pop(uri, None)
+        _stats.pop(uri, None)
+    if engine is not None:
+        engine.dispose()
+
+
+def dispose_all():
+    """Close every pooled connection; registered to run at interpreter shutdown."""
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+        _stats.clear()
+    for engine in engines:
+        try:
+            engine.dispose()
+        except Exception as e:
+            print(f"Error disposing engine {engine.url.render_as_string(hide_password=True)}: {e}")
+
+
+atexit.register(dispose_all)
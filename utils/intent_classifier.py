@@ -0,0 +1,172 @@
+"""
+Local fast path for intent classification (schema_lookup / analytics_query / unknown).
+
+Two tiers answer in microseconds, before any LLM call:
+1. Keyword rules for phrasings that are unambiguous ("list all tables", "total ... by").
+2. A multinomial logistic regression over word unigrams and bigrams, trained at first
+   use from intent_data/intent_examples.jsonl plus reviewed low-confidence cases.
+
+classify() reports the tier and confidence; llm_agent.classify_intent only calls the
+LLM when neither tier is confident, and such questions are appended to
+INTENT_REVIEW_LOG. Adding a "label" to a logged line (or moving it into the examples
+file) feeds it into the next training run.
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+LABELS = ("schema_lookup", "analytics_query", "unknown")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_data")
+INTENT_EXAMPLES_PATH = os.getenv("INTENT_EXAMPLES_PATH", os.path.join(DATA_DIR, "intent_examples.jsonl"))
+INTENT_EVAL_PATH = os.path.join(DATA_DIR, "intent_eval.jsonl")
+INTENT_REVIEW_LOG = os.getenv("INTENT_REVIEW_LOG", os.path.join(DATA_DIR, "intent_review.jsonl"))
+# Model probability needed to answer locally; below it the LLM decides
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.7"))
+RULE_CONFIDENCE = 0.95
+
+_RULES = {
+    "schema_lookup": re.compile(
+        r"\b(?:what|which|list|show)(?: all| me)?(?: the)? (?:tables?|columns?|fields?|schemas?)\b"
+        r"|\b(?:describe|ddl|data type|column names?|table (?:structure|definition)|schema (?:of|for))\b"
+        r"|\bcolumns? (?:of|in|for)\b"
+    ),
+    "analytics_query": re.compile(
+        r"\b(?:total|sum|average|avg|mean|median|count|how many|how much|top \d+|max(?:imum)?|min(?:imum)?"
+        r"|trend|growth|breakdown|distribution|percent(?:age)?|ratio|year over year|month over month)\b"
+    ),
+    "unknown": re.compile(
+        r"^(?:hi|hello|hey|thanks?(?: you)?(?: so much| a lot)?|bye|goodbye|ok|okay|cool|lol|yes|no"
+        r"|good (?:morning|afternoon|evening|night))[!. ]*$"
+    ),
+}
+
+_lock = threading.Lock()
+_model = None
+
+
+def _normalize(question: str) -> str:
+    return " ".join(re.sub(r"[^\w%<>=.' ]+", " ", question.lower()).split())
+
+
+def features(question: str) -> list:
+    """Word unigrams and bigrams; numbers collapse to one token."""
+    words = ["<num>" if w.isdigit() else w for w in re.findall(r"[a-z0-9_]+", question.lower())]
+    feats = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return feats or ["<empty>"]
+
+
+def rule_label(question: str):
+    """The label whose rules match, or None when no rule (or more than one label) matches."""
+    text = _normalize(question)
+    matched = [label for label, pattern in _RULES.items() if pattern.search(text)]
+    return matched[0] if len(matched) == 1 else None
+
+
+class IntentModel:
+    """Multinomial logistic regression trained with plain SGD; small enough to train on startup."""
+
+    def __init__(self, labels=LABELS):
+        self.labels = list(labels)
+        self.weights = defaultdict(lambda: [0.0] * len(self.labels))
+        self.bias = [0.0] * len(self.labels)
+
+    def _scores(self, feats):
+        scores = list(self.bias)
+        for f in feats:
+            w = self.weights.get(f)
+            if w is not None:
+                for i, v in enumerate(w):
+                    scores[i] += v
+        return scores
+
+    def predict_proba(self, question: str) -> dict:
+        scores = self._scores(features(question))
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return {label: e / total for label, e in zip(self.labels, exps)}
+
+    def fit(self, examples, epochs: int = 40, lr: float = 0.5, l2: float = 1e-4, seed: int = 0):
+        """examples: [(question, label)]."""
+        data = [(features(q), self.labels.index(label)) for q, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1.0 + epoch * 0.1)
+            for feats, y in data:
+                scores = self._scores(feats)
+                top = max(scores)
+                exps = [math.exp(s - top) for s in scores]
+                total = sum(exps)
+                for i, e in enumerate(exps):
+                    grad = e / total - (1.0 if i == y else 0.0)
+                    self.bias[i] -= step * grad
+                    for f in feats:
+                        w = self.weights[f]
+                        w[i] -= step * (grad + l2 * w[i])
+        self.weights = dict(self.weights)
+        return self
+
+
+def load_examples(path: str) -> list:
+    """[(question, label)] from a JSONL file; lines without a known label are skipped."""
+    examples = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("label") in LABELS:
+                    examples.append((record["question"], record["label"]))
+    except FileNotFoundError:
+        pass
+    return examples
+
+
+def train(paths=None) -> IntentModel:
+    """Train on the examples file plus any low-confidence cases that were given a label."""
+    paths = paths or [INTENT_EXAMPLES_PATH, INTENT_REVIEW_LOG]
+    examples = [example for path in paths for example in load_examples(path)]
+    return IntentModel().fit(examples)
+
+
+def get_model() -> IntentModel:
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                _model = train()
+    return _model
+
+
+def classify(question: str, min_confidence: float = INTENT_MIN_CONFIDENCE) -> dict:
+    """
+    {"label", "confidence", "tier", "guess"} where tier is "rules" or "model"; label is
+    None when the local tiers are not confident enough and the LLM should decide, and
+    guess is the best local label either way.
+    """
+    label = rule_label(question)
+    if label is not None:
+        return {"label": label, "confidence": RULE_CONFIDENCE, "tier": "rules", "guess": label}
+    proba = get_model().predict_proba(question)
+    best = max(proba, key=proba.get)
+    confidence = round(proba[best], 4)
+    return {"label": best if confidence >= min_confidence else None, "confidence": confidence, "tier": "model",
+            "guess": best}
+
+
+def record_low_confidence(question: str, local: dict, llm_label: str = None):
+    """Append a case the local tiers could not settle to the review log (unlabeled until reviewed)."""
+    record = {"ts": time.time(), "question": question, "guess": local.get("guess"),
+              "confidence": local.get("confidence"), "llm_label": llm_label}
+    try:
+        with _lock, open(INTENT_REVIEW_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not record low-confidence intent: {e}")
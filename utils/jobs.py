@@ -0,0 +1,263 @@
+"""
+Background jobs for long-running UI actions (profiling, discovery, PR creation).
+
+One process-wide JobManager runs jobs on a bounded set of worker threads that is
+shared by every Streamlit session. The script submits work, keeps the job id in
+session state and polls for the result on later reruns, so a slow source no longer
+blocks the page and a rerun does not restart the work.
+
+- Identical in-flight jobs (same action and arguments) are de-duplicated: a second
+  submit attaches to the running job instead of starting another.
+- Workers take queued jobs round-robin across owners (sessions), and an owner runs
+  at most JOB_MAX_PER_OWNER jobs at once, so one user cannot occupy the whole pool.
+- Progress and cancellation are cooperative: job code calls report_progress(),
+  which also raises JobCancelled once the job has been cancelled.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "4"))
+JOB_MAX_PER_OWNER = int(os.getenv("JOB_MAX_PER_OWNER", "2"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "1800"))  # seconds finished jobs stay pollable
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key: str, owner: str, label: str, func, args, kwargs):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.owner = owner
+        self.label = label
+        self.owners = {owner}  # sessions waiting on this job (de-duplicated submits)
+        self.func, self.args, self.kwargs = func, args, kwargs
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.exc = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "error": self.error,
+            "queued_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "run_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+def job_key(label: str, args=(), kwargs=None) -> str:
+    """
+    Identity of a job for de-duplication. Arguments must be JSON-serializable: anything
+    else (a lambda, an open connection) has no stable identity to compare, and guessing
+    one would let different requests share a job, so it raises TypeError instead.
+    """
+    try:
+        return json.dumps([label, args, kwargs], sort_keys=True)
+    except TypeError as e:
+        raise TypeError(f"Job {label!r} needs JSON-serializable arguments to be de-duplicated: {e}") from None
+
+
+def report_progress(fraction: float = None, message: str = None):
+    """
+    Update the progress of the job running on this thread; a no-op outside jobs.
+    Raises JobCancelled if the job was cancelled, so call it between steps.
+    """
+    job = getattr(_local, "job", None)
+    if job is None:
+        return
+    if job.cancel_event.is_set():
+        raise JobCancelled(job.id)
+    if fraction is not None:
+        job.progress = min(max(float(fraction), 0.0), 1.0)
+    if message is not None:
+        job.message = message
+
+
+class JobManager:
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, max_per_owner: int = JOB_MAX_PER_OWNER,
+                 result_ttl: float = JOB_RESULT_TTL):
+        self.max_per_owner = max(1, max_per_owner)
+        self.result_ttl = result_ttl
+        self._cond = threading.Condition()
+        self._jobs = {}              # id -> Job
+        self._in_flight = {}         # dedupe key -> Job (queued or running)
+        self._queues = OrderedDict() # owner -> deque of queued jobs, in round-robin order
+        self._running = {}           # owner -> running job count
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            for i in range(max(1, max_workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, *args, owner: str = "default", label: str = None, **kwargs) -> str:
+        """Queue func(*args, **kwargs); returns a job id, or the id of an identical job in flight."""
+        label = label or getattr(func, "__qualname__", repr(func))
+        key = job_key(label, args, kwargs)
+        with self._cond:
+            self._prune()
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.owners.add(owner)
+                return job.id
+            job = Job(key, owner, label, func, args, kwargs)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._cond.notify()
+        return job.id
+
+    def status(self, job_id: str):
+        job = self._jobs.get(job_id)
+        return job.as_dict() if job else None
+
+    def result(self, job_id: str):
+        """The job's return value; re-raises the job's exception if it failed."""
+        job = self._jobs[job_id]
+        if job.status == FAILED:
+            raise job.exc
+        if job.status == CANCELLED:
+            raise JobCancelled(job_id)
+        if job.status != DONE:
+            raise RuntimeError(f"Job {job_id} is still {job.status}")
+        return job.result
+
+    def wait(self, job_id: str, timeout: float = None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._jobs[job_id].status not in FINISHED:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.status(job_id)
+
+    def cancel(self, job_id: str, owner: str = None) -> bool:
+        """
+        Stop waiting on a job; True when `owner` (or, without one, everyone) is detached
+        from it. A de-duplicated job keeps running for the other owners still waiting on
+        it; once none are left a queued job is dropped and a running one is asked to stop
+        at its next report_progress().
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            if owner is not None:
+                if owner not in job.owners:
+                    return False
+                job.owners.discard(owner)
+                if job.owners:
+                    return True
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._queues[job.owner].remove(job)
+                self._finish(job, CANCELLED)
+            return True
+
+    def jobs(self, owner: str = None) -> list:
+        with self._cond:
+            return [j.as_dict() for j in self._jobs.values() if owner is None or owner in j.owners]
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            for job in self._jobs.values():
+                job.cancel_event.set()
+            self._cond.notify_all()
+
+    def _next_job(self):
+        # Round-robin over owners that have queued work and are below their running limit
+        for owner in list(self._queues):
+            queued = self._queues[owner]
+            if not queued:
+                del self._queues[owner]
+                continue
+            if self._running.get(owner, 0) >= self.max_per_owner:
+                continue
+            job = queued.popleft()
+            self._queues.move_to_end(owner)
+            return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._closed and (job := self._next_job()) is None:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job.status = RUNNING
+                job.started_at = time.time()
+                self._running[job.owner] = self._running.get(job.owner, 0) + 1
+
+            _local.job = job
+            status = DONE
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+            except JobCancelled:
+                status = CANCELLED
+            except BaseException as e:
+                logging.exception("Job %s (%s) failed", job.id, job.label)
+                job.exc, job.error, status = e, f"{type(e).__name__}: {e}", FAILED
+            finally:
+                _local.job = None
+
+            with self._cond:
+                self._running[job.owner] -= 1
+                if job.cancel_event.is_set() and status == DONE:
+                    status = CANCELLED
+                self._finish(job, status)
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        if status == DONE:
+            job.progress = 1.0
+        self._in_flight.pop(job.key, None)
+        job.func = job.args = job.kwargs = None
+        self._cond.notify_all()
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [i for i, j in self._jobs.items() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+_manager_lock = threading.Lock()
+_manager = None
+
+
+def get_job_manager() -> JobManager:
+    """One manager per process, so every session shares the same workers."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+            atexit.register(_manager.shutdown)
+        return _manager
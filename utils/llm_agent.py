@@ -1,20 +1,105 @@
-from sqlalchemy import create_engine
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain_community.agent_toolkits.sql.base import SQLDatabaseToolkit
 from langchain_community.utilities import SQLDatabase
 from langchain_community.llms import Ollama
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
+from context_window import count_tokens
 from utils.db import get_engine
+from utils import intent_classifier, schema_index, tracing
+from utils.streaming import measure_stream
+
+OLLAMA_MODEL = "llama3:8b"
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# How often the schema fingerprint is re-read from the metadata catalog
+SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "60"))
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "256"))
+# Optional JSONL file receiving the tables picked for each question, for tuning retrieval
+SCHEMA_RETRIEVAL_LOG = os.getenv("SCHEMA_RETRIEVAL_LOG", "")
+
+_lock = threading.RLock()  # reentrant: chain builders also fetch the shared LLM
+_llm = None
+_intent_chain = None
+_schema_state = {"fingerprint": None, "checked_at": 0.0}
+_sql_chains = {}  # schema fingerprint -> LLMChain
+
+
+class _LRUCache:
+    """Small thread-safe LRU map with hit/miss counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+_sql_memo = _LRUCache(SQL_CACHE_SIZE)
+
+
+def _get_llm():
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                _llm = Ollama(model=OLLAMA_MODEL, base_url=OLLAMA_BASE_URL)  # Make sure Ollama is running
+    return _llm
+
+
+def normalize_question(question: str) -> str:
+    """Case, punctuation and whitespace-insensitive form used as the memo key."""
+    return " ".join(re.sub(r"[^\w%<>=.]+", " ", question.lower()).strip(" .").split())
+
+
+def schema_fingerprint(force: bool = False) -> str:
+    """
+    Version of the catalog tables the SQL chain can draw on. Re-checked against the
+    catalog at most every SCHEMA_CHECK_INTERVAL seconds.
+    """
+    now = time.time()
+    if not force and _schema_state["fingerprint"] and now - _schema_state["checked_at"] < SCHEMA_CHECK_INTERVAL:
+        return _schema_state["fingerprint"]
+
+    fingerprint = schema_index.get_index().version
+    _schema_state.update(fingerprint=fingerprint, checked_at=now)
+    return fingerprint
 
 
 def get_llm_agent():
     engine = get_engine()
     db = SQLDatabase(engine)
 
-    llm = Ollama(model="llama3:8b")  # Make sure Ollama is running
+    llm = _get_llm()
     toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-    
+
     agent_executor = create_sql_agent(
         llm=llm,
         toolkit=toolkit,
@@ -22,21 +107,27 @@ def get_llm_agent():
     )
     return agent_executor
 
-from sqlalchemy import create_engine
-from langchain_community.llms import Ollama
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain_community.utilities import SQLDatabase
-from utils.db import get_engine
 
 def get_sql_chain():
-    engine = get_engine()
-    db = SQLDatabase(engine, include_tables=["daily_transactions"])
-    table_info = db.get_table_info()
+    """Chain for the current schema version; the prompt's schema section is filled in per question."""
+    fingerprint = schema_fingerprint()
+    chain = _sql_chains.get(fingerprint)
+    if chain is not None:
+        return chain
 
+    with _lock:
+        chain = _sql_chains.get(fingerprint)
+        if chain is None:
+            chain = _build_sql_chain()
+            _sql_chains.clear()  # chains for older schema versions are never used again
+            _sql_chains[fingerprint] = chain
+    return chain
+
+
+def _build_sql_chain():
     # Enhanced LLM prompt with more guidance
     prompt = PromptTemplate(
-        input_variables=["question"],
+        input_variables=["question", "table_info"],
         template="""
                     You are a senior data analyst with read-only access to a SQL database.
                     Use the schema and metadata below to answer the user's data question accurately.
@@ -62,23 +153,47 @@ def get_sql_chain():
                 """,
             )
 
-    llm = Ollama(model="llama3:8b")
     chain = LLMChain(
-        llm=llm,
-        prompt=prompt.partial(table_info=table_info),
+        llm=_get_llm(),
+        prompt=prompt,
         verbose=True
     )
 
     return chain
 
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_community.llms import Ollama
 
-def classify_intent(question: str) -> str:
-    """Classify the user's intent using the LLM: schema_lookup vs analytics_query."""
-    llm = Ollama(model="llama3:8b")
-    
+def build_sql_prompt(chain, question: str, retrieval: dict = None) -> str:
+    """
+    Prompt for one question with the compact DDL of the top-k matching tables only,
+    so its size does not grow with the catalog. The selection (tables, schema_tokens,
+    prompt_tokens) is logged for tuning and left in `retrieval` when given.
+    """
+    with tracing.span("schema.retrieval") as span:
+        table_info, tables = schema_index.schema_context(question)
+        if span is not None:
+            span.set(tables=",".join(t["table"] for t in tables))
+    prompt = chain.prompt.format(question=question, table_info=table_info)
+    selection = {
+        "tables": tables,
+        "schema_tokens": sum(t["tokens"] for t in tables),
+        "prompt_tokens": count_tokens(prompt),
+    }
+    if retrieval is not None:
+        retrieval.clear()
+        retrieval.update(selection)
+    logging.info("NL->SQL prompt: %d tokens, tables %s", selection["prompt_tokens"],
+                 ", ".join(f"{t['table']} ({t['score']})" for t in tables))
+    if SCHEMA_RETRIEVAL_LOG:
+        with open(SCHEMA_RETRIEVAL_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"ts": time.time(), "question": question, **selection}) + "\n")
+    return prompt
+
+
+def _get_intent_chain():
+    global _intent_chain
+    if _intent_chain is not None:
+        return _intent_chain
+
     prompt = PromptTemplate(
         input_variables=["question"],
         template="""
@@ -95,14 +210,84 @@ def classify_intent(question: str) -> str:
                 """
     )
 
-    chain = LLMChain(llm=llm, prompt=prompt)
-    result = chain.run(question).strip().lower()
-    return result
+    with _lock:
+        if _intent_chain is None:
+            _intent_chain = LLMChain(llm=_get_llm(), prompt=prompt)
+    return _intent_chain
 
 
+def classify_intent(question: str) -> str:
+    """
+    Classify the user's intent: schema_lookup, analytics_query or unknown. The local
+    rules/model tier answers when it is confident; otherwise the LLM decides and the
+    question is recorded for retraining the local model.
+    """
+    with tracing.span("intent.local") as span:
+        local = intent_classifier.classify(question)
+        if span is not None:
+            span.set(tier=local["tier"], confidence=local["confidence"], label=local["label"] or "")
+    if local["label"] is not None:
+        return local["label"]
+
+    chain = _get_intent_chain()
+    with tracing.span("llm.intent_chain", tracing.SPAN_KIND_CLIENT, **{"llm.model": OLLAMA_MODEL}):
+        result = chain.run(question).strip().lower()
+    label = next((l for l in intent_classifier.LABELS if l in result), "unknown")
+    intent_classifier.record_low_confidence(question, local, llm_label=label)
+    return label
+
+
+@tracing.traced("nl_to_sql")
 def query_llm(question: str):
-    agent = get_sql_chain()
-    return agent.run(question).strip()
+    """
+    Generate SQL for a question. Results are memoized per normalized question and
+    schema fingerprint, so repeated questions skip reflection and the LLM round-trip.
+    """
+    key = (normalize_question(question), schema_fingerprint())
+    cached = _sql_memo.get(key)
+    if cached is not None:
+        return cached
+
+    chain = get_sql_chain()
+    retrieval = {}
+    prompt = build_sql_prompt(chain, question, retrieval)
+    with tracing.span("llm.sql_chain", tracing.SPAN_KIND_CLIENT,
+                      **{"llm.model": OLLAMA_MODEL, "llm.prompt_tokens": retrieval["prompt_tokens"]}):
+        result = chain.llm.invoke(prompt).strip()
+    _sql_memo.put(key, result)
+    return result
+
+
+def stream_query_llm(question: str, metrics: dict = None, retrieval: dict = None):
+    """
+    Streaming variant of query_llm: yields SQL text deltas as Ollama generates them.
+    A memoized answer is yielded in one piece. Stream timing is left in `metrics` and
+    the prompt's table selection in `retrieval` (left empty for a memoized answer);
+    both belong to the caller, so concurrent sessions do not see each other's numbers.
+    """
+    metrics = {} if metrics is None else metrics
+    key = (normalize_question(question), schema_fingerprint())
+    cached = _sql_memo.get(key)
+    if cached is not None:
+        if retrieval is not None:
+            retrieval.clear()
+        return measure_stream(iter([cached]), metrics)
+
+    def deltas():
+        chain = get_sql_chain()
+        parts = []
+        for delta in chain.llm.stream(build_sql_prompt(chain, question, retrieval)):
+            parts.append(delta)
+            yield delta
+        _sql_memo.put(key, "".join(parts).strip())
+
+    # The span covers schema retrieval and prompt building as well as generation
+    return measure_stream(deltas(), metrics, "llm.sql_chain_stream", **{"llm.model": OLLAMA_MODEL})
+
+
+def sql_cache_stats() -> dict:
+    """Hit/miss counters of the NL→SQL memo."""
+    return _sql_memo.stats()
 
 
 # For testing
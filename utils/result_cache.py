@@ -0,0 +1,145 @@
+"""
+On-disk cache of analytics query results.
+
+Results are stored as Parquet, keyed by the normalized SQL text plus a
+data-version token for the tables it reads (the catalog's data version, i.e.
+information_schema update_time, and the last successful ingestion from the
+audit log). A repeated question is served from local disk until one of those
+tables changes or the entry outlives RESULT_CACHE_TTL. Size is bounded by LRU.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import pandas as pd
+from log_to_audit import last_successful_ingestion
+from utils import disk_cache
+from utils.db import QUERY_MAX_ROWS, get_engine, run_query_bounded
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "query_result_cache"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "900"))
+
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`)")
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+([`\"]?[\w$]+[`\"]?(?:\.[`\"]?[\w$]+[`\"]?)?)", re.IGNORECASE)
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine for pandas)
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+
+def normalize_sql(query: str) -> str:
+    """Lowercase and collapse whitespace outside quoted literals and identifiers."""
+    parts = _QUOTED.split(query.strip().rstrip(";"))
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part.lower()) for i, part in enumerate(parts)
+    ).strip()
+
+
+def referenced_tables(query: str) -> list:
+    """Table names after FROM / JOIN, without schema or quoting."""
+    unquoted = _QUOTED.sub(lambda m: m.group(0) if m.group(0)[0] in "`\"" else "''", query)
+    names = {ref.split(".")[-1].strip("`\"") for ref in _TABLE_REF.findall(unquoted)}
+    return sorted(names)
+
+
+def data_version_token(query: str) -> str:
+    """Changes whenever one of the query's tables is written or re-ingested."""
+    from data_ops import catalog
+
+    catalog.ensure_fresh()
+    database = get_engine().url.database
+    versions = []
+    for table in referenced_tables(query):
+        entries = [e for e in catalog.find_table(table) if e["schema"] == database] or catalog.find_table(table)
+        data_version = entries[0]["data_version"] if entries else None
+        versions.append([table, data_version, last_successful_ingestion(table)])
+    return json.dumps(versions)
+
+
+def _cache_key(query: str, max_rows: int) -> str:
+    raw = json.dumps([normalize_sql(query), data_version_token(query), max_rows])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _paths(key: str):
+    return os.path.join(RESULT_CACHE_DIR, f"{key}.parquet"), os.path.join(RESULT_CACHE_DIR, f"{key}.json")
+
+
+def _discard(key: str):
+    for path in _paths(key):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _get(key: str):
+    data_path, meta_path = _paths(key)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if time.time() - meta["created_at"] > RESULT_CACHE_TTL:
+            return None
+        truncated = meta["truncated"]
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, KeyError):
+        _discard(key)
+        return None
+    try:
+        df = pd.read_parquet(data_path)
+    except (OSError, ValueError) as e:
+        # Missing, truncated or corrupt Parquet (pyarrow raises OSError or ArrowInvalid, a
+        # ValueError) is a miss; the entry is dropped so the next run re-caches it
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error reading cached query result {key}: {e}")
+        _discard(key)
+        return None
+    disk_cache.touch(data_path, meta_path)
+    return df, truncated
+
+
+def _put(key: str, query: str, df, truncated: bool):
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    data_path, meta_path = _paths(key)
+    fd, tmp = tempfile.mkstemp(dir=RESULT_CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, data_path)
+    except Exception as e:
+        # Columns Arrow cannot encode (e.g. mixed object types) just skip the cache
+        print(f"Error caching query result: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    meta = {"sql": query, "truncated": truncated, "rows": len(df), "created_at": time.time()}
+    disk_cache.atomic_write(RESULT_CACHE_DIR, meta_path, json.dumps(meta))
+    disk_cache.evict(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+
+
+def run_query_cached(query: str, max_rows: int = QUERY_MAX_ROWS, bypass_cache: bool = False, preflight=None):
+    """
+    run_query_bounded with a local result cache. Returns (DataFrame, truncated, from_cache).
+    bypass_cache=True always queries the source and refreshes the cached copy.
+    preflight(query) -> SQL to run is called only when the source is queried, so checks
+    that hit the database (e.g. EXPLAIN) are skipped for cached results; it may raise.
+    """
+    if not _PARQUET_AVAILABLE:
+        df, truncated = run_query_bounded(preflight(query) if preflight else query, max_rows)
+        return df, truncated, False
+
+    key = _cache_key(query, max_rows)
+    if not bypass_cache:
+        cached = _get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+    df, truncated = run_query_bounded(preflight(query) if preflight else query, max_rows)
+    _put(key, query, df, truncated)
+    return df, truncated, False
@@ -0,0 +1,259 @@
+"""
+Lexical retrieval over the metadata catalog for NL→SQL prompts.
+
+Each table of the analytics source becomes a small document: its name, column
+names, table and column comments, and the top values seen when it was profiled.
+A TF-IDF index over those documents picks the tables most relevant to a question,
+and only their compact DDL goes into the prompt, so prompt size is bounded by
+SCHEMA_TOP_K and SCHEMA_PROMPT_MAX_TOKENS rather than by the catalog size.
+
+Everything is offline: the index is built from the SQLite catalog and the profile
+cache. Its version (the NL→SQL schema fingerprint) changes only when tables, columns
+or comments change; when only rows change, the profiled values of those tables are
+re-read without changing the version.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from context_window import count_tokens
+
+# Catalog source whose tables the analytics chain queries (the utils.db database)
+SCHEMA_INDEX_SOURCE = os.getenv("SCHEMA_INDEX_SOURCE", "mysql_source")
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "5"))
+SCHEMA_PROMPT_MAX_TOKENS = int(os.getenv("SCHEMA_PROMPT_MAX_TOKENS", "1500"))
+# Used when nothing in the question matches the catalog
+SCHEMA_FALLBACK_TABLES = [t for t in os.getenv("SCHEMA_FALLBACK_TABLES", "daily_transactions").split(",") if t]
+# Tables scoring below this fraction of the best match are left out of the prompt
+SCHEMA_MIN_RELATIVE_SCORE = float(os.getenv("SCHEMA_MIN_RELATIVE_SCORE", "0.25"))
+SCHEMA_SAMPLE_VALUES = 3  # profiled values shown per low-cardinality text column
+
+# Relative weight of a term by where it occurs in the table's document
+FIELD_WEIGHTS = {"table": 3.0, "column": 1.5, "comment": 1.0, "value": 0.5}
+
+_STOPWORDS = frozenset("""
+a an and are as at be by for from give have how i in is it list me my of on or per please
+show tell that the their there these this to us was we what when where which who with would
+""".split())
+
+_lock = threading.Lock()
+_index = None
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word stems; identifiers are split on underscores and camelCase."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _tf(weight: float) -> float:
+    # Sublinear: a term repeated across many columns should not drown out the table name
+    return 1.0 + math.log(weight) if weight >= 1.0 else weight
+
+
+class SchemaIndex:
+    """TF-IDF vectors of table documents with an inverted index for scoring."""
+
+    def __init__(self, tables: list, version: str):
+        """tables: [{"schema", "table", "comment", "row_estimate", "data_version", "columns": [...], "values": {col: [...]}}]"""
+        self.tables = tables
+        self.version = version
+        self.data_versions = None  # (schema, table, data_version) the profiled values were read at
+        self._postings = defaultdict(list)  # term -> [(table position, weight)]
+        self._idf = {}
+
+        term_weights = []
+        for t in tables:
+            weights = Counter()
+            for token in tokenize(t["table"]):
+                weights[token] += FIELD_WEIGHTS["table"]
+            for token in tokenize(t.get("comment") or ""):
+                weights[token] += FIELD_WEIGHTS["comment"]
+            for col in t["columns"]:
+                for token in tokenize(col["name"]):
+                    weights[token] += FIELD_WEIGHTS["column"]
+                for token in tokenize(col.get("comment") or ""):
+                    weights[token] += FIELD_WEIGHTS["comment"]
+            for values in (t.get("values") or {}).values():
+                for token in tokenize(" ".join(str(v) for v in values)):
+                    weights[token] += FIELD_WEIGHTS["value"]
+            term_weights.append(weights)
+
+        n_docs = len(tables)
+        doc_freq = Counter(term for weights in term_weights for term in weights)
+        self._idf = {term: math.log((n_docs + 1) / (df + 1)) + 1.0 for term, df in doc_freq.items()}
+        for pos, weights in enumerate(term_weights):
+            vector = {term: _tf(w) * self._idf[term] for term, w in weights.items()}
+            norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+            for term, value in vector.items():
+                self._postings[term].append((pos, value / norm))
+
+    def search(self, question: str, k: int = SCHEMA_TOP_K) -> list:
+        """[(table dict, score)] of the k best matching tables, best first; zero scores are dropped."""
+        query = Counter(tokenize(question))
+        scores = defaultdict(float)
+        norm = math.sqrt(sum((_tf(n) * self._idf.get(term, 0.0)) ** 2 for term, n in query.items())) or 1.0
+        for term, n in query.items():
+            q_weight = _tf(n) * self._idf.get(term, 0.0) / norm
+            for pos, d_weight in self._postings.get(term, ()):
+                scores[pos] += q_weight * d_weight
+
+        # A table named verbatim in the question is almost certainly wanted
+        lowered = question.lower()
+        for pos, t in enumerate(self.tables):
+            if t["table"].lower() in lowered:
+                scores[pos] += 1.0
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.tables[item[0]]["table"]))
+        return [(self.tables[pos], round(score, 4)) for pos, score in ranked[:k] if score > 0]
+
+    def get(self, table: str):
+        return next((t for t in self.tables if t["table"] == table), None)
+
+
+def compact_ddl(t: dict, max_tokens: int = None) -> str:
+    """
+    CREATE TABLE text for one table with comments and a few profiled values inline;
+    no sample rows. Columns past `max_tokens` are summarized in a trailing comment.
+    """
+    header = f"CREATE TABLE {t['table']} ("
+    notes = [n for n in (t.get("comment"), f"~{t['row_estimate']:,} rows" if t.get("row_estimate") else None) if n]
+    if notes:
+        header += f"  -- {'; '.join(notes)}"
+    used = count_tokens(header)
+    values = t.get("values") or {}
+    columns, omitted = [], 0
+    for i, col in enumerate(t["columns"]):
+        extras = [col["comment"]] if col.get("comment") else []
+        if values.get(col["name"]):
+            extras.append("e.g. " + ", ".join(repr(v) for v in values[col["name"]]))
+        decl, note = f"  {col['name']} {col['type']}", "; ".join(extras)
+        cost = count_tokens(decl) + count_tokens(note) + 2
+        if max_tokens is not None and used + cost > max_tokens - 8:
+            omitted = len(t["columns"]) - i
+            break
+        columns.append((decl, note))
+        used += cost
+
+    lines = [header]
+    for i, (decl, note) in enumerate(columns):
+        line = decl + ("," if i < len(columns) - 1 else "")
+        lines.append(f"{line}  -- {note}" if note else line)
+    if omitted:
+        lines.append(f"  -- ... {omitted} more columns")
+    lines.append(");")
+    return "\n".join(lines)
+
+
+def _profiled_values(source: str, entry: dict) -> dict:
+    """{column: top values} from a cached profile of the table, for text-like columns."""
+    from data_ops import profile_cache
+
+    key = profile_cache.cache_key(source, entry["schema"], entry["table"], profile_cache.entry_fingerprint(entry))
+    summary = profile_cache.get(key)
+    if not summary:
+        return {}
+    values = {}
+    for name, stats in (summary.get("column_stats") or {}).items():
+        top = [t["value"] for t in stats.get("top_values", []) if isinstance(t["value"], str)]
+        if top:
+            values[name] = top[:SCHEMA_SAMPLE_VALUES]
+    return values
+
+
+def _catalog_version(entries: list) -> str:
+    # Schema only: data_version moves with every write, and the version keys the NL→SQL memo
+    state = sorted((e["schema"] or "", e["table"], e["schema_version"] or "", e.get("comment") or "") for e in entries)
+    return hashlib.sha256(json.dumps(state).encode("utf-8")).hexdigest()[:16]
+
+
+def _index_tables(source: str, entries: list, previous: SchemaIndex = None) -> list:
+    """
+    Table documents for the index. With `previous`, profiled values are re-read only for
+    tables whose data_version changed, and kept when the new version is not profiled yet.
+    """
+    from data_ops import catalog
+
+    known = {(t["schema"], t["table"]): t for t in previous.tables} if previous else {}
+    columns = catalog.get_all_columns(source)
+    tables = []
+    for e in entries:
+        old = known.get((e["schema"], e["table"]))
+        if old is not None and old["data_version"] == e["data_version"]:
+            values = old["values"]
+        else:
+            values = _profiled_values(source, e) or (old["values"] if old else {})
+        tables.append({
+            "schema": e["schema"],
+            "table": e["table"],
+            "comment": e.get("comment"),
+            "row_estimate": e["row_estimate"],
+            "data_version": e["data_version"],
+            "columns": columns.get((e["schema"], e["table"]), []),
+            "values": values,
+        })
+    return tables
+
+
+def get_index(source: str = SCHEMA_INDEX_SOURCE) -> SchemaIndex:
+    """
+    Index over the source's catalog tables. Rebuilt with a new version when a table is
+    added, dropped or altered; refreshed under the same version when only rows changed.
+    """
+    global _index
+    from data_ops import catalog
+
+    catalog.ensure_fresh()
+    entries = catalog.list_tables(source)
+    version = _catalog_version(entries)
+    data_versions = sorted((e["schema"] or "", e["table"], e["data_version"] or "") for e in entries)
+
+    def current(index):
+        return index is not None and index.version == version and index.data_versions == data_versions
+
+    if current(_index):
+        return _index
+    with _lock:
+        if not current(_index):
+            previous = _index if _index is not None and _index.version == version else None
+            _index = SchemaIndex(_index_tables(source, entries, previous), version)
+            _index.data_versions = data_versions
+    return _index
+
+
+def schema_context(question: str, k: int = SCHEMA_TOP_K, max_tokens: int = SCHEMA_PROMPT_MAX_TOKENS):
+    """
+    Compact DDL of the tables relevant to `question`, within max_tokens.
+    Returns (table_info text, [{"table", "score", "tokens"}] of the tables included).
+    """
+    index = get_index()
+    matches = index.search(question, k)
+    if matches:
+        matches = [(t, score) for t, score in matches if score >= matches[0][1] * SCHEMA_MIN_RELATIVE_SCORE]
+    else:
+        matches = [(t, 0.0) for t in (index.get(name) for name in SCHEMA_FALLBACK_TABLES) if t]
+
+    blocks, selected, used = [], [], 0
+    for t, score in matches:
+        remaining = max_tokens - used
+        if remaining < 40:
+            break
+        ddl = compact_ddl(t, max_tokens=remaining)
+        tokens = count_tokens(ddl) + 1
+        blocks.append(ddl)
+        selected.append({"table": t["table"], "score": score, "tokens": tokens})
+        used += tokens
+    return "\n\n".join(blocks), selected
@@ -0,0 +1,281 @@
+"""
+Pre-execution checks for LLM-generated SQL.
+
+Before a generated query reaches the source it is:
+1. lexed the way the engine's dialect reads it and rejected unless it is a single
+   read-only SELECT (or WITH ... SELECT);
+2. checked for cartesian joins;
+3. costed with the dialect's EXPLAIN (MySQL/MariaDB row estimates, PostgreSQL plan
+   cost, SQLite full-scan count) and rejected above SQL_GUARD_MAX_EXAMINED_ROWS /
+   SQL_GUARD_MAX_COST;
+4. bounded with a LIMIT when it has none;
+and it then runs under a statement timeout (statement_timeout()).
+
+Rejections raise QueryRejected with a reason meant for the user; rewrites are
+reported as notes next to the rewritten SQL.
+"""
+import contextlib
+import json
+import os
+import re
+import time
+
+SQL_GUARD_TIMEOUT_SECONDS = float(os.getenv("SQL_GUARD_TIMEOUT_SECONDS", "30"))
+# Rows the plan may examine (MySQL: product of per-table row estimates along a join)
+SQL_GUARD_MAX_EXAMINED_ROWS = float(os.getenv("SQL_GUARD_MAX_EXAMINED_ROWS", "50000000"))
+# PostgreSQL planner cost units
+SQL_GUARD_MAX_COST = float(os.getenv("SQL_GUARD_MAX_COST", "10000000"))
+# SQLite has no row estimates; bound the number of full table scans in one query instead
+SQL_GUARD_MAX_FULL_SCANS = int(os.getenv("SQL_GUARD_MAX_FULL_SCANS", "2"))
+
+# Literal and comment syntax differs by dialect, and reading it the way the server does
+# matters: "#" starts a comment only in MySQL (in PostgreSQL "#>" is an operator),
+# backslash escapes quotes only in MySQL strings, and dollar quoting is PostgreSQL's.
+# MySQL executes /*! ... */ and reads /*+ ... */ as hints, so both are kept as code.
+_SINGLE_QUOTED = r"'(?:[^']|'')*'"
+_SINGLE_QUOTED_BACKSLASH = r"'(?:[^'\\]|\\.|'')*'"
+_DOUBLE_QUOTED = r'"(?:[^"]|"")*"'
+_DOUBLE_QUOTED_BACKSLASH = r'"(?:[^"\\]|\\.|"")*"'
+_BACKTICKS = r"`[^`]*`"
+_DOLLAR_QUOTED = r"(?<![\w$])\$(?P<tag>[A-Za-z_]\w*|)\$.*?\$(?P=tag)\$"
+_LINE_COMMENT = r"--[^\n]*"
+_MYSQL_LINE_COMMENT = r"--(?=[ \t\r\n]|$)[^\n]*|#[^\n]*"
+_BLOCK_COMMENT = r"/\*.*?\*/"
+_LEXERS = {
+    "mysql": (_SINGLE_QUOTED_BACKSLASH, _DOUBLE_QUOTED_BACKSLASH, _BACKTICKS, _MYSQL_LINE_COMMENT, _BLOCK_COMMENT),
+    "postgresql": (_SINGLE_QUOTED, _DOUBLE_QUOTED, _DOLLAR_QUOTED, _LINE_COMMENT, _BLOCK_COMMENT),
+    "sqlite": (_SINGLE_QUOTED, _DOUBLE_QUOTED, _BACKTICKS, _LINE_COMMENT, _BLOCK_COMMENT),
+}
+_LEXERS["mariadb"] = _LEXERS["mysql"]
+_LEXERS = {dialect: re.compile("|".join(parts), re.DOTALL) for dialect, parts in _LEXERS.items()}
+# Unknown dialects get the strictest reading: no backslash escapes and no "#" comments,
+# which can only make more of the text look like code
+_DEFAULT_LEXER = re.compile("|".join((_SINGLE_QUOTED, _DOUBLE_QUOTED, _LINE_COMMENT, _BLOCK_COMMENT)), re.DOTALL)
+_EXECUTABLE_COMMENT = re.compile(r"/\*[!+]\d*(.*)\*/", re.DOTALL)
+
+# Statement keywords that can still hide inside a SELECT (e.g. PostgreSQL's WITH ... DELETE);
+# followed by "(" they are functions such as MySQL's INSERT()
+_WRITE_KEYWORDS = re.compile(r"\b(insert|update|delete|merge|create|alter|drop|truncate|grant|revoke)\b(?!\s*\()")
+_FORBIDDEN = [
+    (re.compile(r"\binto\s+(?:outfile|dumpfile)\b|\binto\s+@?\w+\s*(?:from\b|$)"), "writes query results out (SELECT ... INTO)"),
+    (re.compile(r"\bfor\s+(?:update|share)\b|\block\s+in\s+share\s+mode\b"), "takes row locks"),
+    (re.compile(r"\b(?:sleep|benchmark|get_lock|load_file|pg_sleep|pg_read_file|dblink)\s*\("), "calls a restricted function"),
+]
+_FROM_CLAUSE = re.compile(r"\bfrom\b(.*?)(?=\b(?:where|group|order|limit|having|join|union)\b|$)", re.DOTALL)
+_JOIN = re.compile(r"\b((?:natural\s+|cross\s+)?(?:(?:left|right|full|inner)\s+(?:outer\s+)?)?join)\b")
+
+
+class QueryRejected(ValueError):
+    def __init__(self, reason: str, sql: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.sql = sql
+
+
+def _strip(sql: str, dialect: str = None) -> str:
+    """Lowercased SQL with literals blanked and comments removed, for keyword checks."""
+    def blank(match):
+        token = match.group(0)
+        if token[0] in "`\"":
+            return "ident"
+        if token[0] in "'$":
+            return "''"
+        executable = _EXECUTABLE_COMMENT.fullmatch(token)
+        if executable:
+            return f" {_strip(executable.group(1), dialect)} "
+        return " "
+    return _LEXERS.get(dialect, _DEFAULT_LEXER).sub(blank, sql).lower()
+
+
+def strip_comments(sql: str, dialect: str = None) -> str:
+    """`sql` with its comments removed and literals, identifiers and executable comments kept as written."""
+    def drop(match):
+        token = match.group(0)
+        if token[0] in "'\"`$" or _EXECUTABLE_COMMENT.fullmatch(token):
+            return token
+        return " "
+    return _LEXERS.get(dialect, _DEFAULT_LEXER).sub(drop, sql)
+
+
+def check_read_only(sql: str, dialect: str = None):
+    """Raise QueryRejected unless `sql` is one read-only SELECT statement in `dialect`."""
+    code = _strip(sql, dialect).strip()
+    if not code:
+        raise QueryRejected("The query is empty.", sql)
+    if ";" in code:
+        raise QueryRejected("Only a single statement can be run; the query contains several.", sql)
+    first = code.split(None, 1)[0].lstrip("(")
+    if first not in ("select", "with"):
+        raise QueryRejected(f"Only SELECT queries can be run; this is a {first.upper()} statement.", sql)
+    for pattern, reason in _FORBIDDEN:
+        if pattern.search(code):
+            raise QueryRejected(f"The query {reason}.", sql)
+    write = _WRITE_KEYWORDS.search(code)
+    if write:
+        raise QueryRejected(f"The query contains {write.group(1).upper()}, which is not allowed in a read-only query.", sql)
+
+
+def cartesian_joins(sql: str, dialect: str = None) -> list:
+    """Joins without a join condition: CROSS JOIN, JOIN without ON/USING, or comma joins with no WHERE."""
+    code = _strip(sql, dialect)
+    problems = []
+    matches = list(_JOIN.finditer(code))
+    for i, match in enumerate(matches):
+        kind = " ".join(match.group(1).split())
+        if kind.startswith("cross"):
+            problems.append("CROSS JOIN")
+            continue
+        if kind.startswith("natural"):
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(code)
+        if not re.search(r"\b(?:on|using)\b", code[match.end():end]):
+            problems.append(f"{kind.upper()} without ON/USING")
+    if not re.search(r"\bwhere\b", code):
+        for clause in _FROM_CLAUSE.findall(code):
+            # A FROM inside a function call or subquery (EXTRACT(... FROM ...)) is not a table list
+            if "," in clause and not re.search(r"[()]", clause):
+                problems.append("comma-separated tables without a WHERE clause")
+                break
+    return problems
+
+
+def _explain_mysql(conn, sql: str) -> dict:
+    rows = conn.exec_driver_sql(f"EXPLAIN {sql}").mappings().all()
+    per_select = {}
+    for row in rows:
+        estimate = float(row.get("rows") or 1) * float(row.get("filtered") or 100) / 100
+        per_select[row.get("id")] = per_select.get(row.get("id"), 1.0) * max(estimate, 1.0)
+    full_scans = [row.get("table") for row in rows if (row.get("type") or "").upper() == "ALL"]
+    return {"examined_rows": max(per_select.values(), default=0.0), "full_scans": full_scans}
+
+
+def _explain_postgresql(conn, sql: str) -> dict:
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+    return {"cost": float(plan["Total Cost"]), "estimated_rows": float(plan["Plan Rows"])}
+
+
+def _explain_sqlite(conn, sql: str) -> dict:
+    details = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    full_scans = [d for d in details if d.startswith("SCAN") and " USING " not in d]
+    return {"full_scans": full_scans}
+
+
+_EXPLAIN = {"mysql": _explain_mysql, "mariadb": _explain_mysql, "postgresql": _explain_postgresql,
+            "sqlite": _explain_sqlite}
+
+
+def estimate_cost(engine, sql: str):
+    """
+    The dialect's plan estimate for `sql`, or None when the dialect has no EXPLAIN support here.
+    `sql` is checked again first: EXPLAIN runs whatever follows it, and psycopg2 sends a
+    string with several statements as one batch, so on PostgreSQL the EXPLAIN also runs in
+    a read-only transaction. (PyMySQL and sqlite3 refuse multiple statements themselves.)
+    """
+    explain = _EXPLAIN.get(engine.dialect.name)
+    if explain is None:
+        return None
+    check_read_only(sql, engine.dialect.name)
+    with engine.connect() as conn, statement_timeout(conn):
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+        return explain(conn, sql)
+
+
+def _check_plan(plan: dict, sql: str):
+    if plan.get("examined_rows", 0) > SQL_GUARD_MAX_EXAMINED_ROWS:
+        raise QueryRejected(
+            f"The plan would examine about {plan['examined_rows']:,.0f} rows "
+            f"(limit {SQL_GUARD_MAX_EXAMINED_ROWS:,.0f}). Add filters or join conditions.", sql)
+    if plan.get("cost", 0) > SQL_GUARD_MAX_COST:
+        raise QueryRejected(
+            f"The planner cost estimate is {plan['cost']:,.0f} (limit {SQL_GUARD_MAX_COST:,.0f}). "
+            "Add filters or join conditions.", sql)
+    if "examined_rows" not in plan and "cost" not in plan and len(plan.get("full_scans", [])) > SQL_GUARD_MAX_FULL_SCANS:
+        raise QueryRejected(
+            f"The plan scans {len(plan['full_scans'])} tables in full (limit {SQL_GUARD_MAX_FULL_SCANS}).", sql)
+
+
+def guard_query(sql: str, engine=None, max_rows: int = None, explain: bool = True) -> dict:
+    """
+    Check and rewrite one generated query. Returns {"sql", "notes", "plan"}: the SQL to
+    run, user-facing notes about rewrites, and the plan estimate (None without EXPLAIN).
+    Raises QueryRejected with the reason when the query must not run.
+    """
+    from utils.db import QUERY_MAX_ROWS, apply_row_limit
+
+    max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+    dialect = engine.dialect.name if engine is not None else None
+    sql = sql.strip().rstrip(";").strip()
+    check_read_only(sql, dialect)
+    notes = []
+
+    joins = cartesian_joins(sql, dialect)
+    plan = None
+    if explain and engine is not None:
+        plan = estimate_cost(engine, sql)
+    if joins and (plan is None or not (plan.get("examined_rows") or plan.get("cost"))):
+        # No row estimate to tell a small cross join from a huge one
+        raise QueryRejected(f"The query has a cartesian join ({'; '.join(joins)}).", sql)
+    if joins:
+        notes.append(f"Cartesian join ({'; '.join(joins)}) allowed: the plan estimate is within limits.")
+    if plan is not None:
+        _check_plan(plan, sql)
+
+    bounded, limited = apply_row_limit(sql, max_rows, dialect)
+    if limited:
+        notes.append(f"Added LIMIT {max_rows + 1}: at most {max_rows:,} rows are fetched.")
+    return {"sql": bounded, "notes": notes, "plan": plan}
+
+
+@contextlib.contextmanager
+def statement_timeout(conn, seconds: float = SQL_GUARD_TIMEOUT_SECONDS):
+    """
+    Run the statements of the block under a server-side timeout on `conn`, restoring
+    the session setting afterwards since pooled connections are reused.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    dialect = conn.dialect.name
+    millis = int(seconds * 1000)
+    if dialect == "mysql":
+        conn.exec_driver_sql(f"SET SESSION MAX_EXECUTION_TIME = {millis}")
+        reset = "SET SESSION MAX_EXECUTION_TIME = 0"
+    elif dialect == "mariadb":
+        conn.exec_driver_sql(f"SET SESSION max_statement_time = {seconds:.3f}")
+        reset = "SET SESSION max_statement_time = 0"
+    elif dialect == "postgresql":
+        conn.exec_driver_sql(f"SET statement_timeout = {millis}")
+        reset = "SET statement_timeout = 0"
+    elif dialect == "sqlite":
+        # The progress handler aborts the running statement once the deadline passes
+        deadline = time.monotonic() + seconds
+        raw = conn.connection.dbapi_connection
+        raw.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        try:
+            yield
+        finally:
+            raw.set_progress_handler(None, 0)
+        return
+    else:
+        yield
+        return
+    try:
+        yield
+    finally:
+        try:
+            conn.exec_driver_sql(reset)
+        except Exception:
+            # e.g. an unread streamed result after an error: drop the connection rather than
+            # return it to the pool with the timeout still set
+            conn.invalidate()
+
+
+def is_timeout_error(exc: Exception) -> bool:
+    """True for the errors the databases raise when statement_timeout() cuts a query off."""
+    text = str(getattr(exc, "orig", exc)).lower()
+    return any(marker in text for marker in (
+        "max_execution_time", "maximum statement execution time", "max_statement_time",
+        "statement timeout", "canceling statement", "interrupted",
+    ))
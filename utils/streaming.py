@@ -0,0 +1,41 @@
+"""Helpers for measuring streamed LLM responses."""
+import time
+
+from utils import tracing
+
+
+def measure_stream(deltas, metrics: dict, span_name: str = None, **span_attributes):
+    """
+    Pass token deltas through unchanged while filling `metrics` with
+    time-to-first-token, delta count and tokens/sec once the stream ends.
+    With span_name the stream is also traced, from first read to last delta.
+    """
+    span = tracing.start_span(span_name, tracing.SPAN_KIND_CLIENT, **span_attributes) if span_name else None
+    started = time.perf_counter()
+    first_at = None
+    count = 0
+    try:
+        for delta in deltas:
+            if not delta:
+                continue
+            if first_at is None:
+                first_at = time.perf_counter()
+            count += 1
+            yield delta
+    except Exception as e:
+        if span is not None:
+            span.record_error(e)
+        raise
+    finally:
+        total = time.perf_counter() - started
+        generation = total - (first_at - started) if first_at is not None else 0.0
+        metrics.clear()
+        metrics.update({
+            "ttft_s": round(first_at - started, 4) if first_at is not None else None,
+            "total_s": round(total, 4),
+            "tokens": count,
+            "tokens_per_sec": round(count / generation, 1) if generation > 0 else None,
+        })
+        if span is not None:
+            span.set(**{f"llm.{k}": v for k, v in metrics.items()})
+            span.end()
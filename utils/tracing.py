@@ -0,0 +1,315 @@
+"""
+In-process tracing for the hot paths: conversation actions, LLM calls, SQL
+statements, profiling, discovery and GitHub PR creation.
+
+span() times a block and nests under the span active on the same thread;
+instrument_engine() adds one span per SQL statement through SQLAlchemy engine
+events. Finished spans feed per-operation latency windows (operation_stats()) and
+a window of recent statements (slowest_queries()) for the Diagnostics page, and are
+appended to TRACE_EXPORT_PATH as OTLP/JSON lines (one ExportTraceServiceRequest per
+line, the OpenTelemetry file exporter format). Cumulative latency histograms are
+appended to TRACE_METRICS_PATH the same way. Set either path to "" to keep that
+data in memory only, and TRACING_ENABLED=false to turn tracing off.
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", os.path.join(tempfile.gettempdir(), "onboarding_traces.jsonl"))
+TRACE_METRICS_PATH = os.getenv("TRACE_METRICS_PATH", os.path.join(tempfile.gettempdir(), "onboarding_metrics.jsonl"))
+TRACE_EXPORT_BATCH = int(os.getenv("TRACE_EXPORT_BATCH", "64"))
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_METRICS_INTERVAL = float(os.getenv("TRACE_METRICS_INTERVAL", "60"))
+# Durations kept per operation for percentiles, and statements kept for the slow-query list
+TRACE_STATS_WINDOW = int(os.getenv("TRACE_STATS_WINDOW", "1000"))
+TRACE_QUERY_WINDOW = int(os.getenv("TRACE_QUERY_WINDOW", "500"))
+TRACE_STATEMENT_MAX_CHARS = 1000
+
+SERVICE_NAME = "data_onboarding_orchestrator"
+# Upper bounds (ms) of the exported latency histogram buckets
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+SPAN_KIND_INTERNAL, SPAN_KIND_CLIENT = 1, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_current = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_pending = []  # finished spans not yet exported
+_last_export = time.time()
+_last_metrics_export = time.time()
+_durations = defaultdict(lambda: deque(maxlen=TRACE_STATS_WINDOW))  # operation -> recent ms
+_counts = Counter()
+_errors = Counter()
+_histograms = {}  # operation -> {"count", "sum", "min", "max", "buckets"}
+_queries = deque(maxlen=TRACE_QUERY_WINDOW)
+_started_ns = time.time_ns()
+
+
+class Span:
+    def __init__(self, name: str, attributes: dict = None, kind: int = SPAN_KIND_INTERNAL, parent=None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.end_ns = None
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error):
+        """Mark the span failed for an error the caller handles itself."""
+        self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self, error: BaseException = None):
+        if self.end_ns is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _record(self)
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """A span under the thread's active span that the caller ends; None when tracing is off."""
+    if not TRACING_ENABLED:
+        return None
+    return Span(name, attributes, kind, parent=_current.get())
+
+
+@contextlib.contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """Time the block as `name`; spans started inside it become its children. Yields the span (or None)."""
+    current = start_span(name, kind, **attributes)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traced(name: str = None, kind: int = SPAN_KIND_INTERNAL):
+    """Decorator form of span(); the operation name defaults to module.function."""
+    def decorate(func):
+        operation = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(operation, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _record(s: Span):
+    with _lock:
+        _durations[s.name].append(s.duration_ms)
+        _counts[s.name] += 1
+        if s.error:
+            _errors[s.name] += 1
+        hist = _histograms.setdefault(s.name, {"count": 0, "sum": 0.0, "min": s.duration_ms, "max": s.duration_ms,
+                                                "buckets": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)})
+        hist["count"] += 1
+        hist["sum"] += s.duration_ms
+        hist["min"] = min(hist["min"], s.duration_ms)
+        hist["max"] = max(hist["max"], s.duration_ms)
+        hist["buckets"][next((i for i, b in enumerate(HISTOGRAM_BOUNDS_MS) if s.duration_ms <= b),
+                             len(HISTOGRAM_BOUNDS_MS))] += 1
+        if "db.statement" in s.attributes:
+            _queries.append({
+                "ts": s.start_ns / 1e9,
+                "duration_ms": round(s.duration_ms, 2),
+                "operation": s.name,
+                "database": s.attributes.get("db.system"),
+                "statement": s.attributes["db.statement"],
+                "rows": s.attributes.get("db.rows"),
+                "error": s.error,
+            })
+        if TRACE_EXPORT_PATH:
+            _pending.append(s)
+        due = len(_pending) >= TRACE_EXPORT_BATCH or time.time() - _last_export >= TRACE_EXPORT_INTERVAL
+    if due:
+        flush()
+
+
+# ----------------------------- #
+#        SQLALCHEMY EVENTS
+# ----------------------------- #
+
+def instrument_engine(engine):
+    """One CLIENT span per statement executed on `engine` (db.system, db.statement, db.rows)."""
+    if not TRACING_ENABLED:
+        return engine
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+    database = engine.url.database
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if context is None:
+            return
+        operation = statement.lstrip(" (\n\t").split(None, 1)[0].lower() if statement.strip() else "statement"
+        context._trace_span = start_span(
+            f"db.{operation}", SPAN_KIND_CLIENT,
+            **{"db.system": system, "db.name": database or "",
+               "db.statement": statement[:TRACE_STATEMENT_MAX_CHARS], "db.executemany": bool(executemany)})
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        s = getattr(context, "_trace_span", None)
+        if s is not None:
+            rowcount = getattr(cursor, "rowcount", -1)
+            if rowcount is not None and rowcount >= 0:
+                s.set(**{"db.rows": rowcount})
+            s.end()
+
+    def failed(exception_context):
+        s = getattr(exception_context.execution_context, "_trace_span", None)
+        if s is not None:
+            s.end(error=exception_context.original_exception)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", failed)
+    return engine
+
+
+# ----------------------------- #
+#        QUERIES AND EXPORT
+# ----------------------------- #
+
+def operation_stats() -> dict:
+    """{operation: {count, errors, p50_ms, p95_ms, max_ms}} over each operation's recent window."""
+    with _lock:
+        windows = {name: list(values) for name, values in _durations.items()}
+        counts, errors = dict(_counts), dict(_errors)
+    stats = {}
+    for name, values in windows.items():
+        ordered = sorted(values)
+        stats[name] = {
+            "count": counts[name],
+            "errors": errors.get(name, 0),
+            "p50_ms": round(statistics.median(ordered), 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 2),
+            "max_ms": round(ordered[-1], 2),
+        }
+    return stats
+
+
+def slowest_queries(n: int = 20) -> list:
+    """The n slowest of the recent SQL statements, slowest first."""
+    with _lock:
+        recent = list(_queries)
+    return sorted(recent, key=lambda q: q["duration_ms"], reverse=True)[:n]
+
+
+def reset():
+    """Forget collected statistics (exported data is kept)."""
+    with _lock:
+        _durations.clear()
+        _counts.clear()
+        _errors.clear()
+        _queries.clear()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _resource():
+    return {"attributes": [_attribute("service.name", SERVICE_NAME), _attribute("process.pid", os.getpid())]}
+
+
+def _otlp_span(s: Span) -> dict:
+    record = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": s.kind,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+        "status": {"code": STATUS_ERROR, "message": s.error} if s.error else {"code": STATUS_OK},
+    }
+    if s.parent_id:
+        record["parentSpanId"] = s.parent_id
+    return record
+
+
+def _otlp_metrics(histograms: dict) -> dict:
+    now = str(time.time_ns())
+    points = [{
+        "attributes": [_attribute("operation", name)],
+        "startTimeUnixNano": str(_started_ns),
+        "timeUnixNano": now,
+        "count": str(h["count"]),
+        "sum": h["sum"],
+        "min": h["min"],
+        "max": h["max"],
+        "bucketCounts": [str(c) for c in h["buckets"]],
+        "explicitBounds": list(HISTOGRAM_BOUNDS_MS),
+    } for name, h in sorted(histograms.items())]
+    return {"resourceMetrics": [{"resource": _resource(), "scopeMetrics": [{
+        "scope": {"name": __name__},
+        "metrics": [{"name": "operation.duration", "unit": "ms",
+                     "histogram": {"aggregationTemporality": 2, "dataPoints": points}}],
+    }]}]}
+
+
+def _append(path: str, payload: dict):
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload) + "\n")
+    except OSError as e:
+        print(f"Error exporting telemetry to {path}: {e}")
+
+
+def flush(metrics: bool = False):
+    """Export pending spans, plus a metrics snapshot when due (or when metrics=True)."""
+    global _last_export, _last_metrics_export
+    with _lock:
+        spans, _pending[:] = list(_pending), []
+        _last_export = time.time()
+        write_metrics = TRACE_METRICS_PATH and _histograms and (
+            metrics or time.time() - _last_metrics_export >= TRACE_METRICS_INTERVAL)
+        histograms = {name: dict(h, buckets=list(h["buckets"])) for name, h in _histograms.items()} if write_metrics else None
+        if write_metrics:
+            _last_metrics_export = time.time()
+    if spans:
+        _append(TRACE_EXPORT_PATH, {"resourceSpans": [{"resource": _resource(), "scopeSpans": [
+            {"scope": {"name": __name__}, "spans": [_otlp_span(s) for s in spans]}
+        ]}]})
+    if histograms:
+        _append(TRACE_METRICS_PATH, _otlp_metrics(histograms))
+
+
+atexit.register(flush, metrics=True)